@@ -0,0 +1,279 @@
+"""Benchmark setup and polling of the Nature Remo integration at scale.
+
+Runs a real Home Assistant core against FakeNatureApi and reports:
+
+- setup: wall time of async_setup_entry including platform setup
+- poll_unchanged / poll_changed: per-poll _async_update_data and listener
+  fan-out time and decoding time spent on the event loop, with 0 and
+  --changed of the objects modified
+- loop_lag_max: longest event loop stall seen during setup and polling
+- memory_per_entity: bytes allocated during setup per created entity
+- micro benchmarks of check_update, SignalButtonEntity creation and the
+  smart meter and climate update paths
+
+Usage::
+
+    python benchmarks/bench.py --remos 4 --appliances 200 --signals 20 --save baseline
+    python benchmarks/bench.py --remos 4 --appliances 200 --signals 20 --compare baseline
+
+Results are stored as JSON in benchmarks/results/<name>.json.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+import tracemalloc
+from unittest.mock import patch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from homeassistant import auth, bootstrap, loader  # noqa: E402
+from homeassistant.config_entries import ConfigEntries, ConfigEntry  # noqa: E402
+from homeassistant.const import CONF_ACCESS_TOKEN  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+from homeassistant.setup import async_setup_component  # noqa: E402
+
+from custom_components.nature_remo import api  # noqa: E402
+from custom_components.nature_remo.common import (  # noqa: E402
+    CONF_SIGNAL_BUTTONS, DOMAIN, check_update, create_appliance_device_info)
+
+from fake_api import FakeNatureApi  # noqa: E402
+from payloads import Payloads  # noqa: E402
+
+RESULTS = os.path.join(HERE, "results")
+
+
+class LagMonitor:
+    """Track the longest delay of a 1 ms heartbeat on the event loop."""
+
+    def __init__(self):
+        self.max = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(0.001)
+            self.max = max(self.max, loop.time() - start - 0.001)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+
+async def make_hass(config_dir: str) -> HomeAssistant:
+    hass = HomeAssistant()
+    hass.config.config_dir = config_dir
+    hass.config.set_time_zone("UTC")
+    hass.config.skip_pip = True
+    hass.data[loader.DATA_CUSTOM_COMPONENTS] = None
+    await bootstrap.load_registries(hass)
+    hass.auth = await auth.auth_manager_from_config(hass, [], [])
+    hass.config_entries = ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    await async_setup_component(
+        hass, "http", {"http": {"server_host": ["127.0.0.1"], "server_port": _free_port()}})
+    # No mDNS on the benchmark host.
+    hass.config.components.add("zeroconf")
+    await hass.async_start()
+    return hass
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def timed(fn, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        start = perf_counter()
+        fn()
+        samples.append(perf_counter() - start)
+    return statistics.median(samples)
+
+
+async def bench_polls(hass, coordinator, payloads, rounds, changed):
+    fanout = []
+    update_listeners = coordinator.async_update_listeners
+
+    def timed_update_listeners():
+        start = perf_counter()
+        update_listeners()
+        fanout.append(perf_counter() - start)
+
+    coordinator.async_update_listeners = timed_update_listeners
+    totals = []
+    blocking = []
+    for _ in range(rounds):
+        if changed:
+            payloads.mutate(changed)
+        start = perf_counter()
+        await coordinator.async_refresh()
+        totals.append(perf_counter() - start)
+        blocking.append(coordinator.loop_blocking)
+        await hass.async_block_till_done()
+    coordinator.async_update_listeners = update_listeners
+    total = statistics.median(totals)
+    fan = statistics.median(fanout)
+    return {
+        "total": total,
+        "update_data": total - fan,
+        "fanout": fan,
+        "loop_blocking": statistics.median(blocking),
+    }
+
+
+def micro(hass, entry, payloads, rounds):
+    from custom_components.nature_remo.button import SignalButtonEntity, SignalButtons
+    from custom_components.nature_remo.climate import AirconEntity
+    from custom_components.nature_remo.commands import DEFAULT_SETTINGS_WINDOW
+    from custom_components.nature_remo.sensor import EnergyEntity, PowerEntity
+
+    data = hass.data[DOMAIN][entry.entry_id]
+    appliances = data["appliances"]
+    devices = data["devices"]
+    post = data["post"]
+    by_type = {}
+    for x in appliances.data.values():
+        by_type.setdefault(x.type, []).append(x)
+    results = {}
+
+    def check():
+        class Entry:
+            def async_on_unload(self, func):
+                func()
+
+        check_update(Entry(), lambda entities: None, appliances, lambda x: ())
+
+    results["check_update"] = timed(check, rounds)
+
+    def buttons():
+        for appliance in appliances.data.values():
+            info = create_appliance_device_info(appliance)
+            group = SignalButtons(appliances, appliance.id)
+            for signal in appliances.structures[appliance.id].commands.signals:
+                SignalButtonEntity(group, post, signal, info)
+
+    results["signal_button_create"] = timed(buttons, rounds)
+
+    meters = []
+    for x in by_type.get("EL_SMART_METER", []):
+        info = create_appliance_device_info(x)
+        meters += [PowerEntity(appliances, x, info), EnergyEntity(appliances, x, info, 224)]
+    results["smart_meter_update"] = timed(
+        lambda: [m._on_data_update(appliances.data[m._remo_id]) for m in meters], rounds)
+
+    aircons = [
+        AirconEntity(appliances, devices, post, x, create_appliance_device_info(x),
+                     DEFAULT_SETTINGS_WINDOW / 1000)
+        for x in by_type.get("AC", [])
+    ]
+    results["climate_update"] = timed(
+        lambda: [a._on_data_update(appliances.data[a._remo_id]) for a in aircons], rounds)
+    return results
+
+
+async def run(args) -> dict:
+    payloads = Payloads(args.remos, args.appliances, args.signals)
+    server = FakeNatureApi(payloads)
+    await server.start()
+    results = {}
+    with tempfile.TemporaryDirectory() as config_dir, patch.object(api, "RESOURCE", server.url):
+        hass = await make_hass(config_dir)
+        entry = ConfigEntry(
+            version=2, domain=DOMAIN, title="bench",
+            data={CONF_ACCESS_TOKEN: "token"}, source="user",
+            options={CONF_SIGNAL_BUTTONS: [x["id"] for x in payloads.appliances if x["signals"]]})
+        lag = LagMonitor()
+        lag.start()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        start = perf_counter()
+        await hass.config_entries.async_add(entry)
+        await hass.async_block_till_done()
+        results["setup"] = perf_counter() - start
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        entities = len(hass.states.async_all())
+        allocated = sum(x.size_diff for x in after.compare_to(before, "filename"))
+        results["entities"] = entities
+        results["memory_per_entity"] = allocated / max(entities, 1)
+
+        appliances = hass.data[DOMAIN][entry.entry_id]["appliances"]
+        results["poll_unchanged"] = await bench_polls(hass, appliances, payloads, args.rounds, 0)
+        results["poll_changed"] = await bench_polls(hass, appliances, payloads, args.rounds, args.changed)
+        lag.stop()
+        results["loop_lag_max"] = lag.max
+        results.update(micro(hass, entry, payloads, args.rounds))
+
+        await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_stop(force=True)
+    await server.stop()
+    return results
+
+
+def _flatten(results: dict, prefix=""):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        else:
+            yield f"{prefix}{key}", value
+
+
+def _revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--remos", type=int, default=4)
+    parser.add_argument("--appliances", type=int, default=100)
+    parser.add_argument("--signals", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--changed", type=float, default=0.1,
+                        help="fraction of objects modified per changed poll")
+    parser.add_argument("--save", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    flat = dict(_flatten(results))
+    baseline = {}
+    if args.compare:
+        with open(os.path.join(RESULTS, f"{args.compare}.json")) as f:
+            baseline = dict(_flatten(json.load(f)["results"]))
+    for key, value in flat.items():
+        line = f"{key:32} {value:14.6f}"
+        if key in baseline and baseline[key]:
+            line += f"  {(value - baseline[key]) / baseline[key]:+8.1%}"
+        print(line)
+    if args.save:
+        os.makedirs(RESULTS, exist_ok=True)
+        with open(os.path.join(RESULTS, f"{args.save}.json"), "w") as f:
+            json.dump({
+                "revision": _revision(),
+                "params": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Recorded Nature Remo API responses for deterministic replay.
+
+A cassette is a JSON file with the responses in the order they were
+served. Identifying values are replaced while recording: MAC addresses
+and serial numbers by stable pseudonyms, the account by a placeholder.
+Pseudonyms are salted per recording, so they cannot be reversed but stay
+consistent within one cassette.
+"""
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+
+VERSION = 1
+
+# keys whose values identify the hardware or the account
+REDACTED_KEYS = {"mac_address", "bt_mac_address", "serial_number"}
+
+
+class Redactor:
+    def __init__(self, salt: bytes = None):
+        self.salt = salt or os.urandom(16)
+
+    def _hash(self, value: str) -> bytes:
+        return hashlib.sha256(self.salt + value.encode()).digest()
+
+    def _pseudonym(self, key: str, value):
+        if not isinstance(value, str) or not value:
+            return value
+        digest = self._hash(value)
+        if key.endswith("mac_address"):
+            # locally administered, so it never collides with a real one
+            return ":".join(f"{x:02x}" for x in (0x02,) + tuple(digest[:5]))
+        return f"REDACTED-{digest[:4].hex()}"
+
+    def _user(self, user: dict):
+        return {
+            **user,
+            "id": f"user-{self._hash(str(user.get('id'))).hex()[:8]}",
+            "nickname": "user",
+        }
+
+    def redact(self, path: str, data):
+        if path == "users/me" and isinstance(data, dict):
+            return self._user(data)
+        return self._walk(data)
+
+    def _walk(self, data):
+        if isinstance(data, list):
+            return [self._walk(x) for x in data]
+        if not isinstance(data, dict):
+            return data
+        result = {}
+        for key, value in data.items():
+            if key in REDACTED_KEYS:
+                result[key] = self._pseudonym(key, value)
+            elif key == "users" and isinstance(value, list):
+                result[key] = [self._user(x) if isinstance(x, dict) else x for x in value]
+            else:
+                result[key] = self._walk(value)
+        return result
+
+
+class Cassette:
+    """Responses per method and path, replayed in recorded order."""
+
+    def __init__(self, interactions: list[dict] = None):
+        self.interactions = interactions or []
+        self._positions: dict[tuple[str, str], int] = {}
+
+    @classmethod
+    def load(cls, filename: str) -> "Cassette":
+        with open(filename, encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != VERSION:
+            raise ValueError(f"Unsupported cassette version: {data.get('version')}")
+        return cls(data["interactions"])
+
+    def save(self, filename: str):
+        data = {
+            "version": VERSION,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "interactions": self.interactions,
+        }
+        with open(filename, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=1, ensure_ascii=False)
+
+    def record(self, method: str, path: str, status: int, body):
+        self.interactions.append(
+            {"method": method, "path": path, "status": status, "body": body})
+
+    def play(self, method: str, path: str):
+        """The next recorded (status, body) of method and path, or None.
+
+        Once the recorded responses of a path are used up the last one is
+        repeated, so a replay can poll for longer than the recording.
+        """
+        matches = [
+            x for x in self.interactions
+            if x["method"] == method and x["path"] == path
+        ]
+        if not matches:
+            return None
+        key = (method, path)
+        position = self._positions.get(key, 0)
+        self._positions[key] = position + 1
+        interaction = matches[min(position, len(matches) - 1)]
+        return interaction["status"], interaction["body"]
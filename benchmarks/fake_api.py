@@ -0,0 +1,315 @@
+"""Local stand-in for the Nature Remo cloud API.
+
+FakeNatureApi serves a synthetic account from Payloads, ReplayNatureApi
+serves a cassette and RecordingNatureApi proxies the real API while
+writing a cassette. All of them can emulate the rate limit (30 requests
+per 5 minutes on the real API) including 429s, and a response latency.
+
+Run standalone and point RESOURCE at the printed URL::
+
+    python benchmarks/fake_api.py --appliances 20 --limit 30 --latency 0.2
+    python benchmarks/fake_api.py --record account.json --token $NATURE_TOKEN
+    python benchmarks/fake_api.py --replay account.json --limit 30
+"""
+import argparse
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+import json
+import random
+import time
+
+from aiohttp import ClientSession, web
+
+from cassette import Cassette, Redactor
+from payloads import Payloads, _iso
+
+UPSTREAM = "https://api.nature.global/1"
+
+# what the fake reports when no limit is emulated
+_GENEROUS = {"x-rate-limit-limit": "30", "x-rate-limit-remaining": "29"}
+
+# settings of aircon_settings parameters
+_AIRCON_PARAMS = {
+    "air_direction": "dir",
+    "air_volume": "vol",
+    "button": "button",
+    "operation_mode": "mode",
+    "temperature": "temp",
+}
+
+
+class RateLimit:
+    """Fixed window of limit requests starting with the first request."""
+
+    def __init__(self, limit: int = 30, window: float = 300):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset: float = None
+
+    def take(self) -> bool:
+        now = time.time()
+        if self.reset is None or now >= self.reset:
+            self.reset = now + self.window
+            self.remaining = self.limit
+        if self.remaining == 0:
+            return False
+        self.remaining -= 1
+        return True
+
+    def headers(self) -> dict[str, str]:
+        return {
+            "x-rate-limit-limit": str(self.limit),
+            "x-rate-limit-remaining": str(self.remaining),
+            "x-rate-limit-reset": str(int(self.reset)),
+        }
+
+
+class FakeNatureApi:
+    """Serve Payloads under /1, with an always generous rate limit by default.
+
+    meter_interval advances the Remo E readings every so many seconds, like
+    the real meters which report about once a minute.
+    """
+
+    def __init__(
+        self,
+        payloads: Payloads = None,
+        rate_limit: RateLimit = None,
+        latency: float = 0,
+        jitter: float = 0,
+        meter_interval: float = None,
+    ):
+        self.payloads = payloads
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.jitter = jitter
+        self.meter_interval = meter_interval
+        self.requests = 0
+        self.throttled = 0
+        self.counts: Counter[tuple[str, str]] = Counter()
+        self.random = random.Random(0)
+        self._runner = None
+        self._started = time.time()
+        self._meter_ticks = 0
+        self.url = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        app = web.Application()
+        app.router.add_route("*", "/1/{path:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/1"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request):
+        method, path = request.method, request.match_info["path"]
+        self.counts[method, path] += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.rate_limit is not None and not self.rate_limit.take():
+            self.throttled += 1
+            return self._response(
+                429, {"code": 429001, "message": "Too Many Requests"}, self.rate_limit.headers())
+        data = dict(await request.post()) if method == "POST" else None
+        status, body, headers = await self._respond(method, path, data)
+        if self.rate_limit is not None:
+            headers = {**headers, **self.rate_limit.headers()}
+        return self._response(status, body, headers)
+
+    def _response(self, status: int, data, headers: dict[str, str]):
+        self.requests += 1
+        return web.Response(
+            status=status,
+            body=json.dumps(data).encode(),
+            content_type="application/json",
+            headers=headers,
+        )
+
+    async def _respond(self, method: str, path: str, data: dict):
+        """Return status, body and rate limit headers of a request."""
+        headers = {**_GENEROUS, "x-rate-limit-reset": str(int(time.time()) + 300)}
+        parts = path.split("/")
+        if method == "GET":
+            if path == "devices":
+                return 200, self.payloads.devices, headers
+            if path == "appliances":
+                self._advance_meters()
+                return 200, self.payloads.appliances, headers
+            if path == "users/me":
+                return 200, {"id": "user", "nickname": "bench"}, headers
+        elif method == "POST" and len(parts) == 3:
+            if parts[0] == "signals":
+                result = self._signal(parts[1], parts[2])
+            elif parts[0] == "appliances":
+                result = self._appliance(parts[1], parts[2], data or {})
+            else:
+                result = None
+            if result is not None:
+                return 200, result, headers
+        return 404, {"code": 404001, "message": "Not Found"}, headers
+
+    def _signal(self, id: str, action: str):
+        for appliance in self.payloads.appliances:
+            for signal in appliance["signals"]:
+                if signal["id"] != id:
+                    continue
+                if action == "send":
+                    return {}
+                if action == "delete":
+                    appliance["signals"].remove(signal)
+                    return {}
+                return None
+        return None
+
+    def _appliance(self, id: str, action: str, data: dict):
+        appliance = next((x for x in self.payloads.appliances if x["id"] == id), None)
+        if appliance is None:
+            return None
+        if action == "aircon_settings" and appliance["type"] == "AC":
+            settings = appliance["settings"]
+            for param, value in data.items():
+                if param in _AIRCON_PARAMS:
+                    settings[_AIRCON_PARAMS[param]] = value
+            settings["updated_at"] = _iso(datetime.now(timezone.utc))
+            return settings
+        if action == "tv" and appliance["type"] == "TV":
+            state = appliance["tv"]["state"]
+            button = data.get("button", "")
+            if button.startswith("input-"):
+                state["input"] = button[len("input-"):]
+            return state
+        if action == "light" and appliance["type"] == "LIGHT":
+            state = appliance["light"]["state"]
+            button = data.get("button", "")
+            if button in ("on", "off"):
+                state["power"] = button
+            elif button == "onoff":
+                state["power"] = "off" if state["power"] == "on" else "on"
+            state["last_button"] = button
+            return state
+        return None
+
+    def _advance_meters(self):
+        if not self.meter_interval:
+            return
+        ticks = int((time.time() - self._started) // self.meter_interval)
+        if ticks > self._meter_ticks:
+            self._meter_ticks = ticks
+            at = self._started + ticks * self.meter_interval
+            self.payloads.tick_meters(datetime.fromtimestamp(at, timezone.utc))
+
+
+class ReplayNatureApi(FakeNatureApi):
+    """Serve the responses of a cassette in recorded order."""
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    async def _respond(self, method: str, path: str, data: dict):
+        headers = {**_GENEROUS, "x-rate-limit-reset": str(int(time.time()) + 300)}
+        played = self.cassette.play(method, path)
+        if played is None:
+            return 404, {"code": 404001, "message": "Not recorded"}, headers
+        status, body = played
+        return status, body, headers
+
+
+class RecordingNatureApi(FakeNatureApi):
+    """Forward requests to the real API and record the redacted responses.
+
+    Requests use the token given here, whatever the client sends. The
+    responses served are redacted too, so a replay matches what the client
+    saw while recording.
+    """
+
+    def __init__(self, cassette: Cassette, token: str, upstream: str = UPSTREAM, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.token = token
+        self.upstream = upstream
+        self.redactor = Redactor()
+        self._session: ClientSession = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self._session = ClientSession(headers={"Authorization": f"Bearer {self.token}"})
+        await super().start(host, port)
+
+    async def stop(self):
+        await super().stop()
+        await self._session.close()
+
+    async def _respond(self, method: str, path: str, data: dict):
+        async with self._session.request(method, f"{self.upstream}/{path}", data=data) as response:
+            body = await response.json(content_type=None)
+            headers = {
+                k: v for k, v in response.headers.items()
+                if k.lower().startswith("x-rate-limit-")
+            }
+            status = response.status
+        body = self.redactor.redact(path, body)
+        self.cassette.record(method, path, status, body)
+        return status, body, headers
+
+
+async def _serve(args):
+    kwargs = {
+        "rate_limit": RateLimit(args.limit, args.window) if args.limit else None,
+        "latency": args.latency,
+        "jitter": args.jitter,
+    }
+    if args.record:
+        cassette = Cassette()
+        server = RecordingNatureApi(cassette, args.token, **kwargs)
+    elif args.replay:
+        server = ReplayNatureApi(Cassette.load(args.replay), **kwargs)
+    else:
+        payloads = Payloads(args.remos, args.appliances, args.signals)
+        server = FakeNatureApi(payloads, meter_interval=args.meter_interval, **kwargs)
+    await server.start(args.host, args.port)
+    print(f"Serving on {server.url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        if args.record:
+            cassette.save(args.record)
+            print(f"Recorded {len(cassette.interactions)} responses to {args.record}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--remos", type=int, default=1)
+    parser.add_argument("--appliances", type=int, default=10)
+    parser.add_argument("--signals", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=None,
+                        help="requests per window, unlimited when not given")
+    parser.add_argument("--window", type=float, default=300)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--meter-interval", type=float, default=60)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--record", metavar="CASSETTE")
+    source.add_argument("--replay", metavar="CASSETTE")
+    parser.add_argument("--token", help="Nature access token, for --record")
+    args = parser.parse_args()
+    if args.record and not args.token:
+        parser.error("--record needs --token")
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
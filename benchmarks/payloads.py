@@ -0,0 +1,139 @@
+"""Synthetic /devices and /appliances payloads for benchmarks."""
+from datetime import datetime, timedelta, timezone
+import random
+
+APPLIANCE_TYPES = ["AC", "TV", "LIGHT", "IR", "EL_SMART_METER"]
+
+_TV_BUTTONS = ["power", "input-t", "input-bs", "input-cs", "mute",
+               "vol-up", "vol-down", "ch-up", "ch-down", "play", "pause", "prev", "next"]
+_LIGHT_BUTTONS = ["on", "off", "onoff", "night", "bright-up", "bright-down"]
+_SIGNAL_IMAGES = ["ico_on", "ico_off", "ico_io", "ico_plus", "ico_minus", "ico_1"]
+
+
+def _iso(t: datetime):
+    return t.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class Payloads:
+    """Deterministic account with N Remos, M appliances and K signals each."""
+
+    def __init__(self, remos: int, appliances: int, signals: int, seed: int = 0):
+        self.random = random.Random(seed)
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.devices = [self._device(i, now) for i in range(remos)]
+        self.appliances = [
+            self._appliance(i, self.devices[i % remos], signals, now)
+            for i in range(appliances)
+        ]
+
+    def _device(self, i: int, now: datetime):
+        mac = ":".join(f"{(i >> s) & 0xff:02x}" for s in (40, 32, 24, 16, 8, 0))
+        return {
+            "id": f"device-{i:04d}",
+            "name": f"Remo {i}",
+            "temperature_offset": 0,
+            "humidity_offset": 0,
+            "created_at": _iso(now - timedelta(days=100)),
+            "updated_at": _iso(now),
+            "firmware_version": "Remo/1.0.62-gabbf5bd",
+            "mac_address": mac,
+            "serial_number": f"1W3200{i:08d}",
+            "newest_events": {
+                "te": {"val": 24.5, "created_at": _iso(now)},
+                "hu": {"val": 48, "created_at": _iso(now)},
+                "il": {"val": 120, "created_at": _iso(now)},
+                "mo": {"val": 1, "created_at": _iso(now - timedelta(minutes=5))},
+            },
+        }
+
+    def _appliance(self, i: int, device: dict, signals: int, now: datetime):
+        type = APPLIANCE_TYPES[i % len(APPLIANCE_TYPES)]
+        appliance = {
+            "id": f"appliance-{i:04d}",
+            "device": {k: v for k, v in device.items() if k != "newest_events"},
+            "model": {"id": f"model-{i}", "manufacturer": "Maker", "name": f"Model {i}"},
+            "type": type,
+            "nickname": f"Appliance {i}",
+            "image": "ico_ac_1",
+            "settings": None,
+            "aircon": None,
+            "signals": [
+                {
+                    "id": f"signal-{i:04d}-{k:03d}",
+                    "name": f"Signal {k}",
+                    "image": _SIGNAL_IMAGES[k % len(_SIGNAL_IMAGES)],
+                }
+                for k in range(signals)
+            ],
+        }
+        if type == "AC":
+            temps = [str(x) for x in range(16, 31)]
+            modes = {
+                mode: {"temp": temps, "vol": ["1", "2", "3", "auto"], "dir": ["1", "2", "swing"]}
+                for mode in ("cool", "warm", "dry", "blow", "auto")
+            }
+            appliance["aircon"] = {
+                "range": {"modes": modes, "fixedButtons": ["power-off"]},
+                "tempUnit": "c",
+            }
+            appliance["settings"] = {
+                "temp": "27", "temp_unit": "c", "mode": "cool", "vol": "auto",
+                "dir": "swing", "button": "", "updated_at": _iso(now),
+            }
+        elif type == "TV":
+            appliance["tv"] = {
+                "state": {"input": "t"},
+                "buttons": [{"name": x, "image": "ico_io", "label": x} for x in _TV_BUTTONS],
+            }
+        elif type == "LIGHT":
+            appliance["light"] = {
+                "state": {"brightness": "100", "power": "on", "last_button": "on"},
+                "buttons": [{"name": x, "image": "ico_io", "label": x} for x in _LIGHT_BUTTONS],
+            }
+        elif type == "EL_SMART_METER":
+            appliance["smart_meter"] = {"echonetlite_properties": self._meter(now)}
+        return appliance
+
+    def _meter(self, now: datetime):
+        values = [
+            ("coefficient", 211, "1"),
+            ("cumulative_electric_energy_effective_digits", 215, "6"),
+            ("normal_direction_cumulative_electric_energy", 224, str(self.random.randint(0, 999999))),
+            ("cumulative_electric_energy_unit", 225, "1"),
+            ("reverse_direction_cumulative_electric_energy", 227, "0"),
+            ("measured_instantaneous", 231, str(self.random.randint(100, 3000))),
+        ]
+        return [
+            {"name": name, "epc": epc, "val": val, "updated_at": _iso(now)}
+            for name, epc, val in values
+        ]
+
+    def mutate(self, fraction: float):
+        """Change the state of a fraction of devices and appliances."""
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        for device in self.random.sample(self.devices, max(1, int(len(self.devices) * fraction))):
+            device["newest_events"]["te"] = {
+                "val": round(self.random.uniform(15, 30), 1), "created_at": _iso(now)}
+        count = max(1, int(len(self.appliances) * fraction))
+        for appliance in self.random.sample(self.appliances, count):
+            if appliance["type"] == "AC":
+                appliance["settings"]["temp"] = str(self.random.randint(16, 30))
+                appliance["settings"]["updated_at"] = _iso(now)
+            elif appliance["type"] == "EL_SMART_METER":
+                appliance["smart_meter"]["echonetlite_properties"] = self._meter(now)
+            elif appliance["type"] == "LIGHT":
+                appliance["light"]["state"]["power"] = self.random.choice(["on", "off"])
+            else:
+                appliance["nickname"] = f"Appliance {self.random.randint(0, 1 << 30)}"
+
+    def tick_meters(self, now: datetime):
+        """Report a new Remo E measurement taken at now."""
+        for appliance in self.appliances:
+            if appliance["type"] != "EL_SMART_METER":
+                continue
+            for prop in appliance["smart_meter"]["echonetlite_properties"]:
+                if prop["epc"] == 224:
+                    prop["val"] = str(int(prop["val"]) + self.random.randint(0, 50))
+                elif prop["epc"] == 231:
+                    prop["val"] = str(self.random.randint(100, 3000))
+                prop["updated_at"] = _iso(now)
@@ -1,16 +1,25 @@
 """The Nature Remo integration."""
 import logging
+from typing import Callable, Iterable
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import ConfigEntryAuthFailed
 
-from datetime import datetime
-from homeassistant.helpers import device_registry
+from homeassistant.helpers import device_registry, entity_registry
+from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from homeassistant.const import CONF_ACCESS_TOKEN
 
-from .common import DOMAIN, RESOURCE, AppliancesUpdateCoordinator, NatureUpdateCoordinator, create_appliance_device_info, create_device_device_info
+from .api import NatureApiClient, NatureApiError, create_session
+from .commands import CommandQueue
+from .common import CONF_LOCAL_HOSTS, CONF_RELAY, CONF_SIGNAL_BUTTONS, DOMAIN, AppliancesUpdateCoordinator, NatureUpdateCoordinator, create_appliance_device_info, create_device_device_info
+from .energy import MeterStatistics
+from .local import LocalTransport, async_remove_signals, parse_hosts
+from .metrics import async_get_registry
+from .relay import LONG_POLL, RelaySource, async_setup_relay
+from .scheduler import RateLimitScheduler, async_get_stagger
+from .storage import SnapshotStore
+from .websocket import async_setup_websocket
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -21,75 +30,172 @@ PLATFORMS = ["binary_sensor", "button", "climate",
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up Nature Remo component."""
     _LOGGER.debug("Setting up Nature Remo component.")
-    session = async_get_clientsession(hass)
     dr = device_registry.async_get(hass)
-    hass.data[DOMAIN] = {}
+    data = hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {}
 
     rate_limit = DataUpdateCoordinator(
-        hass, _LOGGER, name="Nature Remo rate limit")
+        hass, _LOGGER, name=f"Nature Remo rate limit {entry.title}")
+    scheduler = RateLimitScheduler(rate_limit, async_get_stagger(hass))
+    session = create_session(hass)
+    relay = entry.data.get(CONF_RELAY)
+    client = NatureApiClient(
+        session, entry.data[CONF_ACCESS_TOKEN], scheduler, resource=relay,
+        metrics=async_get_registry(hass).bind(entry=entry.entry_id))
     devices = NatureUpdateCoordinator(
-        hass, _LOGGER, entry, session, rate_limit, "devices")
-    appliances = AppliancesUpdateCoordinator(
-        hass, _LOGGER, entry, session, rate_limit)
+        hass, _LOGGER, entry, client, "devices")
+    appliances = AppliancesUpdateCoordinator(hass, _LOGGER, entry, client)
+    if relay is not None:
+        devices.long_poll = appliances.long_poll = LONG_POLL
+
+    def remove_devices(ids):
+        for id in ids:
+            d = dr.async_get_device(identifiers={(DOMAIN, id)})
+            if d is not None:
+                _LOGGER.debug("Removing device %s", id)
+                # devices shared with another account stay with that entry
+                dr.async_update_device(d.id, remove_config_entry_id=entry.entry_id)
+
+    # device info last written to the registry, by Nature id
+    registered: dict[str, DeviceInfo] = {}
+
+    def register(coordinator: NatureUpdateCoordinator, create_info: Callable, ids: Iterable[str]):
+        for id in ids:
+            if id not in coordinator.data:
+                registered.pop(id, None)
+                continue
+            info = create_info(coordinator.data[id])
+            if registered.get(id) == info:
+                continue
+            registered[id] = info
+            dr.async_get_or_create(config_entry_id=entry.entry_id, **info)
 
     def update_device_info():
         if not devices.last_update_success:
             return
-        for device in devices.data.values():
-            dr.async_get_or_create(
-                config_entry_id=entry.entry_id,
-                **create_device_device_info(device),
-            )
+        remove_devices(devices.removed)
+        register(devices, create_device_device_info, devices.changed)
 
     def update_appliance_info():
         if not appliances.last_update_success:
             return
-        for appliance in appliances.data.values():
-            dr.async_get_or_create(
-                config_entry_id=entry.entry_id,
-                **create_appliance_device_info(appliance),
-            )
-
-    await devices.async_config_entry_first_refresh()
-    await appliances.async_config_entry_first_refresh()
-    update_device_info()
-    update_appliance_info()
+        remove_devices(appliances.removed)
+        register(appliances, create_appliance_device_info, appliances.changed)
+
+    snapshots = SnapshotStore(hass, entry.entry_id)
+    cached = await snapshots.async_load()
+    restored = []
+    for coordinator in (devices, appliances):
+        if coordinator.path in cached:
+            _LOGGER.debug("Restoring %s from snapshot", coordinator.path)
+            await coordinator.async_restore(cached[coordinator.path])
+            restored.append(coordinator)
+            # attached after the restore, which must not renew the snapshot
+            coordinator.snapshots = snapshots
+        else:
+            coordinator.snapshots = snapshots
+            await coordinator.async_config_entry_first_refresh()
+    register(devices, create_device_device_info, devices.data)
+    register(appliances, create_appliance_device_info, appliances.data)
     entry.async_on_unload(devices.async_add_listener(update_device_info))
     entry.async_on_unload(appliances.async_add_listener(update_appliance_info))
 
-    async def post(path: str, data=None):
-        _LOGGER.debug("Trying to request post:%s, data:%s", path, data)
-        access_token = entry.data[CONF_ACCESS_TOKEN]
-        headers = {"Authorization": f"Bearer {access_token}"}
-        response = await session.post(
-            f"{RESOURCE}/{path}", data=data, headers=headers
-        )
-        if response.status == 401:
-            raise ConfigEntryAuthFailed()
-        if "x-rate-limit-remaining" in response.headers:
-            remaining = int(response.headers.get("x-rate-limit-remaining"))
-            reset = datetime.fromtimestamp(
-                int(response.headers.get("x-rate-limit-reset")))
-            rate_limit.async_set_updated_data(
-                {"remaining": remaining, "reset": reset})
-        if response.status != 200:
-            raise UpdateFailed(f"status code: {response.status}")
-        return await response.json()
-
-    hass.data[DOMAIN]["devices"] = devices
-    hass.data[DOMAIN]["appliances"] = appliances
-    hass.data[DOMAIN]["post"] = post
-
-    for d in list(dr.devices.values()):
+    if "recorder" in hass.config.components:
+        statistics = MeterStatistics(hass, appliances)
+        entry.async_on_unload(appliances.async_add_listener(statistics.async_update))
+        statistics.async_update()
+
+    data["client"] = client
+    data["devices"] = devices
+    data["appliances"] = appliances
+    queue = CommandQueue(hass, client.async_post)
+    entry.async_on_unload(queue.async_shutdown)
+    data["post"] = queue.async_post
+    if relay is None:
+        data["relay"] = RelaySource(entry, [devices, appliances], scheduler, queue.async_post)
+        async_setup_relay(hass)
+
+    local = LocalTransport(
+        hass, async_get_clientsession(hass), entry.entry_id, devices, appliances,
+        parse_hosts(entry.options.get(CONF_LOCAL_HOSTS, "")))
+    await local.async_load()
+    await local.async_start_discovery()
+    entry.async_on_unload(local.async_stop)
+    queue.local = local
+    data["local"] = local
+    data["options"] = dict(entry.options)
+    async_setup_websocket(hass)
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+
+    for d in device_registry.async_entries_for_config_entry(dr, entry.entry_id):
         id = next((x[1] for x in d.identifiers if x[0] == DOMAIN), None)
         if (id is not None) and (id not in devices.data.keys()) and (id not in appliances.data.keys()):
-            dr.async_remove_device(d.id)
+            dr.async_update_device(d.id, remove_config_entry_id=entry.entry_id)
+
+    if entry.unique_id in (None, DOMAIN):
+        entry.async_create_background_task(
+            hass, _async_migrate_unique_id(hass, entry, client), "nature_remo unique id migration")
 
     # hass.config_entries.async_setup_platforms(entry, PLATFORMS)
     await hass.config_entries.async_forward_entry_setups(entry,PLATFORMS)
+    for coordinator in restored:
+        # startup does not wait for the cloud, unload cancels the refresh
+        entry.async_create_background_task(
+            hass, coordinator.async_refresh(), f"nature_remo refresh {coordinator.path}")
+    return True
+
+
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry):
+    if entry.version == 1:
+        # Signal buttons became opt-in, keep the appliances that have them.
+        options = dict(entry.options)
+        if CONF_SIGNAL_BUTTONS not in options:
+            options[CONF_SIGNAL_BUTTONS] = _appliances_with_buttons(hass, entry)
+        entry.version = 2
+        hass.config_entries.async_update_entry(entry, options=options)
     return True
 
 
+def _appliances_with_buttons(hass: HomeAssistant, entry: ConfigEntry) -> list[str]:
+    dr = device_registry.async_get(hass)
+    er = entity_registry.async_get(hass)
+    appliances = set()
+    for x in entity_registry.async_entries_for_config_entry(er, entry.entry_id):
+        device = dr.async_get(x.device_id) if x.domain == "button" and x.device_id else None
+        if device is not None:
+            appliances.update(id for domain, id in device.identifiers if domain == DOMAIN)
+    return sorted(appliances)
+
+
+async def _async_migrate_unique_id(hass: HomeAssistant, entry: ConfigEntry, client: NatureApiClient):
+    """Replace the unique id of entries created before multiple accounts."""
+    try:
+        response = await client.async_get("users/me")
+    except NatureApiError as err:
+        _LOGGER.debug("Keeping legacy unique id until next setup: %s", err)
+        return
+    user_id = response.json()["id"]
+    for other in hass.config_entries.async_entries(DOMAIN):
+        if other.unique_id == user_id:
+            _LOGGER.warning(
+                "%s and %s use the same Nature account", entry.title, other.title)
+            return
+    hass.config_entries.async_update_entry(entry, unique_id=user_id)
+
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry):
+    # unique id and token updates do not need a reload
+    if entry.options != hass.data[DOMAIN][entry.entry_id]["options"]:
+        await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    await SnapshotStore(hass, entry.entry_id).async_remove()
+    await async_remove_signals(hass, entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        hass.data[DOMAIN].pop(entry.entry_id)
+    return unload_ok
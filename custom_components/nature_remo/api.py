@@ -0,0 +1,204 @@
+"""Client for the Nature Remo cloud API."""
+import asyncio
+import logging
+import random
+from time import monotonic
+
+from aiohttp import ClientConnectorError, ClientError, ClientSession, ClientTimeout
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.util.dt import utc_from_timestamp, utcnow
+from homeassistant.util.json import json_loads
+
+from .metrics import LATENCY_BUCKETS, SIZE_BUCKETS, BoundMetrics, MetricsRegistry, endpoint_of
+from .predictor import ClockOffset
+from .scheduler import RateLimitScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+RESOURCE = "https://api.nature.global/1"
+
+# Deadline of a single attempt and of a whole request including retries.
+REQUEST_TIMEOUT = 15
+REQUEST_DEADLINE = 30
+
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1
+BACKOFF_MAX = 10
+
+
+class NatureApiError(HomeAssistantError):
+    """The Nature Remo API returned an error."""
+
+
+class NatureAuthError(NatureApiError):
+    """The access token was rejected."""
+
+
+class NatureRateLimitError(NatureApiError):
+    """The rate limit of the access token is exhausted."""
+
+    def __init__(self, reset):
+        super().__init__(f"rate limit exceeded until {reset}")
+        self.reset = reset
+
+
+class ApiResponse:
+    __slots__ = ("body", "elapsed", "headers", "status")
+
+    def __init__(self, status: int, headers, body: bytes, elapsed: float):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.elapsed = elapsed
+
+    def json(self):
+        return json_loads(self.body) if self.body else None
+
+
+def create_session(hass: HomeAssistant) -> ClientSession:
+    """Create the session of a config entry on Home Assistant's connector.
+
+    The session adds the attempt timeout and is detached when the entry
+    unloads. Keep-alive and connection limits are those of the shared
+    connector, which cannot be tuned per session, so connections to the
+    cloud may close between polls.
+    """
+    return async_create_clientsession(hass, timeout=ClientTimeout(total=REQUEST_TIMEOUT))
+
+
+class NatureApiClient:
+    """Authenticated access to the cloud API with deadlines and retries.
+
+    GET requests are retried on timeouts, connection errors and 5xx with
+    jittered exponential backoff. POST requests are only retried when the
+    server cannot have acted on them: the connection was never established
+    or the request was rejected with 429. A 429 waits for the reported
+    reset if it falls within the request deadline.
+    """
+
+    def __init__(
+        self,
+        session: ClientSession,
+        access_token: str,
+        scheduler: RateLimitScheduler = None,
+        resource: str = None,
+        metrics: MetricsRegistry | BoundMetrics = None,
+    ) -> None:
+        self.session = session
+        self.scheduler = scheduler
+        self.resource = resource or RESOURCE
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.clock = ClockOffset()
+        self._headers = {"Authorization": f"Bearer {access_token}"}
+
+    async def async_get(self, path: str, etag: str = None, hold: float = 0) -> ApiResponse:
+        """GET a path, 304 when it still matches etag.
+
+        hold is how long a relay may keep the request open waiting for a
+        change, on top of the usual deadlines.
+        """
+        if etag is None:
+            return await self.async_request("GET", path)
+        return await self.async_request(
+            "GET", path, headers={"If-None-Match": etag},
+            params={"wait": str(hold)} if hold else None, hold=hold)
+
+    async def async_post(self, path: str, data=None):
+        _LOGGER.debug("Trying to request post:%s, data:%s", path, data)
+        if self.scheduler is not None:
+            self.scheduler.note_post()
+        response = await self.async_request("POST", path, data)
+        return response.json()
+
+    async def async_request(
+        self, method: str, path: str, data=None, headers=None, params=None, hold: float = 0
+    ) -> ApiResponse:
+        idempotent = method == "GET"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + REQUEST_DEADLINE + hold
+        attempt = 0
+        while True:
+            attempt += 1
+            left = deadline - loop.time()
+            try:
+                response = await self._async_send(
+                    method, path, data, min(REQUEST_TIMEOUT + hold, left), headers, params)
+            except ClientConnectorError as err:
+                self._count_error(method, path, "connection")
+                error = NatureApiError(f"cannot connect: {err}")
+            except asyncio.TimeoutError:
+                self._count_error(method, path, "timeout")
+                error = NatureApiError(f"timeout requesting {path}")
+                if not idempotent:
+                    raise error
+            except ClientError as err:
+                self._count_error(method, path, "connection")
+                error = NatureApiError(f"error requesting {path}: {err}")
+                if not idempotent:
+                    raise error from err
+            else:
+                if response.status in (200, 304):
+                    return response
+                if response.status == 401:
+                    raise NatureAuthError()
+                if response.status == 429:
+                    self._count_error(method, path, "429")
+                    reset = _reset_of(response)
+                    wait = (reset - utcnow()).total_seconds() + random.uniform(0.5, 1.5)
+                    if attempt >= MAX_ATTEMPTS or wait > deadline - loop.time():
+                        raise NatureRateLimitError(reset)
+                    _LOGGER.debug("Rate limited, retrying %s in %.1fs", path, wait)
+                    await asyncio.sleep(max(wait, 0))
+                    continue
+                error = NatureApiError(f"status code: {response.status}")
+                if response.status >= 500:
+                    self._count_error(method, path, "5xx")
+                if response.status < 500 or not idempotent:
+                    raise error
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+            delay *= random.uniform(0.5, 1.5)
+            if attempt >= MAX_ATTEMPTS or delay > deadline - loop.time():
+                raise error
+            _LOGGER.debug("%s, retrying %s in %.1fs", error, path, delay)
+            await asyncio.sleep(delay)
+
+    async def _async_send(self, method: str, path: str, data, timeout: float, headers=None, params=None) -> ApiResponse:
+        start = monotonic()
+        async with self.session.request(
+            method,
+            f"{self.resource}/{path}",
+            data=data,
+            params=params,
+            headers={**self._headers, **headers} if headers else self._headers,
+            timeout=ClientTimeout(total=timeout),
+        ) as response:
+            body = await response.read()
+        elapsed = monotonic() - start
+        if "Date" in response.headers:
+            self.clock.add(response.headers["Date"], utcnow())
+        self._record(method, path, response.status, response.headers, len(body), elapsed)
+        if self.scheduler is not None:
+            self.scheduler.update(response.headers)
+        return ApiResponse(response.status, response.headers, body, elapsed)
+
+    def _record(self, method: str, path: str, status: int, headers, size: int, elapsed: float):
+        labels = {"method": method, "endpoint": endpoint_of(path)}
+        self.metrics.inc("requests_total", {**labels, "status": str(status)})
+        self.metrics.observe("request_duration_seconds", elapsed, LATENCY_BUCKETS, labels)
+        self.metrics.observe("response_size_bytes", size, SIZE_BUCKETS, labels)
+        if "x-rate-limit-remaining" in headers:
+            self.metrics.set("rate_limit_remaining", int(headers["x-rate-limit-remaining"]))
+        if "x-rate-limit-reset" in headers:
+            self.metrics.set("rate_limit_reset_timestamp_seconds", int(headers["x-rate-limit-reset"]))
+
+    def _count_error(self, method: str, path: str, kind: str):
+        self.metrics.inc("request_errors_total", {
+            "method": method, "endpoint": endpoint_of(path), "kind": kind})
+
+
+def _reset_of(response: ApiResponse):
+    if "x-rate-limit-reset" not in response.headers:
+        return utcnow()
+    return utc_from_timestamp(int(response.headers["x-rate-limit-reset"]))
@@ -1,23 +1,27 @@
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
 import logging
 
 from homeassistant.components.binary_sensor import BinarySensorDeviceClass, BinarySensorEntity
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.util.dt import utcnow
 
-from .common import DOMAIN, NatureUpdateCoordinator, RemoSensorEntity, check_update, create_device_device_info, str_to_datetime
+from .common import DOMAIN, NatureUpdateCoordinator, RemoSensorEntity, check_update, create_device_device_info
+from .models import Device
 
 _LOGGER = logging.getLogger(__name__)
 
+MOTION_TIMEOUT = timedelta(minutes=1)
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities):
     _LOGGER.debug("Setting up binary_sensor platform.")
-    devices: NatureUpdateCoordinator = hass.data[DOMAIN]["devices"]
+    devices: NatureUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]["devices"]
 
-    def on_add(device: dict):
+    def on_add(device: Device):
         device_info = create_device_device_info(device)
-        if 'mo' in device['newest_events']:
+        if 'mo' in device.newest_events:
             yield RemoMotionEntity(devices, device, device_info)
 
     check_update(entry, async_add_entities, devices, on_add)
@@ -26,12 +30,13 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
 class RemoMotionEntity(RemoSensorEntity, BinarySensorEntity):
     _attr_device_class = BinarySensorDeviceClass.MOTION.value
 
-    def __init__(self, coordinator: NatureUpdateCoordinator, device: dict, device_info: DeviceInfo):
+    def __init__(self, coordinator: NatureUpdateCoordinator, device: Device, device_info: DeviceInfo):
         super().__init__(coordinator, device, device_info, "mo")
 
-    def _on_data_update(self, device: dict):
+    def _on_data_update(self, device: Device):
         super()._on_data_update(device)
-        mo: dict[str, str] = device['newest_events']['mo']
-        created_at = str_to_datetime(mo['created_at'])
-        limit = datetime.now(timezone.utc) - timedelta(minutes=1)
-        self._attr_is_on = created_at >= limit
+        self._deadline = device.newest_events['mo'].created_at + MOTION_TIMEOUT
+        self._attr_is_on = self._deadline > utcnow()
+
+    def _on_deadline(self):
+        self._attr_is_on = False
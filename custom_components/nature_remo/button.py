@@ -1,40 +1,130 @@
+from functools import partial
 import logging
 from typing import Callable
 
 from homeassistant.components.button import ButtonEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry
 from homeassistant.helpers.entity import DeviceInfo
 
-from .common import (DOMAIN, ICONS_MAP, AppliancesUpdateCoordinator, NatureEntity,
+from .common import (CONF_SIGNAL_BUTTONS, DOMAIN, ICONS_MAP, AppliancesUpdateCoordinator,
                      check_update, create_appliance_device_info)
+from .models import Appliance, Command
 
 _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities):
     _LOGGER.debug("Setting up button platform.")
-    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN]["appliances"]
-    post: Callable = hass.data[DOMAIN]["post"]
+    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]["appliances"]
+    post: Callable = hass.data[DOMAIN][entry.entry_id]["post"]
+    # appliances with signal buttons, none until chosen in the options
+    selected = frozenset(entry.options.get(CONF_SIGNAL_BUTTONS, ()))
+    _remove_deselected(hass, entry, appliances, selected)
+    groups: dict[str, SignalButtons] = {}
 
-    def on_add(appliance: dict):
+    def on_add(appliance: Appliance):
+        id = appliance.id
+        if id not in selected:
+            return
+        group = groups.get(id)
+        if group is None:
+            group = groups[id] = SignalButtons(appliances, id)
         device_info = create_appliance_device_info(appliance)
-        for signal in appliance["signals"]:
-            yield SignalButtonEntity(appliances, post, signal, device_info)
+        for signal in appliances.structures[id].commands.signals:
+            yield SignalButtonEntity(group, post, signal, device_info)
 
     check_update(entry, async_add_entities, appliances, on_add)
 
 
-class SignalButtonEntity(NatureEntity, ButtonEntity):
-    def __init__(self, appliances: AppliancesUpdateCoordinator, post: Callable, signal: str, device_info: DeviceInfo):
-        super().__init__(appliances, signal["id"], signal["id"], device_info)
-        self._attr_icon = ICONS_MAP.get(signal["image"])
-        self._attr_name = signal["name"]
+def _remove_deselected(hass: HomeAssistant, entry: ConfigEntry, appliances: AppliancesUpdateCoordinator, selected: frozenset):
+    """Remove the buttons of appliances that no longer have them."""
+    deselected = {
+        signal.id
+        for id, structure in appliances.structures.items()
+        if id not in selected
+        for signal in structure.commands.signals
+    }
+    registry = entity_registry.async_get(hass)
+    for x in entity_registry.async_entries_for_config_entry(registry, entry.entry_id):
+        if x.domain == "button" and x.unique_id in deselected:
+            _LOGGER.debug("Removing %s", x.entity_id)
+            registry.async_remove(x.entity_id)
+
+
+class SignalButtons:
+    """The signal buttons of one appliance, kept current by one listener."""
+
+    def __init__(self, appliances: AppliancesUpdateCoordinator, appliance_id: str):
+        self.appliances = appliances
+        self.appliance_id = appliance_id
+        self._entities: dict[str, SignalButtonEntity] = {}
+        self._unsub: Callable = None
+
+    @callback
+    def async_add(self, entity: "SignalButtonEntity"):
+        if not self._entities:
+            self._unsub = self.appliances.async_add_listener(self._on_update)
+        self._entities[entity.signal_id] = entity
+
+    @callback
+    def async_remove(self, entity: "SignalButtonEntity"):
+        self._entities.pop(entity.signal_id, None)
+        if not self._entities and self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _on_update(self):
+        appliances = self.appliances
+        if (
+            not appliances.last_update_success
+            or self.appliance_id not in appliances.changed
+        ):
+            return
+        structure = appliances.structures.get(self.appliance_id)
+        commands = structure.commands if structure is not None else None
+        for entity in self._entities.values():
+            signal = commands.get(entity.signal_id) if commands is not None else None
+            if entity.update_signal(signal):
+                appliances.written += 1
+                entity.async_write_ha_state()
+
+
+class SignalButtonEntity(ButtonEntity):
+    _attr_icon = None
+    _attr_name = None
+    _attr_should_poll = False
+
+    def __init__(self, group: SignalButtons, post: Callable, signal: Command, device_info: DeviceInfo):
+        self._group = group
+        self.signal_id = signal.id
+        self._attr_unique_id = signal.id
+        self._attr_device_info = device_info
         self._post = post
+        self.update_signal(signal)
+
+    async def async_added_to_hass(self):
+        self._group.async_add(self)
+        self.async_on_remove(partial(self._group.async_remove, self))
 
-    @property
-    def available(self):
-        return True
+    def update_signal(self, signal: Command) -> bool:
+        """Take over the name and icon of the signal, return whether it changed."""
+        if signal is None:
+            changed = self._attr_available
+            self._attr_available = False
+            return changed
+        icon = ICONS_MAP.get(signal.image)
+        changed = (
+            not self._attr_available
+            or self._attr_name != signal.name
+            or self._attr_icon != icon
+        )
+        self._attr_available = True
+        self._attr_name = signal.name
+        self._attr_icon = icon
+        return changed
 
     async def async_press(self):
-        await self._post(f"signals/{self._remo_id}/send")
+        await self._post(f"signals/{self.signal_id}/send", key=self._group.appliance_id, local=self.signal_id)
@@ -1,5 +1,5 @@
 """Support for Nature Remo AC."""
-from datetime import timedelta
+from datetime import datetime
 import logging
 from typing import Callable
 
@@ -19,15 +19,18 @@ from homeassistant.components.climate.const import (
 )
 # from homeassistant.const import TEMP_CELSIUS, TEMP_FAHRENHEIT
 from homeassistant.helpers.entity import DeviceInfo
-from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.restore_state import RestoreEntity
 
 from homeassistant.const import UnitOfTemperature
 
-from .common import DOMAIN, AppliancesUpdateCoordinator, NatureEntity, NatureUpdateCoordinator, check_update, create_appliance_device_info
+from .commands import DEFAULT_SETTINGS_WINDOW, SettingsPipeline
+from .models import Appliance, ApplianceStructure, Device, aircon_settings_of
+from .common import CONF_SETTINGS_WINDOW, DOMAIN, AppliancesUpdateCoordinator, NatureEntity, NatureUpdateCoordinator, check_update, create_appliance_device_info
 
 _LOGGER = logging.getLogger(__name__)
 
+TYPES = ["AC"]
+
 DEFAULT_COOL_TEMP = 28
 DEFAULT_HEAT_TEMP = 20
 
@@ -51,6 +54,15 @@ MODE_REMO_TO_HA = {
     "power-off": HVAC_MODE_OFF,
 }
 
+# request parameters of aircon_settings and the setting they change
+SETTINGS_OF_PARAMS = {
+    "air_direction": "dir",
+    "air_volume": "vol",
+    "button": "button",
+    "operation_mode": "mode",
+    "temperature": "temp",
+}
+
 TEMP_UNIT_REMO_TO_HA = {
     "c": UnitOfTemperature.CELSIUS,
     "f": UnitOfTemperature.FAHRENHEIT,
@@ -68,46 +80,54 @@ DEFAULT_TEMP = {
 async def async_setup_entry(hass, entry: ConfigEntry, async_add_entities):
     """Set up the Nature Remo AC."""
     _LOGGER.debug("Setting up climate platform.")
-    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN]["appliances"]
-    devices: NatureUpdateCoordinator = hass.data[DOMAIN]["devices"]
-    post: Callable = hass.data[DOMAIN]["post"]
+    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]["appliances"]
+    devices: NatureUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]["devices"]
+    post: Callable = hass.data[DOMAIN][entry.entry_id]["post"]
+    window = entry.options.get(CONF_SETTINGS_WINDOW, DEFAULT_SETTINGS_WINDOW) / 1000
 
-    def on_add(appliance: dict):
-        if appliance["type"] != "AC":
-            return
+    def on_add(appliance: Appliance):
         device_info = create_appliance_device_info(appliance)
-        yield AirconEntity(appliances, devices, post, appliance, device_info)
+        yield AirconEntity(appliances, devices, post, appliance, device_info, window)
 
-    check_update(entry, async_add_entities, appliances, on_add)
+    check_update(entry, async_add_entities, appliances, on_add, TYPES)
 
 
 class AirconEntity(NatureEntity, ClimateEntity, RestoreEntity):
     """Implementation of a Nature Remo E sensor."""
 
     _attr_supported_features = SUPPORT_FLAGS
-    _last_target_temperature = {}
-    _next_settings = None
-    _post_cancel = None
-    _updated_at: str = None
+    _structure: ApplianceStructure = None
+    _updated_at: datetime = None
 
-    def __init__(self, appliances: AppliancesUpdateCoordinator, devices: NatureUpdateCoordinator, post: Callable, appliance: dict, device_info: DeviceInfo):
+    def __init__(self, appliances: AppliancesUpdateCoordinator, devices: NatureUpdateCoordinator, post: Callable, appliance: Appliance, device_info: DeviceInfo, window: float):
         super().__init__(appliances,
-                         appliance["id"], appliance["id"], device_info)
-        self._attr_name: str = appliance['nickname']
+                         appliance.id, appliance.id, device_info)
+        self._attr_name: str = appliance.nickname
         self.devices = devices
-        self._device_id: str = appliance["device"]["id"]
+        self._device_id: str = appliance.device_id
         self._post = post
-        self._modes: dict = appliance["aircon"]["range"]["modes"]
         self._remo_mode = None
+        self._last_target_temperature: dict[str, str] = {}
+        # settings last confirmed by the API, the displayed state adds
+        # the changes that are still on their way
+        self._settings: dict = None
+        self._pipeline = SettingsPipeline(
+            appliances.hass, self._async_send, self._on_settled, window)
         self.async_on_remove(
             devices.async_add_listener(self._on_device_update))
         self._on_data_update(appliance)
-        self._on_device_update()
+        if self._device_id in devices.data:
+            self._update_device(devices.data[self._device_id])
 
     async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(self._pipeline.async_cancel)
         state = await self.async_get_last_state()
         if state is not None and state.attributes is not None:
-            self._last_target_temperature = state.attributes["previous_target_temperature"]
+            previous = state.attributes.get("previous_target_temperature")
+            if isinstance(previous, dict):
+                self._last_target_temperature = {
+                    **previous, **self._last_target_temperature}
 
     @property
     def min_temp(self):
@@ -136,33 +156,25 @@ class AirconEntity(NatureEntity, ClimateEntity, RestoreEntity):
                 return step
         return 1
 
-    @property
-    def hvac_modes(self):
-        """Return the list of available operation modes."""
-        remo_modes = list(self._modes.keys())
-        ha_modes = list(map(lambda mode: MODE_REMO_TO_HA[mode], remo_modes))
-        ha_modes.append(HVAC_MODE_OFF)
-        return ha_modes
-
     @property
     def fan_modes(self):
         """List of available fan modes."""
-        return self._modes[self._remo_mode]["vol"]
+        return self._structure.aircon.vols[self._remo_mode]
 
     @property
     def swing_modes(self):
         """List of available swing modes."""
-        return self._modes[self._remo_mode]["dir"]
+        return self._structure.aircon.dirs[self._remo_mode]
 
     @property
     def extra_state_attributes(self):
         """Return device specific state attributes."""
         return {
             "previous_target_temperature": self._last_target_temperature,
-            "updated_at": self._updated_at
+            "updated_at": self._updated_at.isoformat() if self._updated_at else None,
         }
 
-    def set_temperature(self, temperature=None, hvac_mode=None, **kwargs):
+    async def async_set_temperature(self, temperature=None, hvac_mode=None, **kwargs):
         data = {}
         if hvac_mode is not None:
             _LOGGER.debug("Set hvac mode: %s", hvac_mode)
@@ -170,43 +182,72 @@ class AirconEntity(NatureEntity, ClimateEntity, RestoreEntity):
             if mode == MODE_HA_TO_REMO[HVAC_MODE_OFF]:
                 data["button"] = mode
             else:
+                # an empty button turns the aircon on, and replaces a
+                # power-off still pending in the same batch
+                data["button"] = ""
                 data["operation_mode"] = mode
                 if self._last_target_temperature.get(mode):
                     data["temperature"] = self._last_target_temperature[mode]
                 elif DEFAULT_TEMP.get(hvac_mode):
-                    data["temperature"] = DEFAULT_TEMP[hvac_mode]
+                    data["temperature"] = f"{DEFAULT_TEMP[hvac_mode]}"
 
         if temperature is not None:
             if temperature.is_integer():
                 # has to cast to whole number otherwise API will return an error
                 temperature = int(temperature)
-            _LOGGER.debug("Set temperature: %d", temperature)
+            _LOGGER.debug("Set temperature: %s", temperature)
             data["temperature"] = f"{temperature}"
 
-        self._set_settings(data)
+        await self._async_set_settings(data)
 
-    def set_hvac_mode(self, hvac_mode):
-        self.set_temperature(hvac_mode=hvac_mode)
+    async def async_set_hvac_mode(self, hvac_mode):
+        await self.async_set_temperature(hvac_mode=hvac_mode)
 
-    def set_fan_mode(self, fan_mode):
+    async def async_set_fan_mode(self, fan_mode):
         """Set new target fan mode."""
         _LOGGER.debug("Set fan mode: %s", fan_mode)
-        self._set_settings({"air_volume": fan_mode})
+        await self._async_set_settings({"air_volume": fan_mode})
 
-    def set_swing_mode(self, swing_mode):
+    async def async_set_swing_mode(self, swing_mode):
         _LOGGER.debug("Set swing mode: %s", swing_mode)
-        self._set_settings({"air_direction": swing_mode})
+        await self._async_set_settings({"air_direction": swing_mode})
 
-    def _on_data_update(self, appliance: dict):
+    def _on_data_update(self, appliance: Appliance):
         super()._on_data_update(appliance)
-        self._on_settings_update(appliance["settings"])
+        structure = self.coordinator.structures[self._remo_id]
+        if structure is not self._structure:
+            self._structure = structure
+            self._attr_hvac_modes = [MODE_REMO_TO_HA[x] for x in structure.aircon.modes]
+            self._attr_hvac_modes.append(HVAC_MODE_OFF)
+        self._on_confirmed(appliance.settings)
+
+    def _on_confirmed(self, ac_settings: dict):
+        # a poll that started before the last POST returned is older
+        if (
+            self._settings is not None
+            and ac_settings["updated_at"] is not None
+            and self._settings["updated_at"] is not None
+            and self._settings["updated_at"] > ac_settings["updated_at"]
+        ):
+            return
+        self._settings = ac_settings
+        if ac_settings["temp"]:
+            self._last_target_temperature[ac_settings["mode"]] = ac_settings["temp"]
+        self._render()
+
+    def _render(self):
+        """Show the confirmed settings with the unsent changes on top."""
+        ac_settings = dict(self._settings)
+        for changes in (self._pipeline.in_flight, self._pipeline.pending):
+            for param, value in (changes or {}).items():
+                ac_settings[SETTINGS_OF_PARAMS[param]] = value
+        self._on_settings_update(ac_settings)
 
     def _on_settings_update(self, ac_settings: dict):
         # hold this to determin the ac mode while it's turned-off
         self._remo_mode: str = ac_settings["mode"]
         try:
             self._attr_target_temperature = float(ac_settings["temp"])
-            self._last_target_temperature[self._remo_mode] = ac_settings["temp"]
         except:
             self._attr_target_temperature = None
 
@@ -218,38 +259,44 @@ class AirconEntity(NatureEntity, ClimateEntity, RestoreEntity):
         self._attr_fan_mode = ac_settings["vol"] or None
         self._attr_swing_mode = ac_settings["dir"] or None
         self._attr_temperature_unit = TEMP_UNIT_REMO_TO_HA[ac_settings["temp_unit"]]
-        self._updated_at: str = ac_settings["updated_at"] or None
+        self._updated_at: datetime = ac_settings["updated_at"]
 
     @callback
     def _on_device_update(self):
-        if not self.devices.last_update_success:
+        if (
+            not self.devices.last_update_success
+            or self._device_id not in self.devices.changed
+            or self._device_id not in self.devices.data
+        ):
             return
-        device: dict[str, dict[str, dict[str, str]]
-                     ] = self.devices.data[self._device_id]
-        newest_events = device["newest_events"]
-        self._attr_current_temperature = float(newest_events["te"]["val"])
-        self._attr_current_humidity = int(newest_events["hu"]["val"])
-
-    def _set_settings(self, data: dict):
-        if self._next_settings is None:
-            self._next_settings = data
-        else:
-            self._next_settings.update(data)
-        if self._post_cancel is not None:
-            self._post_cancel()
-        self._post_cancel = async_call_later(
-            self.hass, timedelta(milliseconds=100), self._on_post)
-
-    async def _on_post(self, *_):
-        self._post_cancel = None
-        data = self._next_settings
-        self._next_settings = None
+        self._update_device(self.devices.data[self._device_id])
+        if self.hass is not None:
+            self.devices.written += 1
+            self.async_write_ha_state()
+
+    def _update_device(self, device: Device):
+        newest_events = device.newest_events
+        self._attr_current_temperature = float(newest_events["te"].val)
+        self._attr_current_humidity = int(newest_events["hu"].val)
+
+    async def _async_set_settings(self, data: dict):
+        waiter = self._pipeline.async_set(data)
+        # show the change right away, _on_settled rolls it back on failure
+        self._render()
+        self.async_write_ha_state()
+        await waiter
+
+    async def _async_send(self, data: dict):
         ac_settings = await self._post(
-            f"appliances/{self._remo_id}/aircon_settings", data
+            f"appliances/{self._remo_id}/aircon_settings", data, key=self._remo_id
         )
-        self._on_settings_update(ac_settings)
-        self._async_write_ha_state()
+        self._on_confirmed(aircon_settings_of(ac_settings))
+
+    @callback
+    def _on_settled(self):
+        self._render()
+        if self.hass is not None:
+            self.async_write_ha_state()
 
     def _current_mode_temp_range(self):
-        temp_range = self._modes[self._remo_mode]["temp"]
-        return list(map(float, filter(None, temp_range)))
+        return self._structure.aircon.temps.get(self._remo_mode, [])
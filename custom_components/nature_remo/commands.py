@@ -0,0 +1,383 @@
+"""Outbound command queue for the Nature Remo cloud API."""
+import asyncio
+from collections import deque
+import heapq
+from itertools import count
+import logging
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_call_later
+
+if TYPE_CHECKING:
+    from .local import LocalTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_USER = 0
+PRIORITY_BACKGROUND = 1
+
+MAX_CONCURRENT = 2
+
+DEFAULT_SETTINGS_WINDOW = 500
+
+# pipelined requests of one key in flight at a time
+PIPELINE_DEPTH = MAX_CONCURRENT
+
+
+class _Command:
+    __slots__ = ("coalesce", "data", "futures", "key", "local", "path", "pipeline", "priority")
+
+    def __init__(self, key: str, path: str, data, priority: int, coalesce: str, local: str, pipeline: bool):
+        self.key = key
+        self.path = path
+        self.data = data
+        self.priority = priority
+        self.coalesce = coalesce
+        self.local = local
+        self.pipeline = pipeline
+        self.futures: list[asyncio.Future] = []
+
+
+class CommandQueue:
+    """Order, coalesce and bound the commands sent to appliances.
+
+    Commands for the same key (usually the appliance id) run one at a time
+    in submission order, different keys run in parallel up to
+    MAX_CONCURRENT requests. Pipelined commands are dispatched in order
+    while up to PIPELINE_DEPTH earlier pipelined commands of their key
+    still wait for a response. Free slots go to user commands before
+    background ones, and a key waiting for a slot takes the priority of
+    its most urgent command. A command submitted with a coalesce key
+    replaces a pending command with the same key and coalesce key, which
+    moves to the tail so it never overtakes commands submitted before it;
+    every caller receives the result of the request that was finally sent.
+
+    When a local transport is set, commands that name a captured payload
+    are sent on the LAN first and only fall back to the cloud if that
+    fails; a local send resolves to None. A command without a path can
+    only be sent locally.
+    """
+
+    local: "LocalTransport" = None
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        execute: Callable[[str, Any], Awaitable],
+        max_concurrent: int = MAX_CONCURRENT,
+    ) -> None:
+        self.hass = hass
+        self._execute = execute
+        self._lanes: dict[str, deque[_Command]] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+        self._slots = max_concurrent
+        self._waiters: list[list] = []
+        # the waiter of every lane that waits for a slot
+        self._waiting: dict[str, list] = {}
+        self._seq = count()
+
+    async def async_post(
+        self,
+        path: str,
+        data=None,
+        *,
+        key: str = None,
+        priority: int = PRIORITY_USER,
+        coalesce: str = None,
+        local: str = None,
+        pipeline: bool = False,
+    ):
+        if key is None:
+            key = path
+        future = self.hass.loop.create_future()
+        queue = self._lanes.setdefault(key, deque())
+        command = None
+        if coalesce is not None:
+            command = next((x for x in queue if x.coalesce == coalesce), None)
+        if command is not None:
+            _LOGGER.debug("Coalescing %s into pending %s", path, command.path)
+            queue.remove(command)
+            command.path = path
+            command.data = data
+            command.local = local
+            command.priority = min(command.priority, priority)
+        else:
+            command = _Command(key, path, data, priority, coalesce, local, pipeline)
+        queue.append(command)
+        command.futures.append(future)
+        waiter = self._waiting.get(key)
+        if waiter is not None and priority < waiter[0]:
+            waiter[0] = priority
+            heapq.heapify(self._waiters)
+        if key not in self._workers:
+            self._workers[key] = self.hass.async_create_task(self._run(key))
+        return await future
+
+    async def async_shutdown(self):
+        for task in list(self._workers.values()):
+            task.cancel()
+        for lane in self._lanes.values():
+            for command in lane:
+                for future in command.futures:
+                    future.cancel()
+        self._lanes.clear()
+
+    async def _run(self, name: str):
+        lane = self._lanes[name]
+        in_flight: dict[asyncio.Task, _Command] = {}
+        try:
+            while lane or in_flight:
+                if in_flight and not self._may_dispatch(lane, in_flight):
+                    await asyncio.wait(list(in_flight), return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                # The head stays in the lane until a slot is free, so later
+                # submissions can still be coalesced into it.
+                await self._acquire(name, min(x.priority for x in lane))
+                if in_flight and not self._may_dispatch(lane, in_flight):
+                    # a coalesced command moved and the new head may not overlap
+                    self._release()
+                    continue
+                command = lane.popleft()
+                task = self.hass.async_create_task(self._async_dispatch(command))
+                in_flight[task] = command
+                task.add_done_callback(in_flight.pop)
+        except asyncio.CancelledError:
+            for task in in_flight:
+                task.cancel()
+            raise
+        finally:
+            del self._workers[name]
+            if not lane:
+                self._lanes.pop(name, None)
+
+    @staticmethod
+    def _may_dispatch(lane: deque[_Command], in_flight: dict[asyncio.Task, _Command]) -> bool:
+        """Return whether the head may go out beside the commands in flight."""
+        return (
+            bool(lane)
+            and lane[0].pipeline
+            and len(in_flight) < PIPELINE_DEPTH
+            and all(x.pipeline for x in in_flight.values())
+        )
+
+    async def _async_dispatch(self, command: _Command):
+        try:
+            result = await self._async_execute(command)
+        except asyncio.CancelledError:
+            for future in command.futures:
+                future.cancel()
+            raise
+        except Exception as err:  # pylint: disable=broad-except
+            for future in command.futures:
+                if not future.done():
+                    future.set_exception(err)
+        else:
+            for future in command.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._release()
+
+    async def _async_execute(self, command: _Command):
+        if (
+            command.local is not None
+            and self.local is not None
+            and await self.local.async_send(command.key, command.local)
+        ):
+            return None
+        if command.path is None:
+            raise HomeAssistantError(f"{command.local} can only be sent locally")
+        return await self._execute(command.path, command.data)
+
+    async def _acquire(self, lane: str, priority: int):
+        if self._slots > 0 and not self._waiters:
+            self._slots -= 1
+            return
+        future = self.hass.loop.create_future()
+        waiter = [priority, next(self._seq), future]
+        heapq.heappush(self._waiters, waiter)
+        self._waiting[lane] = waiter
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        finally:
+            del self._waiting[lane]
+
+    def _release(self):
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[2]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._slots += 1
+
+
+class CommandSequence:
+    """Send rounds of commands in the background with a bounded pipeline.
+
+    Up to depth sends are outstanding at a time. They are started in
+    order, so steps that submit pipelined commands to the queue go out in
+    order while earlier responses are still on their way.
+    Round n is not dispatched before the start plus n intervals, counted
+    from dispatch so slow responses do not stretch the sequence. The
+    first failure stops the sequence and is raised from async_run.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        rounds: list[list[Callable[[], Awaitable]]],
+        interval: float,
+        on_progress: Callable[[], None] = None,
+        depth: int = PIPELINE_DEPTH,
+    ) -> None:
+        self.hass = hass
+        self._rounds = rounds
+        self._interval = interval
+        self._on_progress = on_progress
+        self._depth = depth
+        self._error: Exception = None
+        self.total = sum(len(x) for x in rounds)
+        self.sent = 0
+        self.started: float = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0
+        return self.hass.loop.time() - self.started
+
+    @property
+    def throughput(self) -> float:
+        """Return the completed sends per second."""
+        elapsed = self.elapsed
+        return self.sent / elapsed if elapsed > 0 else 0
+
+    async def async_run(self):
+        loop = self.hass.loop
+        slots = asyncio.Semaphore(self._depth)
+        in_flight: set[asyncio.Task] = set()
+        self.started = loop.time()
+        try:
+            for n, steps in enumerate(self._rounds):
+                wait = self.started + n * self._interval - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                for step in steps:
+                    await slots.acquire()
+                    if self._error is not None:
+                        raise self._error
+                    task = self.hass.async_create_task(self._send(step, slots))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.wait(in_flight)
+        except asyncio.CancelledError:
+            for task in in_flight:
+                task.cancel()
+            raise
+        if self._error is not None:
+            raise self._error
+
+    async def _send(self, step: Callable[[], Awaitable], slots: asyncio.Semaphore):
+        try:
+            await step()
+        except Exception as err:  # pylint: disable=broad-except
+            if self._error is None:
+                self._error = err
+        else:
+            self.sent += 1
+            if self._on_progress is not None:
+                self._on_progress()
+        finally:
+            slots.release()
+
+
+class SettingsPipeline:
+    """Send partial settings of one appliance, latest wins.
+
+    Changes are merged into a pending batch that goes out once no change
+    came in for the coalescing window. While a request is in flight the
+    batch keeps collecting and is sent when the request returns, so there
+    is at most one request per appliance and an older response never
+    lands after a newer one. Every caller receives the outcome of the
+    request that carried its change; on_settled runs after each request,
+    successful or not.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        send: Callable[[dict], Awaitable],
+        on_settled: Callable[[], None],
+        window: float = DEFAULT_SETTINGS_WINDOW / 1000,
+    ) -> None:
+        self.hass = hass
+        self._send = send
+        self._on_settled = on_settled
+        self._window = window
+        self.pending: dict = {}
+        self.in_flight: dict = None
+        self._futures: list[asyncio.Future] = []
+        self._cancel_timer: Callable = None
+        self._task: asyncio.Task = None
+
+    @callback
+    def async_set(self, data: dict) -> asyncio.Future:
+        self.pending.update(data)
+        future = self.hass.loop.create_future()
+        self._futures.append(future)
+        if self._cancel_timer is not None:
+            self._cancel_timer()
+        self._cancel_timer = async_call_later(self.hass, self._window, self._on_timer)
+        return future
+
+    @callback
+    def async_cancel(self):
+        if self._cancel_timer is not None:
+            self._cancel_timer()
+            self._cancel_timer = None
+        if self._task is not None:
+            self._task.cancel()
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+        self.pending = {}
+
+    @callback
+    def _on_timer(self, _now):
+        self._cancel_timer = None
+        if self._task is None:
+            self._task = self.hass.async_create_task(self._run())
+
+    async def _run(self):
+        try:
+            # a batch that is still inside its window waits for the timer
+            while self.pending and self._cancel_timer is None:
+                data, self.pending = self.pending, {}
+                futures, self._futures = self._futures, []
+                self.in_flight = data
+                try:
+                    result = await self._send(data)
+                except asyncio.CancelledError:
+                    for future in futures:
+                        future.cancel()
+                    raise
+                except Exception as err:  # pylint: disable=broad-except
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(err)
+                else:
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(result)
+                finally:
+                    self.in_flight = None
+                    self._on_settled()
+        finally:
+            self._task = None
@@ -1,14 +1,15 @@
+import asyncio
 from datetime import datetime, timedelta
 import logging
+from time import monotonic
 from typing import Callable, Iterable
-from aiohttp.client import ClientSession
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_ACCESS_TOKEN
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryAuthFailed
 from homeassistant.helpers import event
 from homeassistant.helpers.device_registry import CONNECTION_NETWORK_MAC
 from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.entity_registry import RegistryEntry
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
     DataUpdateCoordinator,
@@ -16,9 +17,21 @@ from homeassistant.helpers.update_coordinator import (
 )
 from homeassistant.util.dt import utcnow
 
+from .api import NatureApiClient, NatureApiError, NatureAuthError
+from .metrics import COUNT_BUCKETS, FANOUT_BUCKETS, LATENCY_BUCKETS
+from .models import Appliance, ApplianceStructure, CommandCatalog, Device, SmartMeterSnapshot
+from .predictor import MeterPredictor
+from .payload import EXECUTOR_THRESHOLD, Payload, digest_of, normalize
+from .scheduler import DEFAULT_INTERVAL, RateLimitScheduler
+from .storage import SnapshotStore
+
 DOMAIN = "nature_remo"
 
-RESOURCE = "https://api.nature.global/1"
+CONF_LOCAL_HOSTS = "local_hosts"
+CONF_SETTINGS_WINDOW = "settings_window"
+CONF_SIGNAL_BUTTONS = "signal_buttons"
+# API resource of a relay on another instance, set for relay consumers
+CONF_RELAY = "relay"
 
 ICONS_MAP = {
     "ico_0": "mdi:numeric-0",
@@ -45,17 +58,24 @@ ICONS_MAP = {
 }
 
 
-class NatureUpdateCoordinator(DataUpdateCoordinator[dict[str, dict]]):
+class NatureUpdateCoordinator(DataUpdateCoordinator[dict[str, object]]):
     _next_update: datetime = None
+    _digest: bytes = None
+    snapshots: SnapshotStore = None
+    # last response body, served to relay consumers
+    body: bytes = None
+    # seconds a relay may hold a poll until the data changes, relay mode only
+    long_poll: float = None
+    _long_poll_task: asyncio.Task = None
 
     def __init__(
         self,
         hass: HomeAssistant,
         logger: logging.Logger,
         entry: ConfigEntry,
-        session: ClientSession,
-        rate_limit: DataUpdateCoordinator,
+        client: NatureApiClient,
         path: str,
+        parse: Callable[[dict], object] = Device,
     ) -> None:
         super().__init__(
             hass,
@@ -64,33 +84,153 @@ class NatureUpdateCoordinator(DataUpdateCoordinator[dict[str, dict]]):
         )
         self.entry = entry
         self.path = path
-        self.rate_limit = rate_limit
-        self.session = session
-        self.update_interval = timedelta(seconds=60)
+        # model of the objects in data
+        self._parse = parse
+        self.client = client
+        self.scheduler: RateLimitScheduler = client.scheduler
+        self.rate_limit = self.scheduler.rate_limit
+        self.update_interval = DEFAULT_INTERVAL
+        # ids whose object was added, modified or removed by the last poll
+        self.changed: set[str] = set()
+        self.added: set[str] = set()
+        self.removed: set[str] = set()
+        # types of the objects in added or removed
+        self.touched_types: set[str] = set()
+        # object ids by appliance type (None for devices)
+        self.types: dict[str, set[str]] = {}
+        self._type_of: dict[str, str] = {}
+        self._fingerprints: dict[str, str] = {}
+        # ids of the objects the last poll could not parse
+        self._invalid: set[str] = set()
+        # seconds the last poll spent decoding on the event loop
+        self.loop_blocking = 0.0
+        # entity states written by the current listener fan-out
+        self.written = 0
+        entry.async_on_unload(self.scheduler.register(self))
+
+    @property
+    def etag(self) -> str:
+        return None if self._digest is None else f'"{self._digest.hex()}"'
+
+    def type_of(self, id: str):
+        return self._type_of.get(id)
+
+    def ids_of(self, types: frozenset[str] = None) -> set[str]:
+        if types is None:
+            return set(self._type_of)
+        return set().union(*(self.types.get(x, ()) for x in types))
+
+    async def async_restore(self, body: str):
+        """Populate the coordinator from a cached body without a request."""
+        self.async_set_updated_data(await self._async_apply(body.encode()))
+
+    @callback
+    def _start_long_poll(self, _now: datetime):
+        self._unsub_refresh = None
+        self._long_poll_task = self.hass.async_create_background_task(
+            self._async_refresh(log_failures=True, scheduled=True),
+            f"{DOMAIN} {self.path} long poll")
+
+    @callback
+    def _unschedule_refresh(self):
+        super()._unschedule_refresh()
+        if self._long_poll_task is not None:
+            self._long_poll_task.cancel()
+            self._long_poll_task = None
 
     async def _async_update_data(self):
-        access_token: str = self.entry.data[CONF_ACCESS_TOKEN]
-        headers = {"Authorization": f"Bearer {access_token}"}
-        response = await self.session.get(f"{RESOURCE}/{self.path}", headers=headers)
-        if response.status == 401:
-            raise ConfigEntryAuthFailed()
-        if "x-rate-limit-remaining" in response.headers:
-            remaining = int(response.headers.get("x-rate-limit-remaining"))
-            reset = datetime.fromtimestamp(
-                int(response.headers.get("x-rate-limit-reset"))
-            )
-            self.rate_limit.async_set_updated_data(
-                {"remaining": remaining, "reset": reset}
-            )
-            if response.status == 429:
-                self._schedule_refresh(reset + timedelta(seconds=1))
-        if response.status != 200:
-            raise UpdateFailed(f"status code: {response.status}")
-        data = await response.json()
-        self._next_update = self._get_next_update(data)
-        return {x["id"]: x for x in data}
-
-    def _get_next_update(self, data):
+        self.changed = set()
+        self.added = set()
+        self.removed = set()
+        self.touched_types = set()
+        try:
+            if self.long_poll is None or self.data is None:
+                response = await self.client.async_get(self.path)
+            else:
+                response = await self.client.async_get(
+                    self.path, etag=self.etag, hold=self.long_poll)
+        except NatureAuthError as err:
+            raise ConfigEntryAuthFailed() from err
+        except NatureApiError as err:
+            # A 429 reports remaining=0, which holds the next poll until reset.
+            raise UpdateFailed(str(err)) from err
+        if response.status == 304:
+            return self.data
+        return await self._async_apply(response.body)
+
+    async def _async_apply(self, body: bytes):
+        start = monotonic()
+        digest = digest_of(body)
+        if digest == self._digest and self.data is not None:
+            self._next_update = self._get_next_update()
+            self._report_blocking(monotonic() - start)
+            return self.data
+        if len(body) >= EXECUTOR_THRESHOLD:
+            blocked = monotonic() - start
+            payload = await self.hass.async_add_executor_job(self._decode, body, digest)
+            start = monotonic()
+        else:
+            blocked = 0
+            payload = self._decode(body, digest)
+        result = self._commit(payload, body)
+        self._report_blocking(blocked + monotonic() - start)
+        return result
+
+    def _decode(self, body: bytes, digest: bytes) -> Payload:
+        """Decode a body; runs in the executor, so only reads the coordinator."""
+        payload = normalize(body, digest, self._fingerprints, self._parse, self.data or {})
+        self._prepare(payload)
+        return payload
+
+    def _commit(self, payload: Payload, body: bytes):
+        self.changed = payload.changed
+        self.added = payload.added
+        self.removed = payload.removed
+        self.touched_types = {self._type_of[x] for x in self.removed}
+        self.types = payload.types
+        self._type_of = payload.type_of
+        self.touched_types.update(self._type_of[x] for x in self.added)
+        self._fingerprints = payload.fingerprints
+        self._digest = payload.digest
+        self.body = body
+        self._report_invalid(payload.invalid)
+        if self.snapshots is not None:
+            self.snapshots.async_save(self.path, body)
+        self._process(payload)
+        self._next_update = self._get_next_update()
+        return payload.data
+
+    def _report_invalid(self, invalid: dict[str, str]):
+        new = invalid.keys() - self._invalid
+        for id in new:
+            self.logger.warning("Ignoring malformed %s object %s: %s", self.path, id, invalid[id])
+        if new:
+            self.client.metrics.inc(
+                "invalid_objects_total", {"coordinator": self.path}, len(new))
+        self._invalid = set(invalid)
+
+    def _report_blocking(self, seconds: float):
+        self.loop_blocking = seconds
+        self.client.metrics.observe(
+            "loop_blocking_seconds", seconds, FANOUT_BUCKETS, {"coordinator": self.path})
+
+    @callback
+    def async_update_listeners(self):
+        self.written = 0
+        start = monotonic()
+        super().async_update_listeners()
+        labels = {"coordinator": self.path}
+        metrics = self.client.metrics
+        metrics.observe("fanout_duration_seconds", monotonic() - start, FANOUT_BUCKETS, labels)
+        metrics.observe("entities_written", self.written, COUNT_BUCKETS, labels)
+
+    def _prepare(self, payload: Payload):
+        """Decode the objects in changed once for all entities, off the loop."""
+
+    def _process(self, payload: Payload):
+        """Apply what _prepare decoded."""
+
+    def _get_next_update(self):
         return None
 
     @callback
@@ -106,16 +246,20 @@ class NatureUpdateCoordinator(DataUpdateCoordinator[dict[str, dict]]):
             self._unsub_refresh()
             self._unsub_refresh = None
 
+        if self.long_poll is not None and self.last_update_success:
+            # the relay holds the next poll until there is something new;
+            # run it as a background task so startup and shutdown do not
+            # wait for a poll that is parked on purpose
+            self._unsub_refresh = event.async_call_later(
+                self.hass, 1, self._start_long_poll)
+            return
+
         time = utcnow().replace(microsecond=0)
-        if self._next_update is not None:
-            if time <= self._next_update:
-                time = self._next_update
-            else:
-                time = time.replace(second=self._next_update.second)
-                while time < utcnow():
-                    time += self.update_interval
+        if self._next_update is not None and self.last_update_success:
+            time = max(time + timedelta(seconds=1), self._next_update)
         else:
-            time += self.update_interval
+            time = self.scheduler.align(self, time + self.scheduler.next_interval())
+        time = max(time, self.scheduler.not_before())
 
         # We _floor_ utcnow to create a schedule on a rounded second,
         # minimizing the time between the point and the real activation.
@@ -134,44 +278,91 @@ class AppliancesUpdateCoordinator(NatureUpdateCoordinator):
         hass: HomeAssistant,
         logger: logging.Logger,
         entry: ConfigEntry,
-        session: ClientSession,
-        rate_limit: DataUpdateCoordinator,
+        client: NatureApiClient,
     ) -> None:
         super().__init__(
             hass,
             logger,
             entry,
-            session,
-            rate_limit,
+            client,
             "appliances",
+            Appliance,
         )
+        self.meters: dict[str, SmartMeterSnapshot] = {}
+        # compiled structure, replaced only when it changes so entities
+        # can compare by identity
+        self.structures: dict[str, ApplianceStructure] = {}
+        self.predictor = MeterPredictor()
+
+    def _prepare(self, payload: Payload):
+        structures = {}
+        meters = {}
+        for id in payload.changed:
+            appliance: Appliance = payload.data.get(id)
+            if appliance is None:
+                continue
+            structure = self.structures.get(id)
+            if structure is None or not structure.matches(appliance):
+                structures[id] = ApplianceStructure(appliance)
+            if appliance.smart_meter is not None:
+                meters[id] = SmartMeterSnapshot(appliance.smart_meter)
+        payload.extra = (structures, meters)
+
+    def _process(self, payload: Payload):
+        structures, meters = payload.extra
+        for id in payload.changed:
+            if id not in payload.data:
+                self.structures.pop(id, None)
+            if id not in meters:
+                self.meters.pop(id, None)
+        self.structures.update(structures)
+        self.meters.update(meters)
 
-    def _get_next_update(self, appliances):
-        val = max(
-            (
-                str_to_datetime(
-                    x["smart_meter"]["echonetlite_properties"][0]["updated_at"]
-                )
-                for x in appliances
-                if "smart_meter" in x
-            ),
-            default=None,
-        )
-        if val is not None:
-            now = utcnow()
-            val += timedelta(seconds=62)
-            retry = val + timedelta(seconds=5)
-            if val < now and retry >= now:
-                return retry
-            retry = val + timedelta(seconds=10)
-            if val < now and retry >= now:
-                return retry
-            return val
-        return super()._get_next_update(appliances)
+    async def _async_update_data(self):
+        data = await super()._async_update_data()
+        self._observe_meters()
+        self._next_update = self._get_next_update()
+        return data
+
+    def _observe_meters(self):
+        if not self.meters:
+            return
+        now = utcnow() + self.client.clock.offset
+        metrics = self.client.metrics
+        fresh = False
+        for id, meter in self.meters.items():
+            known = self.predictor.known(id)
+            if self.predictor.observe(id, meter.updated_at):
+                fresh = True
+                if known:
+                    lag = (now - meter.updated_at).total_seconds()
+                    metrics.observe("meter_lag_seconds", max(lag, 0), LATENCY_BUCKETS)
+        self.predictor.forget(self.meters)
+        metrics.inc("meter_polls_total", {"result": "fresh" if fresh else "wasted"})
+
+    def _get_next_update(self):
+        if not self.meters:
+            return super()._get_next_update()
+        offset = self.client.clock.offset
+        earliest = utcnow()
+        interval = self.scheduler.next_interval()
+        if interval > DEFAULT_INTERVAL:
+            # the budget is tight, skip readings rather than polls
+            earliest += interval - DEFAULT_INTERVAL
+        time = self.predictor.next_poll(earliest + offset)
+        if time is None:
+            return super()._get_next_update()
+        return time - offset
 
 
 class NatureEntity(CoordinatorEntity):
     coordinator: NatureUpdateCoordinator
+    # point in time at which the state changes without new data, see _on_deadline
+    _deadline: datetime = None
+    _unsub_deadline: Callable = None
+    # whether the last poll had this entity's object; _attr_available can
+    # also turn False without a poll, from _on_deadline
+    _present = True
 
     def __init__(
         self,
@@ -189,22 +380,63 @@ class NatureEntity(CoordinatorEntity):
     def available(self):
         return self._attr_available
 
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self.async_on_remove(self._cancel_deadline)
+        self._track_deadline()
+
+    @callback
+    def _track_deadline(self):
+        self._cancel_deadline()
+        if self._deadline is None or self._deadline <= utcnow():
+            return
+        self._unsub_deadline = event.async_track_point_in_utc_time(
+            self.hass, self._handle_deadline, self._deadline)
+
+    @callback
+    def _cancel_deadline(self):
+        if self._unsub_deadline is not None:
+            self._unsub_deadline()
+            self._unsub_deadline = None
+
+    @callback
+    def _handle_deadline(self, now: datetime):
+        self._unsub_deadline = None
+        self._deadline = None
+        self._on_deadline()
+        self.async_write_ha_state()
+
+    def _on_deadline(self):
+        pass
+
     @callback
     def _handle_coordinator_update(self):
         if (
             not self.coordinator.last_update_success
+            and self.coordinator.rate_limit.data is not None
             and self.coordinator.rate_limit.data["remaining"] <= 0
         ):
             return
-        self._attr_available = (
+        available = (
             self.coordinator.last_update_success
             and self._remo_id in self.coordinator.data
         )
+        if (
+            available == self._present
+            and self._remo_id not in self.coordinator.changed
+        ):
+            return
+        self._present = available
+        self._attr_available = available
         if self._attr_available:
             self._on_data_update(self.coordinator.data[self._remo_id])
+            self._track_deadline()
+        else:
+            self._cancel_deadline()
+        self.coordinator.written += 1
         self.async_write_ha_state()
 
-    def _on_data_update(self, data: dict):
+    def _on_data_update(self, data):
         pass
 
 
@@ -212,76 +444,102 @@ class RemoSensorEntity(NatureEntity):
     def __init__(
         self,
         coordinator: NatureUpdateCoordinator,
-        device: dict,
+        device: Device,
         device_info: DeviceInfo,
         key: str,
     ):
         super().__init__(
-            coordinator, device["id"], f"{device['id']}-{key}", device_info
+            coordinator, device.id, f"{device.id}-{key}", device_info
         )
-        self._attr_name = f"{device['name']} {key}"
+        self._attr_name = f"{device.name} {key}"
         self._key = key
         self._on_data_update(device)
 
-    def _on_data_update(self, device: dict):
-        newest_events = device["newest_events"]
+    def _on_data_update(self, device: Device):
         self._attr_extra_state_attributes = {
-            "created_at": modify_utc_z(newest_events[self._key]["created_at"]),
+            "created_at": device.newest_events[self._key].created_at.isoformat(),
         }
         return super()._on_data_update(device)
 
 
-def create_appliance_device_info(appliance: dict):
+def create_appliance_device_info(appliance: Appliance):
     info = DeviceInfo(
-        identifiers={(DOMAIN, appliance["id"])},
-        name=appliance["nickname"],
-        via_device=(DOMAIN, appliance["device"]["id"]),
+        identifiers={(DOMAIN, appliance.id)},
+        name=appliance.nickname,
+        via_device=(DOMAIN, appliance.device_id),
     )
-    model = appliance["model"]
-    if model is not None:
-        info["manufacturer"] = appliance["model"]["manufacturer"]
-        info["model"] = appliance["model"]["name"]
+    if appliance.model is not None:
+        info["manufacturer"] = appliance.manufacturer
+        info["model"] = appliance.model
     return info
 
 
-def create_device_device_info(device: dict):
+def create_device_device_info(device: Device):
     return DeviceInfo(
-        connections={(CONNECTION_NETWORK_MAC, device["mac_address"])},
-        identifiers={(DOMAIN, device["id"])},
+        connections={(CONNECTION_NETWORK_MAC, device.mac_address)},
+        identifiers={(DOMAIN, device.id)},
         manufacturer="Nature Inc.",
-        model=device["firmware_version"].split("/")[0],
-        name=device["name"],
-        sw_version=device["firmware_version"],
+        model=device.firmware_version.split("/")[0],
+        name=device.name,
+        sw_version=device.firmware_version,
     )
 
 
+@callback
+def async_get_catalog(hass: HomeAssistant, entry: RegistryEntry) -> CommandCatalog:
+    """Return the commands of the appliance behind a registered entity."""
+    data = hass.data.get(DOMAIN, {}).get(entry.config_entry_id)
+    if data is None:
+        return None
+    structure = data["appliances"].structures.get(entry.unique_id)
+    return structure.commands if structure is not None else None
+
+
 def check_update(
     entry: ConfigEntry,
     async_add_entities: Callable,
     coordinator: NatureUpdateCoordinator,
-    found: Callable[[dict], Iterable],
+    found: Callable[[object], Iterable],
+    types: Iterable[str] = None,
 ):
-    added = []
+    """Call found for every new object of the given appliance types.
 
-    def updated():
-        if not coordinator.last_update_success:
-            return
+    Only the objects added by a poll are visited; objects that disappear
+    are forgotten so that they are picked up again if they come back.
+    """
+    if types is not None:
+        types = frozenset(types)
+    added: set[str] = set()
+
+    def add(ids: Iterable[str]):
         entries = []
-        for x in coordinator.data.values():
-            id = x["id"]
+        for id in ids:
             if id in added:
                 continue
-            entries.extend(found(x))
-            added.append(id)
-        async_add_entities(entries)
+            entries.extend(found(coordinator.data[id]))
+            added.add(id)
+        if entries:
+            async_add_entities(entries)
 
-    entry.async_on_unload(coordinator.async_add_listener(updated))
-    updated()
+    synced = False
 
+    @callback
+    def updated():
+        nonlocal synced
+        if not coordinator.last_update_success:
+            return
+        if not synced:
+            synced = True
+            add(coordinator.ids_of(types))
+            return
+        if types is not None and not (coordinator.touched_types & types):
+            return
+        added.difference_update(coordinator.removed)
+        if types is None:
+            add(coordinator.added)
+        else:
+            add(x for x in coordinator.added if coordinator.type_of(x) in types)
 
-def modify_utc_z(s: str):
-    return s.replace("Z", "+00:00")
-
+    entry.async_on_unload(coordinator.async_add_listener(updated))
+    updated()
 
-def str_to_datetime(s: str):
-    return datetime.fromisoformat(modify_utc_z(s))
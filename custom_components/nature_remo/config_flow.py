@@ -1,61 +1,197 @@
 from __future__ import annotations
 
-from aiohttp.client_exceptions import ClientError
+from collections.abc import Mapping
 from typing import Any
 
-from homeassistant.config_entries import ConfigFlow
+from homeassistant.config_entries import ConfigEntry, ConfigFlow, OptionsFlow
 from homeassistant.const import CONF_ACCESS_TOKEN
+from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+import homeassistant.helpers.config_validation as cv
 
 import voluptuous as vol
 from voluptuous.schema_builder import UNDEFINED
 
-from .common import DOMAIN, RESOURCE
+from .api import NatureApiClient, NatureApiError, NatureAuthError, NatureRateLimitError
+from .commands import DEFAULT_SETTINGS_WINDOW
+from .common import CONF_LOCAL_HOSTS, CONF_RELAY, CONF_SETTINGS_WINDOW, CONF_SIGNAL_BUTTONS, DOMAIN
+from .relay import URL as RELAY_URL
+
+
+CONF_ACCOUNT = "account"
+CONF_RELAY_URL = "relay_url"
+
+
+def _relay_resource(user_input: dict[str, Any], account: str) -> str:
+    return f"{user_input[CONF_RELAY_URL].rstrip('/')}{RELAY_URL}/{account}"
 
 
 class NatureRemoConfigFlow(ConfigFlow, domain=DOMAIN):
-    VERSION = 1
+    VERSION = 2
+
+    _reauth_entry: ConfigEntry = None
+    _relay_accounts: dict[str, str] = None
+    _user_input: dict[str, Any] = None
 
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
         if user_input is None:
-            return self._access_token_form({}, {})
-
-        session = async_get_clientsession(self.hass)
-        headers = {"Authorization": f"Bearer {user_input[CONF_ACCESS_TOKEN]}"}
-        response = await session.get(f"{RESOURCE}/users/me", headers=headers)
-        if response.status == 401:
-            return self._access_token_form({"base": "code_401"}, user_input)
-        if response.status == 429:
-            return self._access_token_form({"base": "code_429"}, user_input)
-        if response.status != 200:
-            raise ClientError(f"response status: {response.status}")
-
-        json = await response.json()
-        id = json["id"]
-        nickname = json["nickname"]
-
-        existing_entry = await self.async_set_unique_id(DOMAIN)
-        if existing_entry:
-            self.hass.config_entries.async_update_entry(
-                existing_entry, data=user_input)
-            await self.hass.config_entries.async_reload(existing_entry.entry_id)
-            return self.async_abort(reason="reauth_successful")
-
-        return self.async_create_entry(title="Nature Remo", description=nickname, data=user_input)
-
-    def _access_token_form(self, errors: dict[str, str], user_input: dict[str, Any]):
+            return self._access_token_form("user", {}, {})
+
+        relay = None
+        if user_input.get(CONF_RELAY_URL):
+            accounts, errors = await self._async_get_relay_accounts(user_input)
+            if errors:
+                return self._access_token_form("user", errors, user_input)
+            self._user_input = user_input
+            if len(accounts) > 1:
+                self._relay_accounts = {x["id"]: x["nickname"] for x in accounts}
+                return await self.async_step_relay_account()
+            relay = _relay_resource(user_input, accounts[0]["id"])
+        return await self._async_create_entry(user_input, relay)
+
+    async def async_step_relay_account(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Pick one of the accounts a relay serves."""
+        if user_input is None:
+            return self.async_show_form(
+                data_schema=vol.Schema({
+                    vol.Required(CONF_ACCOUNT): vol.In(self._relay_accounts),
+                }),
+                step_id="relay_account",
+            )
+        return await self._async_create_entry(
+            self._user_input, _relay_resource(self._user_input, user_input[CONF_ACCOUNT]))
+
+    async def _async_create_entry(self, user_input: dict[str, Any], relay: str | None) -> FlowResult:
+        user, errors = await self._async_get_user(user_input, relay)
+        if errors:
+            return self._access_token_form("user", errors, user_input)
+
+        data = {CONF_ACCESS_TOKEN: user_input[CONF_ACCESS_TOKEN]}
+        if relay is not None:
+            data[CONF_RELAY] = relay
+        await self.async_set_unique_id(user["id"])
+        self._abort_if_unique_id_configured(updates=data)
+        return self.async_create_entry(title=user["nickname"], data=data)
+
+    async def async_step_reauth(self, entry_data: Mapping[str, Any]) -> FlowResult:
+        """Perform reauth upon an API authentication error."""
+        self._reauth_entry = self.hass.config_entries.async_get_entry(
+            self.context["entry_id"])
+        return await self.async_step_reauth_confirm()
+
+    async def async_step_reauth_confirm(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        if user_input is None:
+            return self._access_token_form("reauth_confirm", {}, {})
+
+        entry = self._reauth_entry
+        user, errors = await self._async_get_user(user_input, entry.data.get(CONF_RELAY))
+        if errors:
+            return self._access_token_form("reauth_confirm", errors, user_input)
+
+        # entries created before multiple accounts still use DOMAIN
+        if entry.unique_id not in (None, DOMAIN, user["id"]):
+            return self.async_abort(reason="wrong_account")
+        self.hass.config_entries.async_update_entry(
+            entry, data={**entry.data, **user_input}, unique_id=user["id"])
+        await self.hass.config_entries.async_reload(entry.entry_id)
+        return self.async_abort(reason="reauth_successful")
+
+    async def _async_get_user(self, user_input: dict[str, Any], relay: str = None):
+        client = NatureApiClient(
+            async_get_clientsession(self.hass), user_input[CONF_ACCESS_TOKEN], resource=relay)
+        try:
+            response = await client.async_get("users/me")
+        except NatureAuthError:
+            return None, {"base": "code_401"}
+        except NatureRateLimitError:
+            return None, {"base": "code_429"}
+        except NatureApiError:
+            return None, {"base": "cannot_connect"}
+        return response.json(), {}
+
+    async def _async_get_relay_accounts(self, user_input: dict[str, Any]):
+        client = NatureApiClient(
+            async_get_clientsession(self.hass), user_input[CONF_ACCESS_TOKEN],
+            resource=user_input[CONF_RELAY_URL].rstrip("/"))
+        try:
+            response = await client.async_get(RELAY_URL.lstrip("/"))
+        except NatureAuthError:
+            return None, {"base": "code_401"}
+        except NatureApiError:
+            return None, {"base": "cannot_connect"}
+        accounts = response.json()
+        if not accounts:
+            return None, {"base": "no_relay_accounts"}
+        return accounts, {}
+
+    def _access_token_form(self, step_id: str, errors: dict[str, str], user_input: dict[str, Any]):
         return self.async_show_form(
             errors=errors,
             data_schema=vol.Schema({
                 vol.Required(CONF_ACCESS_TOKEN, default=user_input.get(CONF_ACCESS_TOKEN, UNDEFINED)): str,
+                **({
+                    vol.Optional(CONF_RELAY_URL, default=user_input.get(CONF_RELAY_URL, UNDEFINED)): str,
+                } if step_id == "user" else {}),
             }),
-            last_step=True,
-            step_id="user",
+            last_step=step_id != "user",
+            step_id=step_id,
         )
 
-    async def async_step_reauth(self, user_input=None):
-        """Perform reauth upon an API authentication error."""
-        return await self.async_step_user(user_input)
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
+        return NatureRemoOptionsFlow()
+
+
+class NatureRemoOptionsFlow(OptionsFlow):
+    @property
+    def _entry(self) -> ConfigEntry:
+        # the handler of an options flow is the entry id
+        return self.hass.config_entries.async_get_entry(self.handler)
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        choices = self._signal_button_choices()
+        options = self._entry.options
+        if user_input is not None:
+            if not choices and CONF_SIGNAL_BUTTONS in options:
+                # the appliances are unknown while not loaded, keep the selection
+                user_input[CONF_SIGNAL_BUTTONS] = options[CONF_SIGNAL_BUTTONS]
+            return self.async_create_entry(title="", data=user_input)
+
+        schema = {
+            vol.Optional(CONF_LOCAL_HOSTS, default=options.get(CONF_LOCAL_HOSTS, "")): str,
+            vol.Optional(
+                CONF_SETTINGS_WINDOW,
+                default=options.get(CONF_SETTINGS_WINDOW, DEFAULT_SETTINGS_WINDOW),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=5000)),
+        }
+        if choices:
+            selected = options.get(CONF_SIGNAL_BUTTONS, [])
+            schema[vol.Optional(
+                CONF_SIGNAL_BUTTONS,
+                default=[x for x in selected if x in choices],
+            )] = cv.multi_select(choices)
+        return self.async_show_form(
+            data_schema=vol.Schema(schema),
+            step_id="init",
+        )
+
+    def _signal_button_choices(self) -> dict[str, str]:
+        """Return the appliances with signals by id, if the entry is loaded."""
+        data = self.hass.data.get(DOMAIN, {}).get(self._entry.entry_id)
+        if data is None:
+            return {}
+        return {
+            id: x.nickname
+            for id, x in data["appliances"].data.items()
+            if x.signals
+        }
@@ -17,7 +17,7 @@ from homeassistant.core import Context, HomeAssistant
 from homeassistant.helpers import entity_registry
 import homeassistant.helpers.config_validation as cv
 
-from .common import DOMAIN
+from .common import DOMAIN, async_get_catalog
 
 ACTION_SCHEMA = cv.DEVICE_ACTION_BASE_SCHEMA.extend(
     {
@@ -32,14 +32,13 @@ ACTION_SCHEMA = cv.DEVICE_ACTION_BASE_SCHEMA.extend(
 async def async_get_actions(hass: HomeAssistant, device_id: str) -> list[dict]:
     actions = await toggle_entity.async_get_actions(hass, device_id, DOMAIN)
 
-    registry = await entity_registry.async_get_registry(hass)
+    registry = entity_registry.async_get(hass)
 
     for entry in entity_registry.async_entries_for_device(registry, device_id):
         if entry.domain != "remote":
             continue
 
-        state = hass.states.get(entry.entity_id)
-        if not state.attributes.get("signals") and not state.attributes.get("buttons"):
+        if not async_get_catalog(hass, entry):
             continue
 
         actions.append({
@@ -54,13 +53,9 @@ async def async_get_actions(hass: HomeAssistant, device_id: str) -> list[dict]:
 
 async def async_get_action_capabilities(hass, config):
     """List action capabilities."""
-    state = hass.states.get(config[ATTR_ENTITY_ID])
-    signals = state.attributes.get("signals", [])
-    buttons = state.attributes.get("buttons", [])
-
-    cmd = {}
-    cmd.update({v["id"]: v["name"] for v in signals})
-    cmd.update({v["name"]: v["label"] for v in buttons})
+    entry = entity_registry.async_get(hass).async_get(config[ATTR_ENTITY_ID])
+    catalog = async_get_catalog(hass, entry) if entry is not None else None
+    cmd = catalog.choices() if catalog is not None else {}
 
     extra_fields = {
         vol.Optional(ATTR_COMMAND): vol.In(cmd),
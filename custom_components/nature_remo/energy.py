@@ -0,0 +1,154 @@
+"""Hourly long-term energy statistics from smart meter readings."""
+import asyncio
+from datetime import datetime, timedelta
+import logging
+
+from homeassistant.const import UnitOfEnergy
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util.dt import as_utc, utc_from_timestamp
+
+from .common import DOMAIN, AppliancesUpdateCoordinator
+from .models import EPC_NORMAL_CUMULATIVE, EPC_REVERSE_CUMULATIVE
+
+_LOGGER = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+
+REGISTERS = {
+    EPC_NORMAL_CUMULATIVE: "consumed",
+    EPC_REVERSE_CUMULATIVE: "returned",
+}
+
+
+def statistic_id_of(appliance_id: str, epc: int):
+    return f"{DOMAIN}:{appliance_id.lower().replace('-', '_')}_{REGISTERS[epc]}"
+
+
+def _next_hour(time: datetime):
+    return time.replace(minute=0, second=0, microsecond=0) + HOUR
+
+
+class _Register:
+    """Turn the readings of one cumulative register into hourly sums.
+
+    The value at each hour boundary is interpolated between the readings
+    around it, so a gap after downtime or 429s is backfilled from the
+    first reading after it. Fixed-time readings fall on the boundaries
+    and are taken as they are.
+    """
+
+    def __init__(self, hass: HomeAssistant, statistic_id: str) -> None:
+        self.hass = hass
+        self.statistic_id = statistic_id
+        self.name = None
+        self._lock = asyncio.Lock()
+        self._loaded = False
+        # last reading and the state and sum at the last imported boundary
+        self._reading: tuple[datetime, float] = None
+        self._last: tuple[datetime, float, float] = None
+
+    async def async_add(self, time: datetime, value: float, rollover: float):
+        time = as_utc(time)
+        async with self._lock:
+            if not self._loaded:
+                await self._async_load()
+            if self._reading is None:
+                self._reading = self._last[:2] if self._last else (time, value)
+                if self._last is None:
+                    self._last = (time, value, 0.0)
+            start, start_value = self._reading
+            if time <= start:
+                return
+            delta = value - start_value
+            if delta < 0:
+                if rollover is None:
+                    _LOGGER.debug("%s went backwards, starting over", self.statistic_id)
+                    self._reading = (time, value)
+                    self._last = (time, value, self._last[2])
+                    return
+                delta += rollover
+            rows = []
+            _, state, total = self._last
+            boundary = _next_hour(max(start, self._last[0]))
+            while boundary <= time:
+                point = start_value + delta * ((boundary - start) / (time - start))
+                if rollover is not None:
+                    point %= rollover
+                step = point - state
+                if step < 0 and rollover is not None:
+                    step += rollover
+                total += max(step, 0)
+                state = point
+                rows.append({"start": boundary - HOUR, "state": state, "sum": total})
+                boundary += HOUR
+            self._reading = (time, value)
+            if rows:
+                self._last = (rows[-1]["start"] + HOUR, state, total)
+                self._async_import(rows)
+
+    async def _async_load(self):
+        from homeassistant.components.recorder import get_instance
+        from homeassistant.components.recorder.statistics import get_last_statistics
+
+        stats = await get_instance(self.hass).async_add_executor_job(
+            get_last_statistics, self.hass, 1, self.statistic_id, True, {"state", "sum"})
+        self._loaded = True
+        if not stats:
+            return
+        row = stats[self.statistic_id][0]
+        start = row["start"]
+        if not isinstance(start, datetime):
+            start = utc_from_timestamp(start)
+        self._last = (start + HOUR, row["state"], row["sum"])
+
+    @callback
+    def _async_import(self, rows: list[dict]):
+        from homeassistant.components.recorder.statistics import async_add_external_statistics
+
+        _LOGGER.debug("Importing %d hours of %s", len(rows), self.statistic_id)
+        async_add_external_statistics(self.hass, {
+            "has_mean": False,
+            "has_sum": True,
+            "name": self.name,
+            "source": DOMAIN,
+            "statistic_id": self.statistic_id,
+            "unit_of_measurement": UnitOfEnergy.KILO_WATT_HOUR,
+        }, rows)
+
+
+class MeterStatistics:
+    """Feed every smart meter poll into hourly external statistics."""
+
+    def __init__(self, hass: HomeAssistant, appliances: AppliancesUpdateCoordinator) -> None:
+        self.hass = hass
+        self.appliances = appliances
+        self._registers: dict[str, _Register] = {}
+
+    @callback
+    def async_update(self):
+        appliances = self.appliances
+        if not appliances.last_update_success:
+            return
+        for id in appliances.removed:
+            for epc in REGISTERS:
+                self._registers.pop(statistic_id_of(id, epc), None)
+        for id in appliances.changed:
+            meter = appliances.meters.get(id)
+            if meter is None:
+                continue
+            for epc, direction in REGISTERS.items():
+                reading = meter.fixed_time_energy(epc)
+                if reading is None:
+                    value = meter.cumulative_energy(epc)
+                    if value is None:
+                        continue
+                    reading = (meter.updated_at, value)
+                statistic_id = statistic_id_of(id, epc)
+                register = self._registers.get(statistic_id)
+                if register is None:
+                    register = self._registers[statistic_id] = _Register(self.hass, statistic_id)
+                register.name = f"{appliances.data[id].nickname} energy {direction}"
+                # cancelled when the entry unloads
+                appliances.entry.async_create_background_task(
+                    self.hass, register.async_add(*reading, meter.rollover()),
+                    f"nature_remo statistics {statistic_id}")
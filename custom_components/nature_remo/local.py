@@ -0,0 +1,191 @@
+"""Local LAN transport to the on-device HTTP API of Remo devices."""
+import asyncio
+import logging
+from typing import Iterable
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.storage import Store
+
+from .common import DOMAIN, NatureUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_TYPE = "_remo._tcp.local."
+
+STORAGE_VERSION = 1
+
+LOCAL_HEADERS = {"X-Requested-With": "local"}
+LOCAL_TIMEOUT = 3
+
+CAPTURE_INTERVAL = 0.5
+
+
+def parse_hosts(value: str) -> dict[str, str]:
+    """Parse the local_hosts option, "name=host" pairs separated by commas."""
+    hosts = {}
+    for item in value.replace("\n", ",").split(","):
+        name, sep, host = item.partition("=")
+        if sep and name.strip() and host.strip():
+            hosts[_normalize(name)] = host.strip()
+    return hosts
+
+
+def _normalize(name: str):
+    return name.strip().lower().replace(":", "")
+
+
+def _store(hass: HomeAssistant, entry_id: str) -> Store:
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.local")
+
+
+async def async_remove_signals(hass: HomeAssistant, entry_id: str):
+    """Remove the payloads captured for a config entry."""
+    await _store(hass, entry_id).async_remove()
+
+
+class LocalTransport:
+    """Send captured raw IR payloads straight to the Remo on the LAN.
+
+    Hosts come from the local_hosts option, keyed by Remo name, id or MAC
+    address, or from mDNS where the service name ends with the last six
+    hex digits of the MAC address. Payloads are captured from the
+    device's ``GET /messages`` and stored per signal id, or per
+    ``appliance_id/button`` for tv and light buttons.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        session: ClientSession,
+        entry_id: str,
+        devices: NatureUpdateCoordinator,
+        appliances: NatureUpdateCoordinator,
+        hosts: dict[str, str],
+    ) -> None:
+        self.hass = hass
+        self.session = session
+        self.devices = devices
+        self.appliances = appliances
+        self._hosts = hosts
+        self._discovered: dict[str, str] = {}
+        self._signals: dict[str, dict] = {}
+        self._store = _store(hass, entry_id)
+        self._browser = None
+
+    async def async_load(self):
+        data = await self._store.async_load()
+        if data is not None:
+            self._signals = data["signals"]
+
+    async def async_start_discovery(self):
+        try:
+            from homeassistant.components import zeroconf
+            from zeroconf.asyncio import AsyncServiceBrowser
+        except ImportError:
+            return
+        aiozc = await zeroconf.async_get_async_instance(self.hass)
+        self._browser = AsyncServiceBrowser(
+            aiozc.zeroconf, SERVICE_TYPE, handlers=[self._on_service_state_change])
+
+    async def async_stop(self):
+        if self._browser is not None:
+            await self._browser.async_cancel()
+            self._browser = None
+
+    def has(self, key: str):
+        return key in self._signals
+
+    def host_of(self, appliance_id: str):
+        appliance = self.appliances.data.get(appliance_id)
+        if appliance is None:
+            return None
+        device_id = appliance.device_id
+        device = self.devices.data.get(device_id) if self.devices.data else None
+        names = [device_id]
+        if device is not None:
+            names += [device.name, device.mac_address]
+        for name in names:
+            host = self._hosts.get(_normalize(name))
+            if host is not None:
+                return host
+        if device is not None:
+            return self._discovered.get(_normalize(device.mac_address)[-6:])
+        return None
+
+    async def async_send(self, appliance_id: str, key: str) -> bool:
+        """Send a captured payload, return False to fall back to the cloud."""
+        message = self._signals.get(key)
+        host = self.host_of(appliance_id)
+        if message is None or host is None:
+            return False
+        try:
+            async with self.session.post(
+                f"http://{host}/messages",
+                json=message,
+                headers=LOCAL_HEADERS,
+                timeout=ClientTimeout(total=LOCAL_TIMEOUT),
+            ) as response:
+                if response.status != 200:
+                    _LOGGER.debug("Local send to %s failed: %s", host, response.status)
+                    return False
+        except (asyncio.TimeoutError, ClientError) as err:
+            _LOGGER.debug("Local send to %s failed: %s", host, err)
+            return False
+        return True
+
+    async def async_capture(self, appliance_id: str, keys: Iterable[str], timeout: float):
+        """Store the next IR signal the Remo receives for each key."""
+        host = self.host_of(appliance_id)
+        if host is None:
+            raise HomeAssistantError(f"no local address known for {appliance_id}")
+        loop = asyncio.get_running_loop()
+        for key in keys:
+            baseline = await self._async_get_message(host)
+            _LOGGER.info("Point the remote at the Remo and press %s", key)
+            deadline = loop.time() + timeout
+            while True:
+                if loop.time() >= deadline:
+                    raise HomeAssistantError(f"no IR signal received for {key}")
+                await asyncio.sleep(CAPTURE_INTERVAL)
+                message = await self._async_get_message(host)
+                if message and message != baseline:
+                    break
+            self._signals[key] = message
+            self._store.async_delay_save(self._data_to_save, 1)
+
+    def _data_to_save(self):
+        return {"signals": self._signals}
+
+    async def _async_get_message(self, host: str):
+        try:
+            async with self.session.get(
+                f"http://{host}/messages",
+                headers=LOCAL_HEADERS,
+                timeout=ClientTimeout(total=LOCAL_TIMEOUT),
+            ) as response:
+                if response.status != 200:
+                    return None
+                return await response.json(content_type=None)
+        except (asyncio.TimeoutError, ClientError) as err:
+            _LOGGER.debug("Local read from %s failed: %s", host, err)
+            return None
+
+    @callback
+    def _on_service_state_change(self, zeroconf, service_type, name, state_change):
+        self.hass.async_create_task(self._async_resolve(zeroconf, service_type, name))
+
+    async def _async_resolve(self, zeroconf, service_type, name):
+        from zeroconf.asyncio import AsyncServiceInfo
+
+        info = AsyncServiceInfo(service_type, name)
+        if not await info.async_request(zeroconf, 3000):
+            return
+        addresses = info.parsed_addresses()
+        if not addresses:
+            return
+        instance = name.removesuffix(f".{service_type}")
+        host = addresses[0] if info.port in (None, 80) else f"{addresses[0]}:{info.port}"
+        _LOGGER.debug("Discovered %s at %s", instance, host)
+        self._discovered[_normalize(instance)[-6:]] = host
@@ -7,10 +7,13 @@ from homeassistant.components.media_player import MediaPlayerDeviceClass, MediaP
 from homeassistant.const import STATE_IDLE, STATE_OFF, STATE_PAUSED, STATE_PLAYING
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity import DeviceInfo
+from .models import Appliance, ApplianceStructure
 from .common import DOMAIN, AppliancesUpdateCoordinator, NatureEntity, check_update, create_appliance_device_info
 
 _LOGGER = logging.getLogger(__name__)
 
+TYPES = ["TV"]
+
 _INPUT_TO_SOURCE = {
     "t": "terrestrial",
     "bs": "bs",
@@ -20,98 +23,106 @@ _INPUT_TO_SOURCE = {
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities):
     _LOGGER.debug("Setting up media_player platform.")
-    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN]["appliances"]
-    post: Callable = hass.data[DOMAIN]["post"]
+    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]["appliances"]
+    post: Callable = hass.data[DOMAIN][entry.entry_id]["post"]
 
-    def on_add(appliance: dict):
-        if appliance["type"] != "TV":
-            return
+    def on_add(appliance: Appliance):
         device_info = create_appliance_device_info(appliance)
         yield NatureRemoTV(appliances, post, appliance, device_info)
 
-    check_update(entry, async_add_entities, appliances, on_add)
+    check_update(entry, async_add_entities, appliances, on_add, TYPES)
 
 
 class NatureRemoTV(NatureEntity, MediaPlayerEntity):
     _attr_assumed_state = True
     _attr_device_class = MediaPlayerDeviceClass.TV
     _attr_state = STATE_OFF
+    _structure: ApplianceStructure = None
 
-    def __init__(self, appliances: AppliancesUpdateCoordinator, post: Callable, appliance: dict, device_info: DeviceInfo):
+    def __init__(self, appliances: AppliancesUpdateCoordinator, post: Callable, appliance: Appliance, device_info: DeviceInfo):
         super().__init__(appliances,
-                         appliance["id"], f'{appliance["id"]}-tv', device_info)
-        self._attr_name = appliance["nickname"]
+                         appliance.id, f'{appliance.id}-tv', device_info)
+        self._attr_name = appliance.nickname
         self._post = post
         self._attr_icon = "mdi:television"
         self._on_data_update(appliance)
 
     async def async_turn_off(self):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "power"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "power"}, key=self._remo_id, local=f"{self._remo_id}/power")
         self._attr_state = STATE_OFF
         self._on_post_response(state)
         self._async_write_ha_state()
 
     async def async_turn_on(self):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "power"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "power"}, key=self._remo_id, local=f"{self._remo_id}/power")
         if self._attr_state == STATE_OFF:
             self._attr_state = STATE_IDLE
         self._on_post_response(state)
         self._async_write_ha_state()
 
     async def async_select_source(self, source):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": f"input-{source}"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": f"input-{source}"}, key=self._remo_id, local=f"{self._remo_id}/input-{source}", coalesce="input")
         self._on_post_response(state)
         self._async_write_ha_state()
 
     async def async_mute_volume(self, mute):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "mute"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "mute"}, key=self._remo_id, local=f"{self._remo_id}/mute")
         self._attr_is_volume_muted = mute
         self._on_post_response(state)
         self._async_write_ha_state()
 
+    # Volume steps are relative, each press counts, so unlike input and
+    # playback they are queued but never coalesced.
     async def async_volume_down(self):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "vol-down"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "vol-down"}, key=self._remo_id, local=f"{self._remo_id}/vol-down")
         self._attr_is_volume_muted = False
         self._on_post_response(state)
         self._async_write_ha_state()
 
     async def async_volume_up(self):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "vol-up"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "vol-up"}, key=self._remo_id, local=f"{self._remo_id}/vol-up")
         self._attr_is_volume_muted = False
         self._on_post_response(state)
         self._async_write_ha_state()
 
     async def async_media_play(self):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "play"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "play"}, key=self._remo_id, local=f"{self._remo_id}/play", coalesce="playback")
         self._attr_state = STATE_PLAYING
         self._on_post_response(state)
         self._async_write_ha_state()
 
     async def async_media_pause(self):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "pause"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "pause"}, key=self._remo_id, local=f"{self._remo_id}/pause", coalesce="playback")
         self._attr_state = STATE_PAUSED
         self._on_post_response(state)
         self._async_write_ha_state()
 
     async def async_media_stop(self):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "pause"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "pause"}, key=self._remo_id, local=f"{self._remo_id}/pause", coalesce="playback")
         self._attr_state = STATE_IDLE
         self._on_post_response(state)
         self._async_write_ha_state()
 
     async def async_media_previous_track(self):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "prev"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "prev"}, key=self._remo_id, local=f"{self._remo_id}/prev")
         self._on_post_response(state)
         self._async_write_ha_state()
 
     async def async_media_next_track(self):
-        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "next"})
+        state = await self._post(f"appliances/{self._remo_id}/tv", {"button": "next"}, key=self._remo_id, local=f"{self._remo_id}/next")
         self._on_post_response(state)
         self._async_write_ha_state()
 
-    def _on_data_update(self, appliance: dict):
+    def _on_data_update(self, appliance: Appliance):
         super()._on_data_update(appliance)
-        buttons: list[str] = [x["name"] for x in appliance["tv"]["buttons"]]
+        structure = self.coordinator.structures[self._remo_id]
+        if structure is not self._structure:
+            self._structure = structure
+            self._on_structure_update(structure)
+        self._on_post_response(appliance.state)
+
+    def _on_structure_update(self, structure: ApplianceStructure):
+        buttons = [x.name for x in structure.commands.buttons]
         features = 0
         self._attr_source_list = []
         if "power" in buttons:
@@ -136,7 +147,8 @@ class NatureRemoTV(NatureEntity, MediaPlayerEntity):
         if "next" in buttons:
             features |= SUPPORT_NEXT_TRACK
         self._attr_supported_features = features
-        self._on_post_response(appliance["tv"]["state"])
 
     def _on_post_response(self, state: dict):
+        if state is None:
+            return
         self._attr_source = _INPUT_TO_SOURCE.get(state["input"])
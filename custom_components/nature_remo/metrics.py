@@ -0,0 +1,160 @@
+"""In-memory metrics with a Prometheus text exposition view."""
+from bisect import bisect_left
+from typing import Iterable
+
+from aiohttp import web
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.core import HomeAssistant
+
+DATA_METRICS = "nature_remo_metrics"
+
+PREFIX = "nature_remo_"
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000)
+FANOUT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000)
+
+_HELP = {
+    "requests_total": "Requests to the Nature Remo API by endpoint and status.",
+    "request_errors_total": "Failed requests by kind (429, 5xx, timeout, connection).",
+    "request_duration_seconds": "Latency of requests to the Nature Remo API.",
+    "response_size_bytes": "Size of response bodies.",
+    "rate_limit_remaining": "Requests left in the current rate-limit window.",
+    "rate_limit_reset_timestamp_seconds": "End of the current rate-limit window.",
+    "loop_blocking_seconds": "Time the event loop spent decoding a poll.",
+    "meter_lag_seconds": "Delay between a smart meter reading and its first poll.",
+    "meter_polls_total": "Polls of smart meters that found a fresh or no new reading.",
+    "fanout_duration_seconds": "Time spent notifying coordinator listeners per poll.",
+    "entities_written": "Entity states written per poll.",
+    "invalid_objects_total": "Objects in a poll that could not be parsed.",
+}
+
+
+class _Histogram:
+    __slots__ = ("buckets", "count", "counts", "sum")
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms keyed by name and label values."""
+
+    def __init__(self):
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._gauges: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, _Histogram]] = {}
+
+    def inc(self, name: str, labels: dict[str, str] = None, value: float = 1):
+        series = self._counters.setdefault(name, {})
+        key = _key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, labels: dict[str, str] = None):
+        self._gauges.setdefault(name, {})[_key(labels)] = value
+
+    def observe(self, name: str, value: float, buckets: Iterable[float], labels: dict[str, str] = None):
+        series = self._histograms.setdefault(name, {})
+        key = _key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = _Histogram(buckets)
+        histogram.observe(value)
+
+    def render(self) -> str:
+        lines = []
+        for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+            for name, series in sorted(metrics.items()):
+                _header(lines, name, kind)
+                for key, value in sorted(series.items()):
+                    lines.append(f"{PREFIX}{name}{_labels(key)} {value}")
+        for name, series in sorted(self._histograms.items()):
+            _header(lines, name, "histogram")
+            for key, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    le = (*key, ("le", str(bound)))
+                    lines.append(f"{PREFIX}{name}_bucket{_labels(le)} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_labels(key)} {histogram.sum}")
+                lines.append(f"{PREFIX}{name}_count{_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def bind(self, **labels: str) -> "BoundMetrics":
+        """Return a view that adds labels, e.g. the config entry, to every series."""
+        return BoundMetrics(self, labels)
+
+
+class BoundMetrics:
+    def __init__(self, registry: MetricsRegistry, labels: dict[str, str]):
+        self.registry = registry
+        self.labels = labels
+
+    def inc(self, name: str, labels: dict[str, str] = None, value: float = 1):
+        self.registry.inc(name, {**self.labels, **(labels or {})}, value)
+
+    def set(self, name: str, value: float, labels: dict[str, str] = None):
+        self.registry.set(name, value, {**self.labels, **(labels or {})})
+
+    def observe(self, name: str, value: float, buckets: Iterable[float], labels: dict[str, str] = None):
+        self.registry.observe(name, value, buckets, {**self.labels, **(labels or {})})
+
+
+class NatureRemoMetricsView(HomeAssistantView):
+    url = "/api/nature_remo/metrics"
+    name = "api:nature_remo:metrics"
+
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self.registry = registry
+
+    async def get(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+
+def async_get_registry(hass: HomeAssistant) -> MetricsRegistry:
+    """Return the process-wide registry, exposing it on first use."""
+    registry = hass.data.get(DATA_METRICS)
+    if registry is None:
+        registry = hass.data[DATA_METRICS] = MetricsRegistry()
+        hass.http.register_view(NatureRemoMetricsView(registry))
+    return registry
+
+
+def endpoint_of(path: str) -> str:
+    """Replace the object id in an API path, e.g. signals/{id}/send."""
+    parts = path.split("/")
+    if len(parts) > 2:
+        parts[1] = "{id}"
+    return "/".join(parts)
+
+
+def _key(labels: dict[str, str]) -> tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in key
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _header(lines: list[str], name: str, kind: str):
+    if name in _HELP:
+        lines.append(f"# HELP {PREFIX}{name} {_HELP[name]}")
+    lines.append(f"# TYPE {PREFIX}{name} {kind}")
@@ -0,0 +1,413 @@
+"""Decoded views of Nature Remo API objects.
+
+Objects are parsed once per poll, pruned to what the platforms use, with
+numbers and timestamps converted. A constructor raises KeyError,
+TypeError or ValueError for an object it cannot make sense of.
+"""
+from datetime import datetime
+from typing import Callable
+from zoneinfo import ZoneInfo
+
+EPC_COEFFICIENT = 0xD3
+EPC_EFFECTIVE_DIGITS = 0xD7
+EPC_NORMAL_CUMULATIVE = 0xE0
+EPC_CUMULATIVE_UNIT = 0xE1
+EPC_REVERSE_CUMULATIVE = 0xE3
+EPC_INSTANTANEOUS_POWER = 0xE7
+EPC_NORMAL_FIXED_TIME = 0xEA
+EPC_REVERSE_FIXED_TIME = 0xEB
+
+# fixed-time (every 30 minutes) reading of each cumulative register
+FIXED_TIME_OF = {
+    EPC_NORMAL_CUMULATIVE: EPC_NORMAL_FIXED_TIME,
+    EPC_REVERSE_CUMULATIVE: EPC_REVERSE_FIXED_TIME,
+}
+
+ENERGY_UNITS = {
+    0x00: 1,
+    0x01: 0.1,
+    0x02: 0.01,
+    0x03: 0.001,
+    0x04: 0.0001,
+    0x0A: 10,
+    0x0B: 100,
+    0x0C: 1000,
+    0x0D: 10000,
+}
+
+# Smart meters keep Japan time regardless of the Home Assistant time zone.
+METER_TIME_ZONE = ZoneInfo("Asia/Tokyo")
+
+# "no data" of a 4 byte cumulative register
+_NO_DATA = 0xFFFFFFFE
+
+
+def _decode_fixed_time(val: str) -> tuple[datetime, int]:
+    """Decode YYYY MM DD hh mm ss and the register, 11 bytes in hex."""
+    raw = bytes.fromhex(val)
+    if len(raw) != 11:
+        raise ValueError(f"unexpected length {len(raw)}")
+    value = int.from_bytes(raw[7:], "big")
+    if value >= _NO_DATA:
+        raise ValueError("no data")
+    time = datetime(
+        int.from_bytes(raw[:2], "big"), raw[2], raw[3], raw[4], raw[5], raw[6],
+        tzinfo=METER_TIME_ZONE)
+    return time, value
+
+
+def _decode_other(val: str):
+    try:
+        return int(val)
+    except ValueError:
+        return val
+
+
+EPC_DECODERS: dict[int, Callable[[str], object]] = {
+    EPC_COEFFICIENT: int,
+    EPC_EFFECTIVE_DIGITS: int,
+    EPC_NORMAL_CUMULATIVE: int,
+    EPC_CUMULATIVE_UNIT: int,
+    EPC_REVERSE_CUMULATIVE: int,
+    EPC_INSTANTANEOUS_POWER: int,
+    EPC_NORMAL_FIXED_TIME: _decode_fixed_time,
+    EPC_REVERSE_FIXED_TIME: _decode_fixed_time,
+}
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _number(value):
+    """Keep JSON numbers as they are, parse numbers sent as strings."""
+    if isinstance(value, bool):
+        raise TypeError(f"not a number: {value!r}")
+    if isinstance(value, (int, float)):
+        return value
+    return float(value)
+
+
+def _optional_number(value):
+    return None if value is None else _number(value)
+
+
+class _Model:
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(
+            getattr(self, x) == getattr(other, x) for x in self.__slots__)
+
+    def __repr__(self):
+        values = ", ".join(f"{x}={getattr(self, x)!r}" for x in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+
+class SensorEvent(_Model):
+    """The newest reading of one sensor of a Remo."""
+
+    __slots__ = ("created_at", "val")
+
+    def __init__(self, data: dict):
+        self.val = _number(data["val"])
+        self.created_at = parse_time(data["created_at"])
+
+
+class Device(_Model):
+    """A Remo."""
+
+    __slots__ = (
+        "firmware_version", "humidity_offset", "id", "mac_address", "name",
+        "newest_events", "temperature_offset",
+    )
+
+    def __init__(self, data: dict):
+        self.id: str = data["id"]
+        self.name: str = data["name"]
+        self.mac_address: str = data["mac_address"]
+        self.firmware_version: str = data["firmware_version"]
+        # None on models without the sensor
+        self.temperature_offset = _optional_number(data.get("temperature_offset"))
+        self.humidity_offset = _optional_number(data.get("humidity_offset"))
+        self.newest_events: dict[str, SensorEvent] = {
+            key: SensorEvent(value)
+            for key, value in (data.get("newest_events") or {}).items()
+        }
+
+
+class Signal(_Model):
+    """A learned IR signal."""
+
+    __slots__ = ("id", "image", "name")
+
+    def __init__(self, data: dict):
+        self.id: str = data["id"]
+        self.name: str = data["name"]
+        self.image: str = data.get("image")
+
+
+class Button(_Model):
+    """A button of a TV or light preset."""
+
+    __slots__ = ("image", "label", "name")
+
+    def __init__(self, data: dict):
+        self.name: str = data["name"]
+        self.label: str = data.get("label") or data["name"]
+        self.image: str = data.get("image")
+
+
+class AirconRange(_Model):
+    """Modes of an aircon and the temperatures, volumes and directions of each."""
+
+    __slots__ = ("dirs", "temp_unit", "temps", "vols")
+
+    def __init__(self, data: dict):
+        modes: dict[str, dict] = data["range"]["modes"]
+        self.temps: dict[str, list[float]] = {
+            mode: [float(x) for x in value.get("temp") or () if x]
+            for mode, value in modes.items()
+        }
+        self.vols: dict[str, list[str]] = {
+            mode: list(value.get("vol") or ()) for mode, value in modes.items()}
+        self.dirs: dict[str, list[str]] = {
+            mode: list(value.get("dir") or ()) for mode, value in modes.items()}
+        self.temp_unit: str = data.get("tempUnit")
+
+    @property
+    def modes(self):
+        return self.temps.keys()
+
+
+# keys of aircon settings, in polls and aircon_settings responses
+AIRCON_SETTINGS = ("button", "dir", "mode", "temp", "temp_unit", "vol")
+
+
+def aircon_settings_of(data: dict) -> dict:
+    """Prune aircon settings and parse updated_at."""
+    settings = {key: data[key] for key in AIRCON_SETTINGS}
+    updated_at = data.get("updated_at")
+    settings["updated_at"] = parse_time(updated_at) if updated_at else None
+    return settings
+
+
+class EchonetProperty(_Model):
+    """An echonetlite property of a smart meter, its value decoded.
+
+    Values are decoded with EPC_DECODERS; unknown EPCs are kept as int
+    where possible and as the raw string otherwise. val is None when
+    the meter reports something that does not decode.
+    """
+
+    __slots__ = ("epc", "name", "updated_at", "val")
+
+    def __init__(self, data: dict):
+        self.epc: int = int(data["epc"])
+        self.name: str = data["name"]
+        self.updated_at = parse_time(data["updated_at"])
+        try:
+            self.val = EPC_DECODERS.get(self.epc, _decode_other)(data["val"])
+        except (TypeError, ValueError):
+            self.val = None
+
+
+class Appliance(_Model):
+    """An appliance with the parts of its type.
+
+    settings is set for aircons, buttons and state for TVs and lights,
+    smart_meter for Remo E.
+    """
+
+    __slots__ = (
+        "aircon", "buttons", "device_id", "id", "image", "manufacturer",
+        "model", "nickname", "settings", "signals", "smart_meter", "state", "type",
+    )
+
+    def __init__(self, data: dict):
+        self.id: str = data["id"]
+        self.type: str = data.get("type")
+        self.nickname: str = data["nickname"]
+        self.image: str = data.get("image")
+        self.device_id: str = data["device"]["id"]
+        model = data.get("model")
+        self.manufacturer: str = model["manufacturer"] if model else None
+        self.model: str = model["name"] if model else None
+        self.signals = tuple(Signal(x) for x in data.get("signals") or ())
+        aircon = data.get("aircon")
+        self.aircon = AirconRange(aircon) if aircon else None
+        settings = data.get("settings")
+        self.settings: dict = aircon_settings_of(settings) if aircon and settings else None
+        if self.type == "AC" and self.settings is None:
+            raise ValueError("aircon without range or settings")
+        self.buttons: tuple[Button, ...] = None
+        self.state: dict = None
+        for kind in ("tv", "light"):
+            if data.get(kind) is not None:
+                self.buttons = tuple(Button(x) for x in data[kind]["buttons"])
+                self.state = data[kind].get("state")
+        self.smart_meter: tuple[EchonetProperty, ...] = None
+        if data.get("smart_meter") is not None:
+            self.smart_meter = tuple(
+                EchonetProperty(x) for x in data["smart_meter"]["echonetlite_properties"])
+            if not self.smart_meter:
+                raise ValueError("smart meter without properties")
+
+
+class SmartMeterSnapshot:
+    """EPC-indexed echonetlite properties of one smart meter poll."""
+
+    __slots__ = ("names", "updated_at", "values")
+
+    def __init__(self, properties: tuple[EchonetProperty, ...]):
+        self.names: dict[int, str] = {}
+        self.values: dict[int, object] = {}
+        for x in properties:
+            self.names[x.epc] = x.name
+            if x.val is not None:
+                self.values[x.epc] = x.val
+        self.updated_at: datetime = properties[0].updated_at
+
+    @property
+    def instantaneous_power(self):
+        return self.values.get(EPC_INSTANTANEOUS_POWER)
+
+    def _scale(self):
+        """Return kWh per unit of the cumulative registers."""
+        unit = ENERGY_UNITS.get(self.values.get(EPC_CUMULATIVE_UNIT))
+        if unit is None:
+            return None
+        # the coefficient is optional and defaults to 1
+        return self.values.get(EPC_COEFFICIENT, 1) * unit
+
+    def cumulative_energy(self, epc: int):
+        """Return the cumulative register in kWh."""
+        scale = self._scale()
+        if scale is None or epc not in self.values:
+            return None
+        return self.values[epc] * scale
+
+    def fixed_time_energy(self, epc: int):
+        """Return the time and kWh of the last fixed-time reading of a register."""
+        scale = self._scale()
+        reading = self.values.get(FIXED_TIME_OF.get(epc))
+        if scale is None or reading is None:
+            return None
+        return reading[0], reading[1] * scale
+
+    def rollover(self):
+        """Return the kWh at which the cumulative registers wrap to zero."""
+        scale = self._scale()
+        digits = self.values.get(EPC_EFFECTIVE_DIGITS)
+        if scale is None or digits is None:
+            return None
+        return 10 ** digits * scale
+
+
+POWER_ON = "on"
+POWER_OFF = "off"
+POWER_TOGGLE = "toggle"
+
+# what sending a signal does to the power of an appliance, by its icon
+POWER_OF_IMAGE = {
+    "ico_on": POWER_ON,
+    "ico_off": POWER_OFF,
+    "ico_io": POWER_TOGGLE,
+}
+
+
+class Command:
+    """A learned signal, or a button of a TV or light."""
+
+    __slots__ = ("button", "id", "image", "label", "name", "power")
+
+    def __init__(self, id: str, name: str, label: str, image: str, button: bool):
+        self.id = id
+        self.name = name
+        self.label = label
+        self.image = image
+        self.button = button
+        self.power: str = POWER_OF_IMAGE.get(image)
+
+
+class CommandCatalog:
+    """Signals and buttons of one appliance, indexed for sending.
+
+    A command is looked up by button name, signal id, signal name or
+    button label, in that order when they collide.
+    """
+
+    __slots__ = ("_index", "_power", "buttons", "signals")
+
+    def __init__(self, signals: tuple[Signal, ...], buttons: tuple[Button, ...] = None):
+        self.signals = tuple(
+            Command(x.id, x.name, x.name, x.image, False) for x in signals)
+        self.buttons = None if buttons is None else tuple(
+            Command(x.name, x.name, x.label, x.image, True) for x in buttons)
+        self._index: dict[str, Command] = {}
+        for x in self.buttons or ():
+            self._index.setdefault(x.name, x)
+        for x in self.signals:
+            self._index.setdefault(x.id, x)
+        for x in self.signals:
+            self._index.setdefault(x.name, x)
+        for x in self.buttons or ():
+            self._index.setdefault(x.label, x)
+        self._power: dict[str, Command] = {}
+        for x in self.signals:
+            if x.power is not None:
+                self._power.setdefault(x.power, x)
+
+    def __len__(self):
+        return len(self.signals) + len(self.buttons or ())
+
+    def get(self, key: str) -> Command:
+        return self._index.get(key)
+
+    def power_signal(self, power: str) -> Command:
+        """Return the signal that switches to power, or one that toggles it."""
+        return self._power.get(power) or self._power.get(POWER_TOGGLE)
+
+    def first_button(self, names) -> Command:
+        """Return the first of the button names the appliance has."""
+        for name in names:
+            command = self._index.get(name)
+            if command is not None and command.button:
+                return command
+        return None
+
+    def as_dict(self) -> dict:
+        return {
+            "signals": [
+                {"id": x.id, "name": x.name, "image": x.image} for x in self.signals
+            ],
+            "buttons": None if self.buttons is None else [
+                {"name": x.name, "label": x.label, "image": x.image} for x in self.buttons
+            ],
+        }
+
+    def choices(self) -> dict[str, str]:
+        """Map command keys to display names, signals by id and buttons by name."""
+        choices = {x.id: x.name for x in self.signals}
+        choices.update((x.name, x.label) for x in self.buttons or ())
+        return choices
+
+
+class ApplianceStructure:
+    """Compiled signals, buttons and aircon range of one appliance."""
+
+    __slots__ = ("aircon", "buttons", "commands", "signals")
+
+    def __init__(self, appliance: Appliance):
+        self.signals = appliance.signals
+        self.buttons = appliance.buttons
+        self.aircon = appliance.aircon
+        self.commands = CommandCatalog(self.signals, self.buttons)
+
+    def matches(self, appliance: Appliance) -> bool:
+        """Return whether the appliance still has this structure."""
+        return (
+            self.signals == appliance.signals
+            and self.buttons == appliance.buttons
+            and self.aircon == appliance.aircon
+        )
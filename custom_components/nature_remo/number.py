@@ -9,6 +9,7 @@ from homeassistant.helpers.entity import DeviceInfo, EntityCategory
 
 from .common import (DOMAIN, NatureEntity, NatureUpdateCoordinator,
                      check_update, create_device_device_info)
+from .models import Device
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,14 +21,14 @@ _KEY_TO_ICON = {
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities):
     _LOGGER.debug("Setting up number platform.")
-    devices: NatureUpdateCoordinator = hass.data[DOMAIN]["devices"]
-    post: Callable = hass.data[DOMAIN]["post"]
+    devices: NatureUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]["devices"]
+    post: Callable = hass.data[DOMAIN][entry.entry_id]["post"]
 
-    def on_add(device: dict):
+    def on_add(device: Device):
         device_info = create_device_device_info(device)
-        if ("temperature_offset" in device):
+        if device.temperature_offset is not None:
             yield OffsetConfigEntity(devices, post, device, "temperature_offset", 5, 0.5, device_info)
-        if ("humidity_offset" in device):
+        if device.humidity_offset is not None:
             yield OffsetConfigEntity(devices, post, device, "humidity_offset", 20, 5, device_info)
 
     check_update(entry, async_add_entities, devices, on_add)
@@ -36,9 +37,9 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
 class OffsetConfigEntity(NatureEntity, NumberEntity):
     _attr_mode = NumberMode.BOX
 
-    def __init__(self, coordinator: NatureUpdateCoordinator, post: Callable, device: dict, key: str, range: float, step: float, device_info: DeviceInfo):
+    def __init__(self, coordinator: NatureUpdateCoordinator, post: Callable, device: Device, key: str, range: float, step: float, device_info: DeviceInfo):
         super().__init__(coordinator,
-                         device['id'], f"{device['id']}_{key}", device_info)
+                         device.id, f"{device.id}_{key}", device_info)
         self._attr_icon = _KEY_TO_ICON[key]
         self._attr_native_max_value = range
         self._attr_native_min_value = -range
@@ -48,11 +49,11 @@ class OffsetConfigEntity(NatureEntity, NumberEntity):
         self._post = post
         self._on_data_update(device)
 
-    def _on_data_update(self, device: dict):
+    def _on_data_update(self, device: Device):
         super()._on_data_update(device)
-        self._attr_native_value = device[self._key]
+        self._attr_native_value = getattr(device, self._key)
 
     async def async_set_native_value(self, value: float) -> None:
-        await self._post(f"devices/{self._remo_id}/{self._key}", {"offset": value})
+        await self._post(f"devices/{self._remo_id}/{self._key}", {"offset": value}, key=self._remo_id, coalesce=self._key)
         self._attr_native_value = value
         self.async_write_ha_state()
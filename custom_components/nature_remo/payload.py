@@ -0,0 +1,93 @@
+"""Decoding and indexing of list responses, free of coordinator state."""
+import hashlib
+from typing import Callable
+
+from homeassistant.util.json import json_loads_array
+import orjson
+
+# Bodies from this size on are decoded in the executor instead of on the
+# event loop; /appliances of an account with many learned signals easily
+# reaches several hundred kB.
+EXECUTOR_THRESHOLD = 64 * 1024
+
+
+def digest_of(body: bytes) -> bytes:
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+def fingerprint(value) -> str:
+    """Return a stable digest of a decoded JSON value."""
+    return hashlib.blake2b(
+        orjson.dumps(value, option=orjson.OPT_SORT_KEYS),
+        digest_size=16,
+    ).hexdigest()
+
+
+class Payload:
+    """A parsed response body indexed by id, with its diff to the last one."""
+
+    __slots__ = (
+        "added", "changed", "data", "digest", "extra", "fingerprints",
+        "invalid", "removed", "type_of", "types",
+    )
+
+    def __init__(self, digest: bytes):
+        self.digest = digest
+        self.data: dict[str, object] = {}
+        self.fingerprints: dict[str, str] = {}
+        self.types: dict[str, set[str]] = {}
+        self.type_of: dict[str, str] = {}
+        self.changed: set[str] = set()
+        self.added: set[str] = set()
+        self.removed: set[str] = set()
+        # why objects could not be parsed, by id
+        self.invalid: dict[str, str] = {}
+        # whatever the coordinator decodes on top, see _prepare
+        self.extra = None
+
+
+def normalize(
+    body: bytes,
+    digest: bytes,
+    previous: dict[str, str],
+    parse: Callable[[dict], object],
+    parsed: dict[str, object],
+) -> Payload:
+    """Decode a list body, parse what changed and diff it against previous.
+
+    Objects whose fingerprint did not change keep their parsed model from
+    parsed. An object that fails to parse keeps its last model, or is left
+    out if there is none, and is reported in invalid.
+
+    Pure function of its arguments, safe to run in the executor.
+    """
+    payload = Payload(digest)
+    for x in json_loads_array(body):
+        id = x.get("id") if isinstance(x, dict) else None
+        if not isinstance(id, str):
+            payload.invalid[repr(id)] = "no id"
+            continue
+        value = fingerprint(x)
+        item = parsed.get(id) if previous.get(id) == value else None
+        if item is None:
+            try:
+                item = parse(x)
+            except (AttributeError, KeyError, TypeError, ValueError) as err:
+                payload.invalid[id] = repr(err)
+                if id not in parsed or id not in previous:
+                    continue
+                item = parsed[id]
+                value = previous[id]
+        type = x.get("type")
+        payload.data[id] = item
+        payload.fingerprints[id] = value
+        payload.types.setdefault(type, set()).add(id)
+        payload.type_of[id] = type
+    fingerprints = payload.fingerprints
+    payload.changed = {
+        id for id, value in fingerprints.items() if previous.get(id) != value
+    }
+    payload.added = fingerprints.keys() - previous.keys()
+    payload.removed = previous.keys() - fingerprints.keys()
+    payload.changed.update(payload.removed)
+    return payload
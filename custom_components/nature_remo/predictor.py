@@ -0,0 +1,113 @@
+"""Learned poll timing for Remo E smart meter readings."""
+from collections import deque
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from statistics import median
+from typing import Iterable
+
+DEFAULT_PERIOD = timedelta(seconds=60)
+MIN_PERIOD = timedelta(seconds=10)
+MAX_PERIOD = timedelta(minutes=10)
+
+# Margin after the expected update; jitter of the meter widens it.
+MIN_MARGIN = timedelta(seconds=1)
+MAX_MARGIN = timedelta(seconds=15)
+
+HISTORY = 12
+CLOCK_SAMPLES = 20
+
+
+class ClockOffset:
+    """Estimate server minus local clock from response Date headers.
+
+    Date has a resolution of one second and is stamped before the
+    response travels back, so every sample underestimates the offset;
+    the largest recent sample is the tightest bound.
+    """
+
+    def __init__(self) -> None:
+        self._samples: deque[float] = deque(maxlen=CLOCK_SAMPLES)
+
+    def add(self, date: str, received: datetime):
+        try:
+            server = parsedate_to_datetime(date)
+        except (TypeError, ValueError):
+            return
+        self._samples.append((server - received).total_seconds())
+
+    @property
+    def offset(self) -> timedelta:
+        return timedelta(seconds=max(self._samples, default=0))
+
+
+class _Meter:
+    __slots__ = ("history",)
+
+    def __init__(self) -> None:
+        self.history: deque[datetime] = deque(maxlen=HISTORY)
+
+    def timing(self):
+        """Return the learned period and margin of the meter."""
+        history = self.history
+        if len(history) < 2:
+            return DEFAULT_PERIOD, MAX_MARGIN
+        diffs = [(b - a).total_seconds() for a, b in zip(history, list(history)[1:])]
+        base = median(diffs)
+        # polls that missed an update see two or more periods at once
+        steps = [max(1, round(x / base)) for x in diffs]
+        period = median(x / n for x, n in zip(diffs, steps))
+        period = min(max(period, MIN_PERIOD.total_seconds()), MAX_PERIOD.total_seconds())
+        jitter = median(abs(x - n * period) for x, n in zip(diffs, steps))
+        margin = timedelta(seconds=2 * jitter) + MIN_MARGIN
+        return timedelta(seconds=period), min(margin, MAX_MARGIN)
+
+
+class MeterPredictor:
+    """Predict when each meter publishes its next reading.
+
+    Each meter's period and phase are learned from the ``updated_at`` of
+    past readings. A poll is planned one margin after the expected
+    update, with one retry at three margins for late readings. Times
+    are in server time; callers convert with ClockOffset.
+    """
+
+    def __init__(self) -> None:
+        self._meters: dict[str, _Meter] = {}
+
+    def observe(self, id: str, updated_at: datetime) -> bool:
+        """Record a reading, return whether it is new."""
+        meter = self._meters.get(id)
+        if meter is None:
+            meter = self._meters[id] = _Meter()
+        if meter.history and updated_at <= meter.history[-1]:
+            return False
+        meter.history.append(updated_at)
+        return True
+
+    def known(self, id: str) -> bool:
+        meter = self._meters.get(id)
+        return meter is not None and len(meter.history) > 1
+
+    def forget(self, keep: Iterable[str]):
+        keep = set(keep)
+        for id in self._meters.keys() - keep:
+            del self._meters[id]
+
+    def next_poll(self, earliest: datetime) -> datetime:
+        """Return the first planned poll at or after earliest (server time)."""
+        best = None
+        for meter in self._meters.values():
+            if not meter.history:
+                continue
+            period, margin = meter.timing()
+            last = meter.history[-1]
+            k = max(1, int((earliest - last - 3 * margin) / period))
+            while True:
+                expected = last + k * period
+                poll = next((x for x in (expected + margin, expected + 3 * margin) if x >= earliest), None)
+                if poll is not None:
+                    break
+                k += 1
+            if best is None or poll < best:
+                best = poll
+        return best
@@ -0,0 +1,210 @@
+"""Share the polls of one instance with other Home Assistant instances.
+
+The instance that polls the cloud serves the last /devices and
+/appliances bodies under /api/nature_remo/relay/<account id>/ with the
+same paths as the API, so another instance can point NatureApiClient at
+it. Bodies carry an ETag; a GET with If-None-Match and ?wait= is held
+until the body changes. POSTs are forwarded to the cloud through the
+command queue of the polling instance, behind its own user commands.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from aiohttp import web
+
+from homeassistant.components.http import KEY_HASS_USER, HomeAssistantView
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import Unauthorized
+
+from .api import NatureApiError, NatureRateLimitError
+from .commands import PRIORITY_BACKGROUND
+from .common import DOMAIN, NatureUpdateCoordinator
+from .scheduler import RateLimitScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_RELAY = "nature_remo_relay"
+
+URL = "/api/nature_remo/relay"
+
+# longest a consumer may hold a poll, below common proxy timeouts
+MAX_WAIT = 55
+
+# what consumers ask for, a little shorter so the reply beats MAX_WAIT
+LONG_POLL = 50
+
+
+class RelaySource:
+    """The latest bodies of one config entry and the consumers waiting for them."""
+
+    def __init__(
+        self,
+        entry: ConfigEntry,
+        coordinators: list[NatureUpdateCoordinator],
+        scheduler: RateLimitScheduler,
+        post: Callable[..., Awaitable],
+    ) -> None:
+        self.entry = entry
+        self.scheduler = scheduler
+        self.post = post
+        self._coordinators = {x.path: x for x in coordinators}
+        self._waiters: dict[str, list[asyncio.Future]] = {}
+        # appliance id by signal id, rebuilt on demand after an appliances poll
+        self._owners: dict[str, str] = None
+        for coordinator in coordinators:
+            entry.async_on_unload(coordinator.async_add_listener(
+                lambda path=coordinator.path: self._on_update(path)))
+        entry.async_on_unload(self._async_cancel)
+
+    @property
+    def account(self) -> str:
+        """Return the Nature user id, None until a legacy entry is migrated."""
+        if self.entry.unique_id in (None, DOMAIN):
+            return None
+        return self.entry.unique_id
+
+    def coordinator(self, path: str) -> NatureUpdateCoordinator:
+        return self._coordinators.get(path)
+
+    def key_of(self, path: str) -> str:
+        """Return the queue key of a POST, the object it is ordered by.
+
+        appliances/<id>/... and devices/<id>/... are keyed by their id,
+        signals/<id>/... by the appliance that owns the signal, the same
+        keys the entities of this instance use.
+        """
+        parts = path.split("/")
+        if len(parts) < 3:
+            return path
+        if parts[0] == "signals":
+            return self._signal_owners().get(parts[1], parts[1])
+        return parts[1]
+
+    def _signal_owners(self) -> dict[str, str]:
+        if self._owners is None:
+            appliances = self._coordinators.get("appliances")
+            self._owners = {
+                signal.id: appliance.id
+                for appliance in (appliances.data or {}).values()
+                for signal in appliance.signals
+            } if appliances else {}
+        return self._owners
+
+    async def async_wait(self, path: str, etag: str, timeout: float):
+        """Wait up to timeout for a body of path that does not match etag."""
+        coordinator = self._coordinators[path]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while coordinator.etag == etag:
+            left = deadline - loop.time()
+            if left <= 0:
+                return
+            future = loop.create_future()
+            self._waiters.setdefault(path, []).append(future)
+            try:
+                await asyncio.wait_for(future, left)
+            except asyncio.TimeoutError:
+                return
+
+    def rate_limit_headers(self) -> dict[str, str]:
+        data = self.scheduler.rate_limit.data
+        if data is None:
+            return {}
+        return {
+            "x-rate-limit-remaining": str(data["remaining"]),
+            "x-rate-limit-reset": str(int(data["reset"].timestamp())),
+        }
+
+    @callback
+    def _on_update(self, path: str):
+        if path == "appliances":
+            self._owners = None
+        for future in self._waiters.pop(path, ()):
+            if not future.done():
+                future.set_result(None)
+
+    @callback
+    def _async_cancel(self):
+        for waiters in self._waiters.values():
+            for future in waiters:
+                future.cancel()
+        self._waiters.clear()
+
+
+@callback
+def async_setup_relay(hass: HomeAssistant):
+    """Register the view once per process."""
+    if hass.data.get(DATA_RELAY):
+        return
+    hass.data[DATA_RELAY] = True
+    hass.http.register_view(NatureRemoRelayView())
+
+
+def _sources(hass: HomeAssistant):
+    for data in hass.data.get(DOMAIN, {}).values():
+        if "relay" in data:
+            yield data["relay"]
+
+
+class NatureRemoRelayView(HomeAssistantView):
+    """Nature Remo API paths served from the polls of this instance."""
+
+    url = URL
+    extra_urls = [URL + "/{account}/{path:.+}"]
+    name = "api:nature_remo:relay"
+
+    def _source(self, request: web.Request, account: str) -> RelaySource:
+        if not request[KEY_HASS_USER].is_admin:
+            raise Unauthorized()
+        hass: HomeAssistant = request.app["hass"]
+        return next((x for x in _sources(hass) if x.account == account), None)
+
+    async def get(self, request: web.Request, account: str = None, path: str = None):
+        if account is None:
+            if not request[KEY_HASS_USER].is_admin:
+                raise Unauthorized()
+            return self.json([
+                {"id": x.account, "nickname": x.entry.title}
+                for x in _sources(request.app["hass"])
+                if x.account is not None
+            ])
+        source = self._source(request, account)
+        if source is None:
+            return self.json_message("Unknown account", 404)
+        if path == "users/me":
+            return self.json({"id": source.account, "nickname": source.entry.title})
+        coordinator = source.coordinator(path)
+        if coordinator is None:
+            return self.json_message("Not relayed", 404)
+        if coordinator.body is None:
+            return self.json_message("No data yet", 503)
+        etag = request.headers.get("If-None-Match")
+        if etag is not None and etag == coordinator.etag:
+            try:
+                wait = min(float(request.query.get("wait", 0)), MAX_WAIT)
+            except ValueError:
+                wait = 0
+            await source.async_wait(path, etag, wait)
+        headers = {"ETag": coordinator.etag, **source.rate_limit_headers()}
+        if etag is not None and etag == coordinator.etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(
+            body=coordinator.body, content_type="application/json", headers=headers)
+
+    async def post(self, request: web.Request, account: str, path: str):
+        source = self._source(request, account)
+        if source is None:
+            return self.json_message("Unknown account", 404)
+        data = dict(await request.post()) or None
+        try:
+            result = await source.post(path, data, key=source.key_of(path), priority=PRIORITY_BACKGROUND)
+        except NatureRateLimitError as err:
+            return self.json_message(
+                str(err), 429,
+                headers={"x-rate-limit-reset": str(int(err.reset.timestamp()))})
+        except NatureApiError as err:
+            _LOGGER.debug("Relayed %s failed: %s", path, err)
+            return self.json_message(str(err), 502)
+        return self.json(result, headers=source.rate_limit_headers())
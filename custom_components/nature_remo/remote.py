@@ -1,15 +1,24 @@
 import asyncio
+from functools import partial
 import logging
 from typing import Callable, Iterable
 from homeassistant.config_entries import ConfigEntry
 
 from homeassistant.components.remote import RemoteEntity,RemoteEntityFeature
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_platform
 from homeassistant.helpers.entity import DeviceInfo, EntityCategory
+from .commands import PRIORITY_BACKGROUND, PRIORITY_USER, CommandSequence
+from .local import LocalTransport
+from .models import POWER_OFF, POWER_ON, POWER_TOGGLE, Appliance, ApplianceStructure, Command
 from .common import DOMAIN, AppliancesUpdateCoordinator, NatureEntity, check_update, create_appliance_device_info
 
 _LOGGER = logging.getLogger(__name__)
 
+TYPES = ["IR", "LIGHT", "TV"]
+
+SERVICE_CANCEL_COMMAND = "cancel_command"
+
 _ACTIVITY_FILTER = [
     "night",
 ]
@@ -17,139 +26,228 @@ _ACTIVITY_FILTER = [
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities):
     _LOGGER.debug("Setting up remote platform.")
-    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN]["appliances"]
-    post: Callable = hass.data[DOMAIN]["post"]
-    def on_add(appliance: dict):
-        if appliance["type"] != "IR" and appliance["type"] != "LIGHT" and appliance["type"] != "TV":
-            return
+    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]["appliances"]
+    post: Callable = hass.data[DOMAIN][entry.entry_id]["post"]
+    local: LocalTransport = hass.data[DOMAIN][entry.entry_id]["local"]
+    def on_add(appliance: Appliance):
         device_info = create_appliance_device_info(appliance)
-        yield NatureRemoIR(appliances, post, appliance, device_info)
+        yield NatureRemoIR(appliances, post, local, appliance, device_info)
+
+    check_update(entry, async_add_entities, appliances, on_add, TYPES)
 
-    check_update(entry, async_add_entities, appliances, on_add)
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_CANCEL_COMMAND, {}, "async_cancel_command")
 
 
 class NatureRemoIR(NatureEntity, RemoteEntity):
     _attr_assumed_state = True
     _attr_entity_category = EntityCategory.CONFIG
     _attr_is_on = None
-    _attr_supported_features = RemoteEntityFeature.DELETE_COMMAND
+    _attr_supported_features = RemoteEntityFeature.DELETE_COMMAND | RemoteEntityFeature.LEARN_COMMAND
     _aptype = None
+    _sequence: CommandSequence = None
+    _structure: ApplianceStructure = None
 
-    def __init__(self, appliances: AppliancesUpdateCoordinator, post: Callable, appliance: dict, device_info: DeviceInfo):
+    def __init__(self, appliances: AppliancesUpdateCoordinator, post: Callable, local: LocalTransport, appliance: Appliance, device_info: DeviceInfo):
         super().__init__(appliances,
-                         appliance["id"], appliance["id"], device_info)
-        self._attr_name = appliance["nickname"]
+                         appliance.id, appliance.id, device_info)
+        self._attr_name = appliance.nickname
         self._post = post
-        if appliance["type"] == "LIGHT":
+        self._local = local
+        # sequences waiting or running, the last one is sent last
+        self._sequences: list[asyncio.Task] = []
+        if appliance.type == "LIGHT":
             self._aptype = "light"
             self._attr_supported_features |= RemoteEntityFeature.ACTIVITY
             self._attr_icon = "hass:lightbulb"
-        elif appliance["type"] == "TV":
+        elif appliance.type == "TV":
             self._aptype = "tv"
             self._attr_icon = "mdi:television"
         self._on_data_update(appliance)
 
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self.async_on_remove(self._cancel_sequences)
+
+    @property
+    def extra_state_attributes(self):
+        sequence = self._sequence
+        if sequence is None or sequence.total == 1:
+            return None
+        return {
+            "commands_sent": sequence.sent,
+            "commands_total": sequence.total,
+            "commands_per_second": round(sequence.throughput, 2),
+        }
+
     async def async_delete_command(self, command: str, **kwargs):
-        await self._post(f"signals/{command}/delete")
+        await self._post(f"signals/{command}/delete", key=self._remo_id)
+
+    async def async_learn_command(self, command: Iterable[str], timeout: float = None, **kwargs):
+        """Capture raw IR payloads from the Remo for sending on the LAN."""
+        await self._local.async_capture(
+            self._remo_id, [self._local_key(x) for x in command], timeout or 30)
+
+    def _local_key(self, command: str):
+        """Map a signal id or name, or a button name to its payload key."""
+        found = self._structure.commands.get(command)
+        if found is None or found.button:
+            return f"{self._remo_id}/{found.name if found else command}"
+        return found.id
 
     async def async_send_command(self, command: Iterable[str], delay_secs: str = "0", num_repeats: str = "1", **kwargs):
-        delay_secs = float(delay_secs)
-        num_repeats = int(num_repeats)
-        signals: dict = self._attr_extra_state_attributes["signals"]
-        buttons = self._attr_extra_state_attributes.get("buttons")
-        if buttons is not None:
-            buttons: list[str] = [b["name"] for b in buttons]
-        while True:
-            for id in command:
-                if buttons is not None and id in buttons:
-                    state = await self._post(f"appliances/{self._remo_id}/{self._aptype}", {"button": id})
-                    self._on_post_response(state)
-                    self.async_write_ha_state()
-                else:
-                    await self._post(f"signals/{id}/send")
-                    image = next((v["image"]
-                                 for v in signals if v["id"] == id), None)
-                    if image == "ico_on":
-                        self._attr_is_on = True
-                        self.async_write_ha_state()
-                    elif image == "ico_off":
-                        self._attr_is_on = False
-                        self.async_write_ha_state()
-                    elif image == "ico_io":
-                        self._attr_is_on = not self._attr_is_on
-                        self.async_write_ha_state()
-            num_repeats -= 1
-            if num_repeats <= 0:
-                break
-            await asyncio.sleep(delay_secs)
+        """Send the commands as a background sequence.
+
+        Sequences of one entity run one after another. A single command
+        is awaited so that its errors reach the caller.
+        """
+        command = list(command)
+        # repeats make way for commands the user sends meanwhile
+        rounds = [
+            [partial(self._async_send_one, id, PRIORITY_BACKGROUND if n else PRIORITY_USER) for id in command]
+            for n in range(int(num_repeats))
+        ]
+        sequence = CommandSequence(self.hass, rounds, float(delay_secs), self._on_sequence_progress)
+        task = self.hass.async_create_task(
+            self._async_run_sequence(sequence, self._sequences[-1] if self._sequences else None))
+        self._sequences.append(task)
+        task.add_done_callback(self._sequences.remove)
+        if sequence.total == 1:
+            await asyncio.wait([task])
+            if not task.cancelled():
+                task.result()
+
+    async def async_cancel_command(self):
+        self._cancel_sequences()
+
+    @callback
+    def _cancel_sequences(self):
+        """Cancel the running and waiting command sequences."""
+        for task in self._sequences:
+            task.cancel()
+
+    async def _async_run_sequence(self, sequence: CommandSequence, previous: asyncio.Task):
+        if previous is not None:
+            await asyncio.wait([previous])
+        self._sequence = sequence
+        try:
+            await sequence.async_run()
+        except asyncio.CancelledError:
+            _LOGGER.debug("Cancelled commands to %s after %d of %d", self._remo_id, sequence.sent, sequence.total)
+            raise
+        except Exception as err:  # pylint: disable=broad-except
+            if sequence.total == 1:
+                raise
+            _LOGGER.error("Stopped commands to %s after %d of %d: %s", self._remo_id, sequence.sent, sequence.total, err)
+        else:
+            _LOGGER.debug(
+                "Sent %d commands to %s in %.1f s (%.2f/s)",
+                sequence.total, self._remo_id, sequence.elapsed, sequence.throughput)
+        finally:
+            self._sequence = None
+            if self.hass is not None:
+                self.async_write_ha_state()
+
+    @callback
+    def _on_sequence_progress(self):
+        if self._sequence is not None and self._sequence.total > 1:
+            self.async_write_ha_state()
+
+    async def _async_send_one(self, id: str, priority: int):
+        # pipelined in the lane of the appliance, so the commands keep their order
+        found = self._structure.commands.get(id)
+        if found is not None and found.button:
+            state = await self._async_press(found.name, priority, pipeline=True)
+            self._on_post_response(state)
+            self.async_write_ha_state()
+        elif found is None and self._local.has(f"{self._remo_id}/{id}"):
+            await self._post(None, key=self._remo_id, local=f"{self._remo_id}/{id}", priority=priority, pipeline=True)
+        elif found is None:
+            await self._post(f"signals/{id}/send", key=self._remo_id, local=id, priority=priority, pipeline=True)
+        else:
+            await self._async_send_signal(found, priority, pipeline=True)
 
     async def async_turn_off(self, activity: str = None, **kwargs):
-        buttons = self._attr_extra_state_attributes.get("buttons")
-        if buttons is not None:
-            state = await self._async_send_button(buttons, activity, ["off", "onoff", "power"])
-            if state is not None:
+        commands = self._structure.commands
+        if commands.buttons is not None:
+            state = await self._async_send_button(activity, ["off", "onoff", "power"])
+            if state is not False:
                 self._attr_is_on = activity is not None
                 self._on_post_response(state)
                 self._async_write_ha_state()
                 return
-        signals: dict = self._attr_extra_state_attributes["signals"]
-        signal = next((v for v in signals if v["image"] == "ico_off"), None)
-        if signal is None:
-            signal = next((v for v in signals if v["image"] == "ico_io"), None)
+        signal = commands.power_signal(POWER_OFF)
         if signal is not None:
-            await self._post(f"signals/{signal['id']}/send")
+            await self._post(f"signals/{signal.id}/send", key=self._remo_id, local=signal.id)
         self._attr_is_on = False
         if self._aptype == "light":
             self._attr_current_activity = None
         self.async_write_ha_state()
 
     async def async_turn_on(self, activity: str = None, **kwargs):
-        buttons = self._attr_extra_state_attributes.get("buttons")
-        if buttons is not None:
-            state = await self._async_send_button(buttons, activity, ["on", "on-favorite", "on-100", "onoff", "power"])
-            if state is not None:
+        commands = self._structure.commands
+        if commands.buttons is not None:
+            state = await self._async_send_button(activity, ["on", "on-favorite", "on-100", "onoff", "power"])
+            if state is not False:
                 self._attr_is_on = True
                 self._on_post_response(state)
                 self._async_write_ha_state()
                 return
-        signals: dict = self._attr_extra_state_attributes["signals"]
-        signal = next((v for v in signals if v["image"] == "ico_on"), None)
-        if signal is None:
-            signal = next((v for v in signals if v["image"] == "ico_io"), None)
+        signal = commands.power_signal(POWER_ON)
         if signal is not None:
-            await self._post(f"signals/{signal['id']}/send")
+            await self._post(f"signals/{signal.id}/send", key=self._remo_id, local=signal.id)
         self._attr_is_on = True
         if self._aptype == "light":
             self._attr_current_activity = None
         self.async_write_ha_state()
 
-    async def _async_send_button(self, buttons, activity, names):
-        buttons: list[str] = [b["name"] for b in buttons]
+    async def _async_send_button(self, activity, names):
+        """Send the activity or the first available button of names.
+
+        Returns the appliance state, None when it went over the LAN and
+        False when no button matched.
+        """
         if activity:
-            return await self._post(f"appliances/{self._remo_id}/{self._aptype}", {"button": activity})
-        for b in names:
-            if b not in buttons:
-                continue
-            return await self._post(f"appliances/{self._remo_id}/{self._aptype}", {"button": b})
+            return await self._async_press(activity)
+        button = self._structure.commands.first_button(names)
+        if button is None:
+            return False
+        return await self._async_press(button.name)
+
+    async def _async_press(self, button: str, priority: int = PRIORITY_USER, pipeline: bool = False):
+        return await self._post(f"appliances/{self._remo_id}/{self._aptype}", {"button": button}, key=self._remo_id, local=f"{self._remo_id}/{button}", priority=priority, pipeline=pipeline)
+
+    async def _async_send_signal(self, signal: Command, priority: int = PRIORITY_USER, pipeline: bool = False):
+        await self._post(f"signals/{signal.id}/send", key=self._remo_id, local=signal.id, priority=priority, pipeline=pipeline)
+        if signal.power == POWER_ON:
+            self._attr_is_on = True
+        elif signal.power == POWER_OFF:
+            self._attr_is_on = False
+        elif signal.power == POWER_TOGGLE:
+            self._attr_is_on = not self._attr_is_on
+        else:
+            return
+        self.async_write_ha_state()
 
-    def _on_data_update(self, appliance: dict):
+    def _on_data_update(self, appliance: Appliance):
         super()._on_data_update(appliance)
-        self._attr_extra_state_attributes = {
-            "signals": appliance["signals"]
-        }
+        structure = self.coordinator.structures[self._remo_id]
+        if structure is not self._structure:
+            self._structure = structure
+            if self._aptype == "light":
+                self._attr_activity_list = [
+                    b.name for b in structure.buttons if b.name in _ACTIVITY_FILTER
+                ]
         if self._aptype:
-            self._attr_extra_state_attributes["buttons"] = appliance[self._aptype]["buttons"]
-            state = appliance[self._aptype]["state"]
-            self._on_post_response(state)
+            self._on_post_response(appliance.state)
 
     def _on_post_response(self, state: dict):
+        if state is None:
+            return
         if self._aptype == "light":
             if state["power"] == "on":
                 self._attr_is_on = True
             elif state["power"] == "off":
                 self._attr_is_on = False
-            buttons: list[dict] = self._attr_extra_state_attributes["buttons"]
-            self._attr_activity_list = [
-                b["name"] for b in buttons if b["name"] in _ACTIVITY_FILTER
-            ]
             self._attr_current_activity = state["last_button"] if state["last_button"] in _ACTIVITY_FILTER else None
@@ -0,0 +1,151 @@
+"""Rate-limit driven polling scheduler for the Nature Remo cloud API."""
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Mapping
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util.dt import utc_from_timestamp, utcnow
+
+# The cloud API allows 30 requests per 5 minutes per access token.
+RATE_LIMIT_WINDOW = timedelta(minutes=5)
+
+DEFAULT_INTERVAL = timedelta(seconds=60)
+MIN_INTERVAL = timedelta(seconds=15)
+
+# Requests kept free for user commands even when nobody has sent one lately.
+POST_RESERVE = 5
+
+# Gap between the polls of different pollers across all config entries.
+STAGGER_STEP = timedelta(seconds=2)
+
+DATA_STAGGER = "nature_remo_stagger"
+
+
+class PollStagger:
+    """Give every poller in the process its own phase.
+
+    Polls are scheduled on whole seconds; without a phase the coordinators
+    of all accounts would fire on the same second. Each poller gets a slot
+    and its polls are moved forward onto a grid of ``slots * STAGGER_STEP``
+    shifted by its slot, which keeps the phases apart whatever the
+    intervals are.
+    """
+
+    def __init__(self) -> None:
+        self._slots: dict[object, int] = {}
+
+    @callback
+    def register(self, poller: object) -> Callable[[], None]:
+        taken = set(self._slots.values())
+        self._slots[poller] = next(x for x in range(len(taken) + 1) if x not in taken)
+
+        @callback
+        def unregister():
+            self._slots.pop(poller, None)
+
+        return unregister
+
+    def align(self, poller: object, time: datetime) -> datetime:
+        """Return the first point of the poller's phase at or after time."""
+        slot = self._slots.get(poller)
+        if slot is None:
+            return time
+        period = (max(self._slots.values()) + 1) * STAGGER_STEP.total_seconds()
+        phase = slot * STAGGER_STEP.total_seconds()
+        delay = (phase - time.timestamp()) % period
+        return time + timedelta(seconds=delay)
+
+
+@callback
+def async_get_stagger(hass: HomeAssistant) -> PollStagger:
+    stagger = hass.data.get(DATA_STAGGER)
+    if stagger is None:
+        stagger = hass.data[DATA_STAGGER] = PollStagger()
+    return stagger
+
+
+class RateLimitScheduler:
+    """Spread the remaining request budget across pollers and commands.
+
+    Every response carries ``x-rate-limit-remaining``/``x-rate-limit-reset``.
+    The budget left until ``reset`` minus a reserve for outbound POSTs
+    (sized from the recent command rate) is divided between the registered
+    pollers, so polling speeds up with headroom and backs off before the
+    account runs into a 429.
+    """
+
+    def __init__(self, rate_limit: DataUpdateCoordinator, stagger: PollStagger = None) -> None:
+        self.rate_limit = rate_limit
+        self.stagger = stagger
+        self._pollers: set[object] = set()
+        self._posts: deque[datetime] = deque()
+
+    @callback
+    def register(self, poller: object) -> Callable[[], None]:
+        self._pollers.add(poller)
+        unstagger = self.stagger.register(poller) if self.stagger is not None else None
+
+        @callback
+        def unregister():
+            self._pollers.discard(poller)
+            if unstagger is not None:
+                unstagger()
+
+        return unregister
+
+    def align(self, poller: object, time: datetime) -> datetime:
+        if self.stagger is None:
+            return time
+        return self.stagger.align(poller, time)
+
+    @callback
+    def update(self, headers: Mapping[str, str]):
+        """Record the rate-limit headers of a response."""
+        if "x-rate-limit-remaining" not in headers:
+            return
+        remaining = int(headers["x-rate-limit-remaining"])
+        reset = utc_from_timestamp(int(headers["x-rate-limit-reset"]))
+        self.rate_limit.async_set_updated_data(
+            {"remaining": remaining, "reset": reset})
+
+    @callback
+    def note_post(self):
+        """Record an outbound command so polling leaves room for more."""
+        now = utcnow()
+        self._posts.append(now)
+        self._expire_posts(now)
+
+    def next_interval(self) -> timedelta:
+        """Return how long a poller should wait before its next request."""
+        data = self.rate_limit.data
+        if data is None:
+            return DEFAULT_INTERVAL
+        now = utcnow()
+        window_left = data["reset"] - now
+        if window_left <= timedelta(0):
+            # The window has rolled over, the budget is full again.
+            return DEFAULT_INTERVAL
+        budget = data["remaining"] - self._post_reserve(now, window_left)
+        if budget <= 0:
+            return window_left + timedelta(seconds=1)
+        interval = window_left * (max(len(self._pollers), 1) / budget)
+        return min(max(interval, MIN_INTERVAL), window_left + timedelta(seconds=1))
+
+    def not_before(self) -> datetime:
+        """Return the earliest point at which polling is worth a request."""
+        now = utcnow()
+        data = self.rate_limit.data
+        if data is None or data["remaining"] > 0 or data["reset"] <= now:
+            return now
+        return data["reset"] + timedelta(seconds=1)
+
+    def _post_reserve(self, now: datetime, window_left: timedelta) -> int:
+        self._expire_posts(now)
+        expected = len(self._posts) * (window_left / RATE_LIMIT_WINDOW)
+        return max(POST_RESERVE, round(expected))
+
+    def _expire_posts(self, now: datetime):
+        limit = now - RATE_LIMIT_WINDOW
+        while self._posts and self._posts[0] < limit:
+            self._posts.popleft()
@@ -1,5 +1,5 @@
 """Support for Nature Remo E energy sensor."""
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
 import logging
 from typing import Callable
 from homeassistant.config_entries import ConfigEntry
@@ -14,34 +14,31 @@ from homeassistant.const import (
 )
 from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorStateClass
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry
 from homeassistant.helpers.entity import DeviceInfo, EntityCategory
+from homeassistant.util.dt import utcnow
 
-from .common import DOMAIN, AppliancesUpdateCoordinator, NatureEntity, NatureUpdateCoordinator, RemoSensorEntity, check_update, create_appliance_device_info, create_device_device_info, modify_utc_z
+from .common import DOMAIN, AppliancesUpdateCoordinator, NatureEntity, NatureUpdateCoordinator, RemoSensorEntity, check_update, create_appliance_device_info, create_device_device_info
+from .models import EPC_INSTANTANEOUS_POWER, EPC_NORMAL_CUMULATIVE, EPC_REVERSE_CUMULATIVE, Appliance, Device, SmartMeterSnapshot
 
 _LOGGER = logging.getLogger(__name__)
 
-_ENERGY_UNITS = {
-    0x00: 1,
-    0x01: 0.1,
-    0x02: 0.01,
-    0x03: 0.001,
-    0x04: 0.0001,
-    0x0A: 10,
-    0x0B: 100,
-    0x0C: 1000,
-    0x0D: 10000,
-}
+# readings are published every minute, give up after two missed ones
+STALE_AFTER = timedelta(seconds=125)
+
+# unique id of the rate limit sensor from before multiple config entries
+LEGACY_RATE_LIMIT_ID = "rate-limit-remaining"
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: Callable):
     """Set up the Nature Remo E sensor."""
     _LOGGER.debug("Setting up sensor platform.")
-    devices: NatureUpdateCoordinator = hass.data[DOMAIN]["devices"]
-    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN]["appliances"]
+    devices: NatureUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]["devices"]
+    appliances: AppliancesUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]["appliances"]
 
-    def on_add_device(device):
+    def on_add_device(device: Device):
         device_info = create_device_device_info(device)
-        newest_events = device['newest_events']
+        newest_events = device.newest_events
         if 'te' in newest_events:
             yield RemoSensorValEntity(devices, device, device_info, 'te', SensorDeviceClass.TEMPERATURE, UnitOfTemperature.CELSIUS)
         if 'hu' in newest_events:
@@ -49,31 +46,35 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
         if 'il' in newest_events:
             yield RemoSensorValEntity(devices, device, device_info, 'il', SensorDeviceClass.ILLUMINANCE, LIGHT_LUX)
 
-    def on_add_appliances(appliance):
-        if appliance["type"] != "EL_SMART_METER":
-            return
+    def on_add_appliances(appliance: Appliance):
         device_info = create_appliance_device_info(appliance)
         yield PowerEntity(appliances, appliance, device_info)
-        yield EnergyEntity(appliances, appliance, device_info, 224)
-        yield EnergyEntity(appliances, appliance, device_info, 227)
+        yield EnergyEntity(appliances, appliance, device_info, EPC_NORMAL_CUMULATIVE)
+        yield EnergyEntity(appliances, appliance, device_info, EPC_REVERSE_CUMULATIVE)
 
     check_update(entry, async_add_entities, devices, on_add_device)
-    check_update(entry, async_add_entities, appliances, on_add_appliances)
+    check_update(entry, async_add_entities, appliances, on_add_appliances, ["EL_SMART_METER"])
 
-    async_add_entities([RateLimitEntity(devices.rate_limit)])
+    registry = entity_registry.async_get(hass)
+    unique_id = f"{entry.entry_id}-{LEGACY_RATE_LIMIT_ID}"
+    entity_id = registry.async_get_entity_id("sensor", DOMAIN, LEGACY_RATE_LIMIT_ID)
+    if entity_id is not None and registry.async_get(entity_id).config_entry_id == entry.entry_id:
+        registry.async_update_entity(entity_id, new_unique_id=unique_id)
+    async_add_entities([RateLimitEntity(devices.rate_limit, unique_id, entry.title)])
 
 
 class RateLimitEntity(CoordinatorEntity, SensorEntity):
     _attr_entity_category = EntityCategory.DIAGNOSTIC
     _attr_entity_registry_enabled_default = False
     _attr_icon = "mdi:api"
-    _attr_name = "Nature Remo Rate Limit"
     _attr_state_class = SensorStateClass.MEASUREMENT
-    _attr_unique_id = "rate-limit-remaining"
 
-    def __init__(self, coordinator: DataUpdateCoordinator):
+    def __init__(self, coordinator: DataUpdateCoordinator, unique_id: str, title: str):
         super().__init__(coordinator)
-        self._attr_native_value = self.coordinator.data["remaining"]
+        self._attr_name = f"{title} Rate Limit"
+        self._attr_unique_id = unique_id
+        if self.coordinator.data is not None:
+            self._attr_native_value = self.coordinator.data["remaining"]
 
     def _handle_coordinator_update(self):
         self._attr_native_value = self.coordinator.data["remaining"]
@@ -83,38 +84,42 @@ class RateLimitEntity(CoordinatorEntity, SensorEntity):
 class RemoSensorValEntity(RemoSensorEntity, SensorEntity):
     _attr_state_class = SensorStateClass.MEASUREMENT
 
-    def __init__(self, coordinator: NatureUpdateCoordinator, device: dict, device_info: DeviceInfo, key: str, device_class: SensorDeviceClass, unit_of_measurement: str):
+    def __init__(self, coordinator: NatureUpdateCoordinator, device: Device, device_info: DeviceInfo, key: str, device_class: SensorDeviceClass, unit_of_measurement: str):
         super().__init__(coordinator, device, device_info, key)
         self._attr_device_class = device_class
         self._attr_device_info = device_info
         self._attr_native_unit_of_measurement = unit_of_measurement
 
-    def _on_data_update(self, device: dict):
+    def _on_data_update(self, device: Device):
         super()._on_data_update(device)
-        self._attr_native_value = device["newest_events"][self._key]["val"]
+        self._attr_native_value = device.newest_events[self._key].val
 
 
 class SmartMeterEntity(NatureEntity, SensorEntity):
     coordinator: AppliancesUpdateCoordinator
 
-    def __init__(self, coordinator: AppliancesUpdateCoordinator, appliance: dict, device_info: DeviceInfo, key: int):
+    def __init__(self, coordinator: AppliancesUpdateCoordinator, appliance: Appliance, device_info: DeviceInfo, key: int):
         super().__init__(coordinator,
-                         appliance["id"], f"{appliance['id']}-{key}", device_info)
+                         appliance.id, f"{appliance.id}-{key}", device_info)
         self._key = key
         self._on_data_update(appliance)
 
-    def _on_data_update(self, appliance: dict):
+    def _on_data_update(self, appliance: Appliance):
         super()._on_data_update(appliance)
-        echonetlite_properties = appliance["smart_meter"]["echonetlite_properties"]
-        updated_at = modify_utc_z(
-            next(v for v in echonetlite_properties)["updated_at"])
+        meter = self.coordinator.meters[self._remo_id]
         self._attr_extra_state_attributes = {
-            "updated_at": updated_at,
+            "updated_at": meter.updated_at.isoformat(),
         }
-        updated_at = datetime.fromisoformat(updated_at)
+        self._deadline = meter.updated_at + STALE_AFTER
         if self._attr_available:
-            limit = datetime.now(timezone.utc) - timedelta(seconds=125)
-            self._attr_available = updated_at >= limit
+            self._attr_available = self._deadline > utcnow()
+        self._on_meter_update(meter)
+
+    def _on_deadline(self):
+        self._attr_available = False
+
+    def _on_meter_update(self, meter: SmartMeterSnapshot):
+        pass
 
 
 class PowerEntity(SmartMeterEntity):
@@ -124,16 +129,12 @@ class PowerEntity(SmartMeterEntity):
     _attr_native_unit_of_measurement = UnitOfPower.WATT
     _attr_state_class = SensorStateClass.MEASUREMENT
 
-    def __init__(self, coordinator: AppliancesUpdateCoordinator, appliance: dict, device_info: DeviceInfo):
-        super().__init__(coordinator, appliance, device_info, 231)
-        self._attr_name = f"{appliance['nickname']} instantaneous"
+    def __init__(self, coordinator: AppliancesUpdateCoordinator, appliance: Appliance, device_info: DeviceInfo):
+        super().__init__(coordinator, appliance, device_info, EPC_INSTANTANEOUS_POWER)
+        self._attr_name = f"{appliance.nickname} instantaneous"
 
-    def _on_data_update(self, appliance: dict):
-        super()._on_data_update(appliance)
-        echonetlite_properties = appliance["smart_meter"]["echonetlite_properties"]
-        self._attr_native_value = next(
-            value["val"] for value in echonetlite_properties if value["epc"] == 231
-        )
+    def _on_meter_update(self, meter: SmartMeterSnapshot):
+        self._attr_native_value = meter.instantaneous_power
 
 
 class EnergyEntity(SmartMeterEntity):
@@ -146,25 +147,10 @@ class EnergyEntity(SmartMeterEntity):
     # https://github.com/home-assistant/core/commit/1aaf78ef9944ded259298afbdbedcc07c90b80b0
     # also _attr_[native]_unit_of_measurement
 
-    def __init__(self, coordinator: AppliancesUpdateCoordinator, appliance: dict, device_info: DeviceInfo, key: int):
+    def __init__(self, coordinator: AppliancesUpdateCoordinator, appliance: Appliance, device_info: DeviceInfo, key: int):
         super().__init__(coordinator, appliance, device_info, key)
-        echonetlite_properties = appliance["smart_meter"]["echonetlite_properties"]
-        name = next(
-            value["name"] for value in echonetlite_properties if value["epc"] == key
-        ).split("_")[0]
-        self._attr_name = f"{appliance['nickname']} {name} cumulative"
+        name = coordinator.meters[self._remo_id].names[key].split("_")[0]
+        self._attr_name = f"{appliance.nickname} {name} cumulative"
 
-    def _on_data_update(self, appliance: dict):
-        super()._on_data_update(appliance)
-        echonetlite_properties = appliance["smart_meter"]["echonetlite_properties"]
-        cumulative_electric_energy = int(next(
-            value["val"] for value in echonetlite_properties if value["epc"] == self._key
-        ))
-        coefficient = int(next(
-            value["val"] for value in echonetlite_properties if value["epc"] == 211
-        ))
-        cumulative_electric_energy_unit = int(next(
-            value["val"] for value in echonetlite_properties if value["epc"] == 225
-        ))
-        self._attr_native_value = cumulative_electric_energy * \
-            coefficient * _ENERGY_UNITS[cumulative_electric_energy_unit]
+    def _on_meter_update(self, meter: SmartMeterSnapshot):
+        self._attr_native_value = meter.cumulative_energy(self._key)
@@ -0,0 +1,55 @@
+"""Persisted snapshots of the last good API payloads."""
+from datetime import timedelta
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util.dt import parse_datetime, utcnow
+
+STORAGE_KEY = "nature_remo.{}.snapshot"
+STORAGE_VERSION = 1
+
+# Snapshots older than this are not used to create entities at startup.
+MAX_AGE = timedelta(days=7)
+
+SAVE_DELAY = 30
+
+
+class _VersionedStore(Store):
+    async def _async_migrate_func(self, old_major_version, old_minor_version, old_data):
+        # A snapshot is only a cache, drop it instead of migrating.
+        return {}
+
+
+class SnapshotStore:
+    """Keep the last good response body of each coordinator on disk.
+
+    Setup creates entities from fresh-enough snapshots right away and
+    refreshes in the background, instead of waiting for the cloud.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store = _VersionedStore(
+            hass, STORAGE_VERSION, STORAGE_KEY.format(entry_id))
+        self._data: dict[str, dict] = {}
+
+    async def async_load(self) -> dict[str, str]:
+        """Return the bodies by path that are not older than MAX_AGE."""
+        self._data = await self._store.async_load() or {}
+        limit = utcnow() - MAX_AGE
+        result = {}
+        for path, snapshot in self._data.items():
+            saved_at = parse_datetime(snapshot["saved_at"])
+            if saved_at is not None and saved_at >= limit:
+                result[path] = snapshot["body"]
+        return result
+
+    @callback
+    def async_save(self, path: str, body: bytes):
+        self._data[path] = {
+            "saved_at": utcnow().isoformat(),
+            "body": body.decode(),
+        }
+        self._store.async_delay_save(lambda: self._data, SAVE_DELAY)
+
+    async def async_remove(self):
+        await self._store.async_remove()
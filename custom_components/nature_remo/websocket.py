@@ -0,0 +1,35 @@
+"""Websocket commands of the Nature Remo integration."""
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv, entity_registry
+
+from .common import async_get_catalog
+
+DATA_WEBSOCKET = "nature_remo_websocket"
+
+
+@callback
+def async_setup_websocket(hass: HomeAssistant):
+    """Register the commands once per process."""
+    if hass.data.get(DATA_WEBSOCKET):
+        return
+    hass.data[DATA_WEBSOCKET] = True
+    websocket_api.async_register_command(hass, websocket_commands)
+
+
+@websocket_api.websocket_command({
+    vol.Required("type"): "nature_remo/commands",
+    vol.Required("entity_id"): cv.entity_id,
+})
+@callback
+def websocket_commands(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict):
+    """Return the signals and buttons that a remote can send."""
+    entry = entity_registry.async_get(hass).async_get(msg["entity_id"])
+    catalog = async_get_catalog(hass, entry) if entry is not None else None
+    if catalog is None:
+        connection.send_error(
+            msg["id"], websocket_api.const.ERR_NOT_FOUND, "No Nature Remo appliance")
+        return
+    connection.send_result(msg["id"], catalog.as_dict())
@@ -0,0 +1,24 @@
+"""Helpers for the Nature Remo tests."""
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_ACCESS_TOKEN
+from homeassistant.core import HomeAssistant
+
+from custom_components.nature_remo.common import DOMAIN
+
+
+def create_entry(**kwargs) -> ConfigEntry:
+    return ConfigEntry(**{
+        "version": 2,
+        "domain": DOMAIN,
+        "title": "Home",
+        "data": {CONF_ACCESS_TOKEN: "token"},
+        "source": "user",
+        **kwargs,
+    })
+
+
+async def async_add_entry(hass: HomeAssistant, **kwargs) -> ConfigEntry:
+    entry = create_entry(**kwargs)
+    await hass.config_entries.async_add(entry)
+    await hass.async_block_till_done()
+    return entry
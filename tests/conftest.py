@@ -0,0 +1,71 @@
+"""Fixtures for the Nature Remo tests."""
+import socket
+
+import pytest
+
+from homeassistant import auth, bootstrap, loader
+from homeassistant.config_entries import ConfigEntries
+from homeassistant.core import HomeAssistant
+from homeassistant.setup import async_setup_component
+
+from custom_components.nature_remo import api
+
+from fake_api import FakeNatureApi
+from payloads import Payloads
+
+
+def create_hass(config_dir: str) -> HomeAssistant:
+    # the config dir became a constructor argument in 2023.9
+    try:
+        hass = HomeAssistant(config_dir)
+    except TypeError:
+        hass = HomeAssistant()
+        hass.config.config_dir = config_dir
+    hass.config.set_time_zone("UTC")
+    return hass
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+async def hass(tmp_path):
+    hass = create_hass(str(tmp_path))
+    yield hass
+    await hass.async_stop(force=True)
+
+
+@pytest.fixture
+async def core(hass):
+    """A started core with registries, auth and http, like bench.make_hass."""
+    hass.config.skip_pip = True
+    hass.data[loader.DATA_CUSTOM_COMPONENTS] = None
+    await bootstrap.load_registries(hass)
+    hass.auth = await auth.auth_manager_from_config(hass, [], [])
+    hass.config_entries = ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    await async_setup_component(
+        hass, "http", {"http": {"server_host": ["127.0.0.1"], "server_port": _free_port()}})
+    # no mDNS on the test host
+    hass.config.components.add("zeroconf")
+    await hass.async_start()
+    return hass
+
+
+@pytest.fixture
+def payloads():
+    return Payloads(1, 5, 2)
+
+
+@pytest.fixture
+async def cloud(payloads, monkeypatch):
+    """The fake cloud API, serving payloads."""
+    server = FakeNatureApi(payloads)
+    await server.start()
+    monkeypatch.setattr(api, "RESOURCE", server.url)
+    yield server
+    await server.stop()
+
@@ -0,0 +1,67 @@
+"""Tests of the opt-in signal buttons."""
+from homeassistant.helpers import device_registry, entity_registry
+
+from custom_components.nature_remo.common import CONF_SIGNAL_BUTTONS, DOMAIN
+
+from .common import async_add_entry, create_entry
+
+
+def _buttons(hass, entry):
+    registry = entity_registry.async_get(hass)
+    return sorted(
+        x.unique_id for x in entity_registry.async_entries_for_config_entry(registry, entry.entry_id)
+        if x.domain == "button"
+    )
+
+
+async def _configure(hass, entry, selected):
+    flow = await hass.config_entries.options.async_init(entry.entry_id)
+    await hass.config_entries.options.async_configure(
+        flow["flow_id"], {CONF_SIGNAL_BUTTONS: selected})
+    await hass.async_block_till_done()
+
+
+async def test_no_buttons_by_default(core, cloud):
+    entry = await async_add_entry(core)
+    assert _buttons(core, entry) == []
+    assert core.states.async_all("button") == []
+
+
+async def test_select_and_deselect(core, cloud, payloads):
+    entry = await async_add_entry(core)
+    await _configure(core, entry, ["appliance-0001", "appliance-0003"])
+    signals = {
+        x["id"]: [s["id"] for s in x["signals"]] for x in payloads.appliances
+    }
+    assert _buttons(core, entry) == sorted(signals["appliance-0001"] + signals["appliance-0003"])
+    assert len(core.states.async_all("button")) == 4
+    await _configure(core, entry, ["appliance-0003"])
+    # the buttons of the deselected appliance are gone from the registry
+    assert _buttons(core, entry) == sorted(signals["appliance-0003"])
+    assert len(core.states.async_all("button")) == 2
+
+
+async def test_unloaded_keeps_selection(core, cloud):
+    entry = await async_add_entry(core)
+    await _configure(core, entry, ["appliance-0001"])
+    await core.config_entries.async_unload(entry.entry_id)
+    flow = await core.config_entries.options.async_init(entry.entry_id)
+    await core.config_entries.options.async_configure(flow["flow_id"], {})
+    assert entry.options[CONF_SIGNAL_BUTTONS] == ["appliance-0001"]
+
+
+async def test_migration_keeps_existing_buttons(core, cloud, payloads):
+    entry = create_entry(version=1)
+    devices = device_registry.async_get(core)
+    entities = entity_registry.async_get(core)
+    appliance = payloads.appliances[1]
+    device = devices.async_get_or_create(
+        config_entry_id=entry.entry_id, identifiers={(DOMAIN, appliance["id"])})
+    entities.async_get_or_create(
+        "button", DOMAIN, appliance["signals"][0]["id"],
+        config_entry=entry, device_id=device.id)
+    await core.config_entries.async_add(entry)
+    await core.async_block_till_done()
+    assert entry.version == 2
+    assert entry.options[CONF_SIGNAL_BUTTONS] == [appliance["id"]]
+    assert _buttons(core, entry) == sorted(x["id"] for x in appliance["signals"])
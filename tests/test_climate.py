@@ -0,0 +1,69 @@
+"""Tests of the latest-wins aircon settings pipeline."""
+import asyncio
+
+import pytest
+
+from homeassistant.exceptions import HomeAssistantError
+
+from custom_components.nature_remo.common import CONF_SETTINGS_WINDOW
+
+from .common import async_add_entry
+
+
+class Posts(list):
+    fail = False
+
+
+@pytest.fixture
+def posts(cloud):
+    """Record aircon posts, answered after a delay and failing on demand."""
+    posts = Posts()
+    respond = cloud._respond
+
+    async def delayed(method, path, data):
+        if method != "POST":
+            return await respond(method, path, data)
+        posts.append(data)
+        await asyncio.sleep(0.1)
+        if posts.fail:
+            return 400, {"code": 400001, "message": "bad request"}, {}
+        return await respond(method, path, data)
+
+    cloud._respond = delayed
+    return posts
+
+
+async def _climate(hass):
+    entry = await async_add_entry(hass, options={CONF_SETTINGS_WINDOW: 50})
+    return entry, hass.states.async_all("climate")[0].entity_id
+
+
+async def _call(hass, service, entity_id, **data):
+    await hass.services.async_call("climate", service, {"entity_id": entity_id, **data}, blocking=True)
+
+
+async def test_changes_are_merged(core, posts):
+    _, entity_id = await _climate(core)
+    await asyncio.gather(
+        _call(core, "set_temperature", entity_id, temperature=21),
+        _call(core, "set_temperature", entity_id, temperature=23),
+        _call(core, "set_fan_mode", entity_id, fan_mode="2"),
+    )
+    assert posts == [{"temperature": "23", "air_volume": "2"}]
+    state = core.states.get(entity_id)
+    assert state.attributes["temperature"] == 23
+    assert state.attributes["fan_mode"] == "2"
+
+
+async def test_failure_rolls_back(core, posts):
+    _, entity_id = await _climate(core)
+    before = core.states.get(entity_id)
+    assert before.state != "heat"
+    posts.fail = True
+    task = core.async_create_task(_call(core, "set_hvac_mode", entity_id, hvac_mode="heat"))
+    await asyncio.sleep(0.08)
+    # shown right away while the request is in flight
+    assert core.states.get(entity_id).state == "heat"
+    with pytest.raises(HomeAssistantError):
+        await task
+    assert core.states.get(entity_id).state == before.state
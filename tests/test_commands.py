@@ -0,0 +1,225 @@
+"""Tests of the command queue."""
+import asyncio
+
+import pytest
+
+from custom_components.nature_remo.commands import (
+    PIPELINE_DEPTH,
+    PRIORITY_BACKGROUND,
+    CommandQueue,
+    CommandSequence,
+)
+
+
+class Cloud:
+    """Answer posts once released, recording the order they were sent in."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self.sent: list[tuple[str, dict]] = []
+        self.pending: dict[str, asyncio.Future] = {}
+
+    async def execute(self, path, data):
+        self.sent.append((path, data))
+        future = self.pending[path] = self.hass.loop.create_future()
+        return await future
+
+    def answer(self, path, result=None):
+        self.pending.pop(path).set_result(result or path)
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_same_key_in_order(hass):
+    cloud = Cloud(hass)
+    queue = CommandQueue(hass, cloud.execute)
+    first = hass.async_create_task(queue.async_post("a", key="remo"))
+    second = hass.async_create_task(queue.async_post("b", key="remo"))
+    await _settle()
+    assert [x[0] for x in cloud.sent] == ["a"]
+    cloud.answer("a")
+    await _settle()
+    assert [x[0] for x in cloud.sent] == ["a", "b"]
+    cloud.answer("b")
+    assert await first == "a"
+    assert await second == "b"
+
+
+async def test_keys_in_parallel_up_to_limit(hass):
+    cloud = Cloud(hass)
+    queue = CommandQueue(hass, cloud.execute, max_concurrent=2)
+    tasks = [hass.async_create_task(queue.async_post(x)) for x in "abc"]
+    await _settle()
+    assert [x[0] for x in cloud.sent] == ["a", "b"]
+    cloud.answer("a")
+    await _settle()
+    assert [x[0] for x in cloud.sent] == ["a", "b", "c"]
+    cloud.answer("b")
+    cloud.answer("c")
+    assert await asyncio.gather(*tasks) == ["a", "b", "c"]
+
+
+async def test_user_commands_before_background(hass):
+    cloud = Cloud(hass)
+    queue = CommandQueue(hass, cloud.execute, max_concurrent=1)
+    busy = hass.async_create_task(queue.async_post("busy"))
+    await _settle()
+    background = hass.async_create_task(queue.async_post("background", priority=PRIORITY_BACKGROUND))
+    await _settle()
+    user = hass.async_create_task(queue.async_post("user"))
+    await _settle()
+    cloud.answer("busy")
+    await _settle()
+    assert [x[0] for x in cloud.sent] == ["busy", "user"]
+    cloud.answer("user")
+    await _settle()
+    cloud.answer("background")
+    await asyncio.gather(busy, background, user)
+    assert [x[0] for x in cloud.sent] == ["busy", "user", "background"]
+
+
+async def test_coalesce_moves_to_tail(hass):
+    cloud = Cloud(hass)
+    queue = CommandQueue(hass, cloud.execute)
+    busy = hass.async_create_task(queue.async_post("busy", key="tv"))
+    await _settle()
+    first = hass.async_create_task(queue.async_post("play", key="tv", coalesce="playback"))
+    other = hass.async_create_task(queue.async_post("input", key="tv"))
+    second = hass.async_create_task(queue.async_post("pause", key="tv", coalesce="playback"))
+    await _settle()
+    for path in ("busy", "input", "pause"):
+        cloud.answer(path)
+        await _settle()
+    assert [x[0] for x in cloud.sent] == ["busy", "input", "pause"]
+    # both callers get the result of the request that was sent
+    assert await first == "pause"
+    assert await second == "pause"
+    await asyncio.gather(busy, other)
+
+
+async def test_coalesce_raises_waiting_priority(hass):
+    cloud = Cloud(hass)
+    queue = CommandQueue(hass, cloud.execute, max_concurrent=1)
+    busy = hass.async_create_task(queue.async_post("busy"))
+    await _settle()
+    tasks = [
+        hass.async_create_task(queue.async_post("other", priority=PRIORITY_BACKGROUND)),
+        hass.async_create_task(queue.async_post("low", key="tv", coalesce="input", priority=PRIORITY_BACKGROUND)),
+    ]
+    await _settle()
+    tasks.append(hass.async_create_task(queue.async_post("high", key="tv", coalesce="input")))
+    await _settle()
+    for path in ("busy", "high", "other"):
+        cloud.answer(path)
+        await _settle()
+    assert [x[0] for x in cloud.sent] == ["busy", "high", "other"]
+    assert await asyncio.gather(busy, *tasks) == ["busy", "other", "high", "high"]
+
+
+async def test_error_reaches_caller(hass):
+    async def execute(path, data):
+        raise ValueError(path)
+
+    queue = CommandQueue(hass, execute)
+    with pytest.raises(ValueError):
+        await queue.async_post("a")
+    # the lane keeps working after a failure
+    with pytest.raises(ValueError):
+        await queue.async_post("a")
+
+
+async def test_pipelined_in_order(hass):
+    cloud = Cloud(hass)
+    queue = CommandQueue(hass, cloud.execute, max_concurrent=4)
+    paths = [f"signals/{n}/send" for n in range(5)]
+    tasks = [hass.async_create_task(queue.async_post(x, key="remo", pipeline=True)) for x in paths]
+    await _settle()
+    # the next one goes out before the previous response is back
+    assert [x[0] for x in cloud.sent] == paths[:PIPELINE_DEPTH]
+    # a later response frees the pipeline but keeps the dispatch order
+    cloud.answer(paths[1])
+    await _settle()
+    assert [x[0] for x in cloud.sent] == paths[:PIPELINE_DEPTH + 1]
+    for path in paths:
+        if path in cloud.pending:
+            cloud.answer(path)
+        await _settle()
+    assert await asyncio.gather(*tasks) == paths
+    assert [x[0] for x in cloud.sent] == paths
+
+
+async def test_not_pipelined_waits(hass):
+    cloud = Cloud(hass)
+    queue = CommandQueue(hass, cloud.execute, max_concurrent=4)
+    first = hass.async_create_task(queue.async_post("a", key="remo", pipeline=True))
+    second = hass.async_create_task(queue.async_post("b", key="remo"))
+    third = hass.async_create_task(queue.async_post("c", key="remo", pipeline=True))
+    await _settle()
+    assert [x[0] for x in cloud.sent] == ["a"]
+    cloud.answer("a")
+    await _settle()
+    assert [x[0] for x in cloud.sent] == ["a", "b"]
+    cloud.answer("b")
+    await _settle()
+    cloud.answer("c")
+    assert await asyncio.gather(first, second, third) == ["a", "b", "c"]
+
+
+async def test_sequence_runs_rounds(hass):
+    cloud = Cloud(hass)
+    queue = CommandQueue(hass, cloud.execute)
+    progress = []
+
+    def step(path):
+        return lambda: queue.async_post(path, key="remo", pipeline=True)
+
+    sequence = CommandSequence(
+        hass, [[step("a"), step("b")], [step("c")]], 0, lambda: progress.append(sequence.sent))
+    task = hass.async_create_task(sequence.async_run())
+    while not task.done():
+        await _settle()
+        for path in list(cloud.pending):
+            cloud.answer(path)
+    await task
+    assert [x[0] for x in cloud.sent] == ["a", "b", "c"]
+    assert sequence.sent == sequence.total == 3
+    assert progress == [1, 2, 3]
+
+
+async def test_sequence_stops_at_error(hass):
+    sent = []
+
+    async def ok():
+        sent.append("ok")
+
+    async def fail():
+        raise ValueError("fail")
+
+    sequence = CommandSequence(hass, [[ok, fail], [ok, ok]], 0, depth=1)
+    with pytest.raises(ValueError):
+        await sequence.async_run()
+    assert sent == ["ok"]
+    assert sequence.sent == 1
+
+
+async def test_sequence_cancel(hass):
+    cloud = Cloud(hass)
+    queue = CommandQueue(hass, cloud.execute)
+
+    def step(path):
+        return lambda: queue.async_post(path, key="remo", pipeline=True)
+
+    sequence = CommandSequence(hass, [[step("a"), step("b"), step("c")]], 0)
+    task = hass.async_create_task(sequence.async_run())
+    await _settle()
+    assert [x[0] for x in cloud.sent] == ["a", "b"]
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await _settle()
+    # the third command never went out
+    assert [x[0] for x in cloud.sent] == ["a", "b"]
+    assert sequence.sent == 0
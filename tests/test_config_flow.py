@@ -0,0 +1,63 @@
+"""Tests of account handling: unique ids, reauth and duplicates."""
+import asyncio
+
+from homeassistant.config_entries import SOURCE_REAUTH, SOURCE_USER
+from homeassistant.const import CONF_ACCESS_TOKEN
+
+from custom_components.nature_remo.common import DOMAIN
+
+from .common import async_add_entry
+
+# the account of the fake cloud's users/me
+ACCOUNT = "user"
+
+
+async def _wait_for(condition, timeout: float = 5):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition() and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+async def test_legacy_unique_id_is_migrated(core, cloud):
+    entry = await async_add_entry(core, unique_id=DOMAIN)
+    assert await _wait_for(lambda: entry.unique_id == ACCOUNT)
+
+
+async def test_migration_keeps_duplicate_legacy(core, cloud):
+    await async_add_entry(core, unique_id=ACCOUNT)
+    legacy = await async_add_entry(core, unique_id=DOMAIN, title="Legacy")
+    assert await _wait_for(lambda: cloud.counts["GET", "users/me"] > 0)
+    await core.async_block_till_done()
+    assert legacy.unique_id == DOMAIN
+
+
+async def test_user_flow_rejects_configured_account(core, cloud):
+    await async_add_entry(core, unique_id=ACCOUNT)
+    result = await core.config_entries.flow.async_init(DOMAIN, context={"source": SOURCE_USER})
+    result = await core.config_entries.flow.async_configure(
+        result["flow_id"], {CONF_ACCESS_TOKEN: "another token"})
+    assert result["type"] == "abort"
+    assert result["reason"] == "already_configured"
+
+
+async def _reauth(hass, entry, token):
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": SOURCE_REAUTH, "entry_id": entry.entry_id}, data=entry.data)
+    return await hass.config_entries.flow.async_configure(
+        result["flow_id"], {CONF_ACCESS_TOKEN: token})
+
+
+async def test_reauth_with_other_account_is_rejected(core, cloud):
+    entry = await async_add_entry(core, unique_id="another account")
+    result = await _reauth(core, entry, "new token")
+    assert result["reason"] == "wrong_account"
+    assert entry.data[CONF_ACCESS_TOKEN] == "token"
+
+
+async def test_reauth_same_account(core, cloud):
+    entry = await async_add_entry(core, unique_id=ACCOUNT)
+    result = await _reauth(core, entry, "new token")
+    assert result["reason"] == "reauth_successful"
+    assert entry.data[CONF_ACCESS_TOKEN] == "new token"
@@ -0,0 +1,62 @@
+"""Tests of the hourly energy statistics."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from custom_components.nature_remo import energy
+
+START = datetime(2026, 1, 1, 9, 20, tzinfo=timezone.utc)
+
+
+def _register(rows: list, last=None) -> energy._Register:
+    register = energy._Register(None, "nature_remo:x_consumed")
+    register._loaded = True
+    register._last = last
+    register._async_import = rows.extend
+    return register
+
+
+def _hours(rows: list) -> list:
+    return [(x["start"].hour, pytest.approx(x["state"]), pytest.approx(x["sum"])) for x in rows]
+
+
+async def test_boundaries_interpolated():
+    rows = []
+    register = _register(rows)
+    await register.async_add(START, 100.0, 1000.0)
+    await register.async_add(START + timedelta(minutes=30), 101.0, 1000.0)
+    assert rows == []
+    # a gap of three hours is backfilled from the next reading
+    await register.async_add(datetime(2026, 1, 1, 13, tzinfo=timezone.utc), 998.0, 1000.0)
+    assert _hours(rows) == [
+        (9, 101 + 897 * 10 / 190, 1 + 897 * 10 / 190),
+        (10, 101 + 897 * 70 / 190, 1 + 897 * 70 / 190),
+        (11, 101 + 897 * 130 / 190, 1 + 897 * 130 / 190),
+        (12, 998.0, 898.0),
+    ]
+
+
+async def test_rollover_and_restart():
+    rows = []
+    register = _register(rows)
+    await register.async_add(datetime(2026, 1, 1, 12, tzinfo=timezone.utc), 990.0, 1000.0)
+    await register.async_add(datetime(2026, 1, 1, 13, tzinfo=timezone.utc), 998.0, 1000.0)
+    await register.async_add(datetime(2026, 1, 1, 14, tzinfo=timezone.utc), 5.0, 1000.0)
+    assert _hours(rows) == [(12, 998.0, 8.0), (13, 5.0, 15.0)]
+
+    # a restart continues from the last imported boundary
+    rows.clear()
+    register = _register(rows, register._last)
+    await register.async_add(datetime(2026, 1, 1, 17, tzinfo=timezone.utc), 35.0, 1000.0)
+    assert _hours(rows) == [(14, 15.0, 25.0), (15, 25.0, 35.0), (16, 35.0, 45.0)]
+
+
+async def test_backwards_without_rollover_starts_over():
+    rows = []
+    register = _register(rows)
+    await register.async_add(datetime(2026, 1, 1, 12, tzinfo=timezone.utc), 50.0, None)
+    await register.async_add(datetime(2026, 1, 1, 13, tzinfo=timezone.utc), 60.0, None)
+    # a replaced meter reads lower, the sum keeps going from there
+    await register.async_add(datetime(2026, 1, 1, 13, 30, tzinfo=timezone.utc), 2.0, None)
+    await register.async_add(datetime(2026, 1, 1, 14, 30, tzinfo=timezone.utc), 6.0, None)
+    assert _hours(rows) == [(12, 60.0, 10.0), (13, 4.0, 12.0)]
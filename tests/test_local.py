@@ -0,0 +1,112 @@
+"""Tests of the local transport against a stand-in for the Remo's /messages."""
+import logging
+import os
+
+from aiohttp import ClientSession, web
+import pytest
+
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+
+from custom_components.nature_remo import local
+from custom_components.nature_remo.local import LocalTransport, async_remove_signals, parse_hosts
+from custom_components.nature_remo.models import Appliance, Device
+
+_LOGGER = logging.getLogger(__name__)
+
+MESSAGE = {"format": "us", "freq": 38, "data": [100, 200, 100]}
+
+
+class Remo:
+    """The /messages endpoint of a Remo on the LAN."""
+
+    def __init__(self):
+        self.message = {"format": "us", "freq": 38, "data": [1]}
+        self.received: list[tuple[dict, str]] = []
+        self.status = 200
+        self.gets = 0
+        self.host: str = None
+        self._runner: web.AppRunner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/messages", self._get)
+        app.router.add_post("/messages", self._post)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.host = f"127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _get(self, request: web.Request):
+        self.gets += 1
+        # the remote is pressed while the capture polls
+        if self.gets == 3:
+            self.message = MESSAGE
+        return web.json_response(self.message, status=self.status)
+
+    async def _post(self, request: web.Request):
+        self.received.append((await request.json(), request.headers.get("X-Requested-With")))
+        return web.json_response({}, status=self.status)
+
+
+@pytest.fixture
+async def remo():
+    remo = Remo()
+    await remo.start()
+    yield remo
+    await remo.stop()
+
+
+@pytest.fixture
+async def transport(hass, remo, monkeypatch):
+    monkeypatch.setattr(local, "CAPTURE_INTERVAL", 0.01)
+    devices = DataUpdateCoordinator(hass, _LOGGER, name="devices")
+    devices.data = {"remo": Device({
+        "id": "remo", "name": "Living", "mac_address": "aa:bb:cc:dd:ee:ff", "firmware_version": "1"})}
+    appliances = DataUpdateCoordinator(hass, _LOGGER, name="appliances")
+    appliances.data = {"tv": Appliance({
+        "id": "tv", "type": "IR", "nickname": "TV", "device": {"id": "remo"}, "signals": []})}
+    async with ClientSession() as session:
+        transport = LocalTransport(
+            hass, session, "entry", devices, appliances, parse_hosts(f"Living={remo.host}"))
+        await transport.async_load()
+        yield transport
+
+
+async def test_send_captured(transport, remo):
+    await transport.async_capture("tv", ["power"], 5)
+    assert transport.has("power")
+    assert await transport.async_send("tv", "power")
+    assert remo.received == [(MESSAGE, "local")]
+
+
+async def test_send_falls_back(transport, remo):
+    # nothing captured
+    assert not await transport.async_send("tv", "power")
+    await transport.async_capture("tv", ["power"], 5)
+    # unknown appliance, so no host
+    assert not await transport.async_send("aircon", "power")
+    remo.status = 500
+    assert not await transport.async_send("tv", "power")
+    await remo.stop()
+    assert not await transport.async_send("tv", "power")
+
+
+async def test_capture_timeout(transport, remo):
+    remo.gets = -100
+    with pytest.raises(HomeAssistantError, match="no IR signal"):
+        await transport.async_capture("tv", ["power"], 0.1)
+    assert not transport.has("power")
+
+
+async def test_remove_signals(hass, transport):
+    await transport.async_capture("tv", ["power"], 5)
+    await transport._store.async_save(transport._data_to_save())
+    path = transport._store.path
+    assert os.path.exists(path)
+    await async_remove_signals(hass, "entry")
+    assert not os.path.exists(path)
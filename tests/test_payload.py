@@ -0,0 +1,56 @@
+"""Tests of list body decoding and diffing."""
+import json
+
+from custom_components.nature_remo.models import Signal
+from custom_components.nature_remo.payload import digest_of, normalize
+
+BODY = [
+    {"id": "a", "type": "IR", "name": "A"},
+    {"id": "b", "type": "TV", "name": "B"},
+]
+
+
+def _normalize(items, previous=None):
+    body = json.dumps(items).encode()
+    previous = previous or normalize(b"[]", digest_of(b"[]"), {}, Signal, {})
+    return normalize(body, digest_of(body), previous.fingerprints, Signal, previous.data)
+
+
+def test_first_body():
+    payload = _normalize(BODY)
+    assert payload.data == {"a": Signal(BODY[0]), "b": Signal(BODY[1])}
+    assert payload.added == payload.changed == {"a", "b"}
+    assert payload.removed == set()
+    assert payload.types == {"IR": {"a"}, "TV": {"b"}}
+    assert payload.type_of == {"a": "IR", "b": "TV"}
+    assert payload.invalid == {}
+
+
+def test_unchanged_keeps_models():
+    first = _normalize(BODY)
+    second = _normalize(BODY, first)
+    assert second.changed == second.added == second.removed == set()
+    assert second.data["a"] is first.data["a"]
+
+
+def test_changed_added_removed():
+    first = _normalize(BODY)
+    second = _normalize([{**BODY[0], "name": "New"}, {"id": "c", "name": "C"}], first)
+    assert second.data["a"].name == "New"
+    assert second.added == {"c"}
+    assert second.removed == {"b"}
+    # removed objects count as changed so their entities update
+    assert second.changed == {"a", "b", "c"}
+    assert second.types == {"IR": {"a"}, None: {"c"}}
+
+
+def test_invalid_keeps_last_model():
+    first = _normalize(BODY)
+    second = _normalize([{"id": "a", "type": "IR"}, {"id": "c"}, {"name": "no id"}, 1], first)
+    # a keeps its last good model, c never parsed and is left out
+    assert second.data == {"a": first.data["a"]}
+    assert second.fingerprints["a"] == first.fingerprints["a"]
+    assert "a" not in second.changed
+    assert set(second.invalid) == {"a", "c", "None"}
+    assert second.invalid["None"] == "no id"
+    assert "KeyError" in second.invalid["c"]
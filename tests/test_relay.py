@@ -0,0 +1,107 @@
+"""Tests of serving polls to other instances."""
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from custom_components.nature_remo.api import NatureApiClient, NatureAuthError
+from custom_components.nature_remo.common import DOMAIN
+from custom_components.nature_remo.relay import URL
+
+from .common import async_add_entry
+
+
+async def _token(hass, group: str = "system-admin") -> str:
+    user = await hass.auth.async_create_user(group, group_ids=[group])
+    refresh_token = await hass.auth.async_create_refresh_token(
+        user, client_name=group, token_type="long_lived_access_token",
+        access_token_expiration=timedelta(days=1))
+    return hass.auth.async_create_access_token(refresh_token)
+
+
+def _client(hass, token: str, path: str) -> NatureApiClient:
+    return NatureApiClient(
+        async_get_clientsession(hass), token,
+        resource=f"http://127.0.0.1:{hass.http.server_port}{URL}{path}")
+
+
+@pytest.fixture
+async def entry(core, cloud):
+    return await async_add_entry(core, unique_id="user")
+
+
+async def _accounts(hass, token: str):
+    async with async_get_clientsession(hass).get(
+        f"http://127.0.0.1:{hass.http.server_port}{URL}",
+        headers={"Authorization": f"Bearer {token}"},
+    ) as response:
+        if response.status != 200:
+            return response.status, None
+        return response.status, await response.json()
+
+
+async def test_accounts_for_admins_only(core, entry):
+    assert await _accounts(core, await _token(core)) == (200, [{"id": "user", "nickname": "Home"}])
+    status, _ = await _accounts(core, await _token(core, "system-users"))
+    assert status == 401
+    with pytest.raises(NatureAuthError):
+        await _client(core, await _token(core, "system-users"), "/user").async_get("devices")
+
+
+async def test_legacy_entry_not_relayed(core, cloud):
+    # the migration fails without users/me, the entry keeps the domain
+    respond = cloud._respond
+
+    async def no_user(method, path, data):
+        if path == "users/me":
+            return 503, {"code": 503}, {}
+        return await respond(method, path, data)
+
+    cloud._respond = no_user
+    await async_add_entry(core, unique_id=DOMAIN)
+    assert await _accounts(core, await _token(core)) == (200, [])
+
+
+async def test_etag_and_long_poll(core, entry, payloads):
+    client = _client(core, await _token(core), "/user")
+    response = await client.async_get("devices")
+    etag = response.headers["ETag"]
+    assert response.json()[0]["id"] == payloads.devices[0]["id"]
+    # unchanged: held for the wait, then 304
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    response = await client.async_get("devices", etag=etag, hold=0.5)
+    assert response.status == 304
+    assert loop.time() - start >= 0.5
+
+    async def change():
+        await asyncio.sleep(0.2)
+        payloads.devices[0]["newest_events"]["te"]["val"] = 30.5
+        await core.data[DOMAIN][entry.entry_id]["devices"].async_refresh()
+
+    # a new poll wakes the held request
+    task = core.async_create_task(change())
+    start = loop.time()
+    response = await client.async_get("devices", etag=etag, hold=10)
+    await task
+    assert response.status == 200
+    assert response.headers["ETag"] != etag
+    assert loop.time() - start < 5
+    assert response.json()[0]["newest_events"]["te"]["val"] == 30.5
+
+
+async def test_signal_posts_keyed_by_appliance(core, entry, payloads, cloud):
+    source = core.data[DOMAIN][entry.entry_id]["relay"]
+    signal = payloads.appliances[3]["signals"][1]["id"]
+    assert source.key_of(f"signals/{signal}/send") == payloads.appliances[3]["id"]
+    assert source.key_of("appliances/appliance-0001/tv") == "appliance-0001"
+    assert source.key_of("signals/unknown/send") == "unknown"
+    # a signal learned later is found after the next poll
+    payloads.appliances[2]["signals"].append({"id": "learned", "name": "New", "image": "ico_io"})
+    await core.data[DOMAIN][entry.entry_id]["appliances"].async_refresh()
+    assert source.key_of("signals/learned/send") == payloads.appliances[2]["id"]
+
+    await _client(core, await _token(core), "/user").async_post(f"signals/{signal}/send")
+    assert cloud.counts["POST", f"signals/{signal}/send"] == 1
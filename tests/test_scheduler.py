@@ -0,0 +1,99 @@
+"""Tests of the rate limit driven scheduler."""
+from datetime import timedelta
+import logging
+
+import pytest
+
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util.dt import utc_from_timestamp, utcnow
+
+from custom_components.nature_remo.scheduler import (
+    DEFAULT_INTERVAL,
+    MIN_INTERVAL,
+    POST_RESERVE,
+    STAGGER_STEP,
+    PollStagger,
+    RateLimitScheduler,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def scheduler(hass):
+    return RateLimitScheduler(DataUpdateCoordinator(hass, _LOGGER, name="rate limit"))
+
+
+def _headers(remaining: int, reset_in: float):
+    return {
+        "x-rate-limit-limit": "30",
+        "x-rate-limit-remaining": str(remaining),
+        "x-rate-limit-reset": str(int(utcnow().timestamp() + reset_in)),
+    }
+
+
+async def test_update_records_headers(scheduler):
+    headers = _headers(12, 100)
+    scheduler.update(headers)
+    assert scheduler.rate_limit.data == {
+        "remaining": 12,
+        "reset": utc_from_timestamp(int(headers["x-rate-limit-reset"])),
+    }
+    # responses without the headers, like relay 304s, keep the last values
+    scheduler.update({})
+    assert scheduler.rate_limit.data["remaining"] == 12
+
+
+async def test_update_notifies_listeners(scheduler):
+    calls = []
+    scheduler.rate_limit.async_add_listener(lambda: calls.append(scheduler.rate_limit.data["remaining"]))
+    scheduler.update(_headers(3, 100))
+    scheduler.update(_headers(2, 100))
+    assert calls == [3, 2]
+
+
+async def test_interval_from_budget(scheduler):
+    assert scheduler.next_interval() == DEFAULT_INTERVAL
+    scheduler.register("devices")
+    scheduler.register("appliances")
+    scheduler.update(_headers(POST_RESERVE + 20, 300))
+    # 20 requests left for two pollers over about 300 s
+    assert timedelta(seconds=25) <= scheduler.next_interval() <= timedelta(seconds=30)
+    scheduler.update(_headers(POST_RESERVE + 200, 300))
+    assert scheduler.next_interval() == MIN_INTERVAL
+
+
+async def test_exhausted_waits_for_reset(scheduler):
+    scheduler.register("devices")
+    scheduler.update(_headers(0, 100))
+    reset = scheduler.rate_limit.data["reset"]
+    assert scheduler.next_interval() >= reset - utcnow()
+    assert scheduler.not_before() == reset + timedelta(seconds=1)
+    # a window in the past is full again
+    scheduler.update(_headers(0, -10))
+    assert scheduler.next_interval() == DEFAULT_INTERVAL
+    assert scheduler.not_before() <= utcnow()
+
+
+async def test_posts_reserve_budget(scheduler):
+    scheduler.register("devices")
+    scheduler.update(_headers(POST_RESERVE + 10, 300))
+    before = scheduler.next_interval()
+    for _ in range(POST_RESERVE + 5):
+        scheduler.note_post()
+    assert scheduler.next_interval() > before
+
+
+def test_stagger_phases():
+    stagger = PollStagger()
+    unregister = stagger.register("a")
+    stagger.register("b")
+    time = utc_from_timestamp(1000)
+    period = 2 * STAGGER_STEP.total_seconds()
+    assert stagger.align("a", time).timestamp() % period == 0
+    assert stagger.align("b", time).timestamp() % period == STAGGER_STEP.total_seconds()
+    unregister()
+    stagger.register("c")
+    # the free slot is reused
+    assert stagger.align("c", time).timestamp() % period == 0
+    assert stagger.align("unknown", time) == time
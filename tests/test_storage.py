@@ -0,0 +1,59 @@
+"""Tests of the payload snapshots."""
+from datetime import timedelta
+import json
+import os
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.util.dt import utcnow
+
+from custom_components.nature_remo.common import DOMAIN
+from custom_components.nature_remo.storage import MAX_AGE, STORAGE_KEY, SnapshotStore
+
+from .common import async_add_entry
+
+
+def _write(hass, entry_id, version, data):
+    path = hass.config.path(".storage", STORAGE_KEY.format(entry_id))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"version": version, "key": STORAGE_KEY.format(entry_id), "data": data}, file)
+
+
+async def test_save_and_load(hass):
+    store = SnapshotStore(hass, "entry")
+    store.async_save("devices", b"[1]")
+    await hass.async_stop(force=True)  # writes delayed saves
+    assert await SnapshotStore(hass, "entry").async_load() == {"devices": "[1]"}
+
+
+async def test_old_snapshots_are_not_used(hass):
+    _write(hass, "entry", 1, {
+        "devices": {"saved_at": (utcnow() - MAX_AGE - timedelta(minutes=1)).isoformat(), "body": "[1]"},
+        "appliances": {"saved_at": (utcnow() - MAX_AGE + timedelta(minutes=1)).isoformat(), "body": "[2]"},
+    })
+    assert await SnapshotStore(hass, "entry").async_load() == {"appliances": "[2]"}
+
+
+async def test_other_version_is_dropped(hass):
+    _write(hass, "entry", 0, {"devices": {"saved_at": utcnow().isoformat(), "body": "[1]"}})
+    assert await SnapshotStore(hass, "entry").async_load() == {}
+
+
+async def test_restore_without_cloud(core, cloud):
+    entry = await async_add_entry(core)
+    snapshots = core.data[DOMAIN][entry.entry_id]["devices"].snapshots
+    await snapshots._store.async_save(snapshots._data)
+    saved = {path: x["saved_at"] for path, x in snapshots._data.items()}
+    states = len(core.states.async_all())
+
+    async def unreachable(method, path, data):
+        return 503, {"code": 503}, {}
+
+    cloud._respond = unreachable
+    await core.config_entries.async_reload(entry.entry_id)
+    await core.async_block_till_done()
+    # entities come from the snapshots and the restore did not renew them
+    assert entry.state is ConfigEntryState.LOADED
+    assert len(core.states.async_all()) == states
+    snapshots = core.data[DOMAIN][entry.entry_id]["devices"].snapshots
+    assert {path: x["saved_at"] for path, x in snapshots._data.items()} == saved